@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''
+Compares the rows per second of the interleaved write path, which picks the NAVD 88 or NGVD 29 cursor record by record,
+with the datum-partitioned path (partitioned=True), which writes all of a file's NAVD 88 records and then all of its
+NGVD 29 records.
+
+dofsink.writeDofs is timed with a GeoPackageSink, which does not need ArcGIS.  When arcpy can be imported,
+faadof.readDofsIntoGdb is also timed with a new file geodatabase.  Each result is the best of three runs.
+
+Usage: python benchmarks/datumwrite.py [DOF file]
+If no DOF file is given, one is generated with 100,000 records, a third of which are NGVD 29.
+'''
+
+import sys, os, time, shutil, tempfile
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+
+import faadof, dofsink
+
+_header = """  CURRENCY DATE = 03/04/12
+
+OAS#     V CO  ST CITY             LATITUDE     LONGITUDE     OBSTACLE      AGL   AMSL LT H V M FAA            ACTION
+-------------------------------------------------------------------------------------------------------------------------
+"""
+
+def _writeDof(path, records):
+	"""Writes a DOF file whose NGVD 29 (dated before 2001) and NAVD 88 records alternate."""
+	with open(path, "wb") as f:
+		f.write(_header)
+		for i in xrange(records):
+			date = "1995%03d" % (i % 365 + 1) if i % 3 == 0 else "2010%03d" % (i % 365 + 1)
+			f.write("53-%06d O US WA SEATTLE          47 %02d %05.2fN 122 %02d %05.2fW TOWER        1 %05d %05d R 2 D A "
+					"2010ANM00777OE A %s\n" % (i, i % 60, i % 6000 / 100.0, (i * 7) % 60, (i * 13) % 6000 / 100.0,
+											  i % 2000, i % 5000, date))
+
+def _best(function, repeat=3):
+	"""Returns the number of records written by function and the shortest time taken by repeat calls."""
+	times = []
+	for i in xrange(repeat):
+		start = time.time()
+		count = function()
+		times.append(time.time() - start)
+	return count, min(times)
+
+def main(argv=None):
+	if argv is None:
+		argv = sys.argv
+	root = tempfile.mkdtemp()
+	try:
+		if len(argv) > 1:
+			dofPath = argv[1]
+		else:
+			dofPath = os.path.join(root, "53-WA.Dat")
+			_writeDof(dofPath, 100000)
+
+		gpkgPath = os.path.join(root, "DOF.gpkg")
+		def writeGeoPackage(partitioned):
+			with dofsink.GeoPackageSink(gpkgPath) as sink:
+				return dofsink.writeDofs(sink, [dofPath], partitioned=partitioned)
+		for partitioned in (False, True):
+			count, elapsed = _best(lambda: writeGeoPackage(partitioned))
+			print "GeoPackageSink, partitioned=%s: %d rows, %.0f rows/s" % (partitioned, count, count / elapsed)
+
+		try:
+			faadof.arcpy.Exists
+		except ImportError:
+			print "readDofsIntoGdb: skipped (ArcGIS is not installed)"
+			return
+		gdbPath = os.path.join(root, "DOF.gdb")
+		def writeGdb(partitioned):
+			faadof.createDofGdb(gdbPath)
+			start = time.time()
+			faadof.readDofsIntoGdb(gdbPath, [dofPath], partitioned=partitioned)
+			elapsed = time.time() - start
+			return int(faadof.arcpy.management.GetCount(os.path.join(gdbPath, "Obstacles")).getOutput(0)), elapsed
+		for partitioned in (False, True):
+			count, elapsed = min((writeGdb(partitioned) for i in xrange(3)), key=lambda result: result[1])
+			print "readDofsIntoGdb, partitioned=%s: %d rows, %.0f rows/s" % (partitioned, count, count / elapsed)
+	finally:
+		shutil.rmtree(root)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+'''
+Measures how long it takes to import the DOF modules in a new Python process.
+
+faadof loads arcpy the first time a geodatabase function uses it, so importing faadof (e.g., for julianDateToDate,
+Obstacle or readDofFile) costs about as much as importing dofcore.  "import arcpy" is also timed when ArcGIS is
+installed, since that is what importing faadof used to cost.
+
+Usage: python benchmarks/importtime.py [repeat]
+'''
+
+import sys, os, subprocess
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the import time and whether arcpy was imported.
+_script = """
+import sys, time
+start = time.time()
+import %s
+print time.time() - start, "arcpy" in sys.modules
+"""
+
+def _importTime(statement, repeat):
+	"""Returns the shortest time taken by the import statement over repeat new processes, and whether arcpy was
+	imported, or None if the import failed.
+	"""
+	best, arcpyImported = None, False
+	for i in xrange(repeat):
+		process = subprocess.Popen([sys.executable, "-c", _script % statement], cwd=_root, stdout=subprocess.PIPE,
+								stderr=subprocess.PIPE)
+		output = process.communicate()[0]
+		if process.returncode != 0:
+			return None
+		elapsed, arcpyImported = output.split()[-2:]
+		best = min(best, float(elapsed)) if best is not None else float(elapsed)
+	return best, arcpyImported == "True"
+
+def main(argv=None):
+	if argv is None:
+		argv = sys.argv
+	repeat = int(argv[1]) if len(argv) > 1 else 5
+	for module in ("dofcore", "faadof", "arcpy"):
+		result = _importTime(module, repeat)
+		if result is None:
+			print "import %s: failed" % module + (" (ArcGIS is not installed)" if module == "arcpy" else "")
+		else:
+			print "import %s: %.3f s%s" % (module, result[0], " (imports arcpy)" if result[1] and module != "arcpy" else "")
+
+if __name__ == "__main__":
+	main()
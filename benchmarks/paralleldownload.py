@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+'''
+Measures how the throughput of HTTPZipFile.extract_to scales with the number of parallel range requests.
+
+A zip archive with one large member is served by a local server (tests/rangeserver.py) that throttles each connection
+to a fixed rate, as a high-latency link limits each TCP stream.  The member is extracted with each value of parallel
+and checked against zipfile.
+
+Usage: python benchmarks/paralleldownload.py [rate (bytes/s per connection)] [lines]
+'''
+
+import sys, os, time, shutil, tempfile, zipfile
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_root, os.path.join(_root, "tests")]
+
+import remotezip
+from rangeserver import RangeServer
+
+def _writeArchive(path, lines):
+	"""Writes a zip archive with one deflated member of DOF-like text and returns the member's name."""
+	data = "".join("53-%06d O US WA SEATTLE          47 %02d %05.2fN 122 %02d %05.2fW TOWER %05d\r\n"
+				% (i, i % 60, i % 6000 / 100.0, (i * 7) % 60, (i * 13) % 6000 / 100.0, (i * 7919) % 100000)
+				for i in xrange(lines))
+	with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+		archive.writestr("DOF.DAT", data)
+	return "DOF.DAT"
+
+def main(argv=None):
+	if argv is None:
+		argv = sys.argv
+	rate = int(argv[1]) if len(argv) > 1 else 1 << 20
+	lines = int(argv[2]) if len(argv) > 2 else 400000
+	root = tempfile.mkdtemp()
+	try:
+		archivePath = os.path.join(root, "DOF.zip")
+		member = _writeArchive(archivePath, lines)
+		with zipfile.ZipFile(archivePath) as archive:
+			expected = archive.read(member)
+		outPath = os.path.join(root, member)
+		with RangeServer(root, rate=rate) as server:
+			session = remotezip.HTTPSession(pool_size=16)
+			archive = remotezip.HTTPZipFile(server.url + "DOF.zip", session=session)
+			size = archive.getinfo(member).compress_size
+			print "%d compressed bytes, %d bytes/s per connection" % (size, rate)
+			for parallel in (1, 2, 4, 8):
+				start = time.time()
+				archive.extract_to(member, outPath, parallel=parallel)
+				elapsed = time.time() - start
+				with open(outPath, "rb") as f:
+					if f.read() != expected:
+						raise AssertionError("parallel=%d extracted the wrong data." % parallel)
+				print "parallel=%d: %.2f s, %.2f MB/s" % (parallel, elapsed, size / elapsed / 1e6)
+			session.close()
+	finally:
+		shutil.rmtree(root)
+
+if __name__ == "__main__":
+	main()
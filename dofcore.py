@@ -0,0 +1,1280 @@
+# -*- coding: utf-8 -*-
+'''
+Parsing, downloading and domain definitions for FAA Digital Obstacle Files (DOF).
+This module does not use arcpy, so it can be imported quickly and on computers without ArcGIS.  The geodatabase 
+functions are in faadof.
+
+@author: Jeff Jacobson
+'''
+
+import sys, os.path, re, datetime, collections, multiprocessing, mmap, urllib2, remotezip
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+_jdatere = re.compile("(?P<year>\d{4})(?P<days>\d{3})")
+_wgs84 = 'GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433],AUTHORITY["EPSG",4326]]'
+_ngvd1929 = 'VERTCS["NGVD_1929",VDATUM["National_Geodetic_Vertical_Datum_1929"],PARAMETER["Vertical_Shift",0.0],PARAMETER["Direction",1.0],UNIT["Foot_US",0.3048006096012192],AUTHORITY["EPSG",5702]]'
+_navd1988 = 'VERTCS["NAVD_1988",VDATUM["North_American_Vertical_Datum_1988"],PARAMETER["Vertical_Shift",0.0],PARAMETER["Direction",1.0],UNIT["Meter",1.0],AUTHORITY["EPSG",5703]]'
+
+_zDate = datetime.date(2001, 3, 12) # Records on or after this date are in NAVD 1988.  Prior are NGVD 1929.
+
+def _isNgvd1929(date):
+	"""Returns True if the heights of a record with this date are NGVD 1929 rather than NAVD 1988.  Records without a 
+	valid date (for which Obstacle.date is None) are treated as NGVD 1929, as datumPartitions does.
+	"""
+	return date is None or date < _zDate
+
+def _addMessage(message):
+	"""Adds a geoprocessing message if arcpy has been loaded (e.g., by a script tool), otherwise prints the message.
+	"""
+	arcpy = sys.modules.get("arcpy")
+	if arcpy is not None:
+		arcpy.AddMessage(message)
+	else:
+		print message
+
+def _parseCurrencyDate(line, out_format=None):
+	"""Parses the currency date
+	"""
+	regex = re.compile(r"\s*CURRENCY\sDATE\s*=\s*(?P<month>\d{2})/(?P<day>\d{2})/(?P<year>\d{2})",re.IGNORECASE)
+	r = regex.search(line)
+	output = None
+	if r is not None:
+		d = r.groupdict()
+		if out_format == "str":
+			output = "%(month)s-%(day)s-20%(year)s" % d
+		else:
+			output = datetime.date(int("20" + d["year"]), int(d["month"]), int(d["day"]))
+	return output
+		
+
+def julianDateToDate(jDate):
+	match =_jdatere.match(jDate)
+	if match:
+		d = match.groupdict()
+		year = int(d["year"])
+		days = int(d["days"])
+		date = datetime.date(year,1,1) + datetime.timedelta(days=days-1)
+		return date
+	
+def dmsToDD(degrees, minutes, seconds, hemisphere):
+	if hemisphere == "S" or hemisphere == "W":
+		dd = degrees * - 1 - float(minutes) / 60 - float(seconds)/3600
+	else:
+		dd = degrees + float(minutes) / 60 + float(seconds)/3600
+	return dd
+
+class Dms(object): 
+	__slots__ = ("degrees", "minutes", "seconds", "hemisphere")
+	def __init__(self, degrees, minutes, seconds, hemisphere):
+		self.degrees = degrees
+		self.minutes = minutes
+		self.seconds = seconds
+		self.hemisphere = hemisphere
+	def toDD(self):
+		dd = dmsToDD(self.degrees, self.minutes, self.seconds, self.hemisphere)
+		return dd
+	def __str__(self, *args, **kwargs):
+		# return "%s %s %s %s" % (self.degrees, self.minutes, self.seconds, self.hemisphere)
+		if re.match("[SW]", self.hemisphere):
+			return "%s %s %s %s" % (self.degrees, self.minutes, self.seconds, self.hemisphere)
+		else:
+			return "%s %s %s %s" % (self.degrees, self.minutes, self.seconds, self.hemisphere)
+
+
+def _lineField(start, end, strip=True):
+	"""Creates a read-only property that decodes a fixed-width text field from an Obstacle's original line when accessed.
+	"""
+	if strip:
+		return property(lambda self: self._line[start:end].rstrip())
+	return property(lambda self: self._line[start:end])
+
+def _fieldInt(text):
+	"""Decodes the digits of a fixed-width numeric field the way _columnInts does: characters that are not digits 
+	(e.g., the padding of a truncated record) count as zeros, and a minus sign anywhere makes the value negative.
+	"""
+	value = 0
+	for c in text:
+		value = value * 10 + (ord(c) - 48 if "0" <= c <= "9" else 0)
+	return -value if "-" in text else value
+
+def _fieldDms(line, degStart, degEnd, minStart, secStart, hemi):
+	"""Decodes a DMS field with _fieldInt, as _columnDms does.  Returns a Dms."""
+	seconds = (_fieldInt(line[secStart:secStart + 2]) * 100 + _fieldInt(line[secStart + 3:secStart + 5])) / 100.0
+	return Dms(_fieldInt(line[degStart:degEnd]), _fieldInt(line[minStart:minStart + 2]), seconds, line[hemi])
+
+class Obstacle(object):
+	"""An obstacle record from a DOF file.
+	Only the coordinates (as decimal degrees) and heights are decoded when the obstacle is created.  All other fields 
+	are decoded from the original line when they are accessed.
+	A record whose numeric fields cannot all be parsed (e.g., a final record that was cut short) is padded with spaces 
+	to the record length, and its numeric fields are decoded like parseDofColumns does: blanks count as zeros.
+	"""
+	__slots__ = ("_line", "latitudeDD", "longitudeDD", "aglHT", "AmslHT")
+	def __init__(self, line):
+		self._line = line
+		try:
+			self.latitudeDD = dmsToDD(int(line[35:37]), int(line[38:40]), float(line[41:46]), line[46])
+			self.longitudeDD = dmsToDD(int(line[48:51]), int(line[52:54]), float(line[55:60]), line[60])
+			self.aglHT = int(line[77:82])
+			self.AmslHT = int(line[83:88])
+		except (ValueError, IndexError):
+			self._line = line = line.rstrip("\r\n").ljust(_dofRecordLength)
+			self.latitudeDD = _fieldDms(line, 35, 37, 38, 41, 46).toDD()
+			self.longitudeDD = _fieldDms(line, 48, 51, 52, 55, 60).toDD()
+			self.aglHT = _fieldInt(line[77:82])
+			self.AmslHT = _fieldInt(line[83:88])
+	
+	orsCode = _lineField(0, 2, False)
+	obstacleNumber = _lineField(3, 10, False)
+	verificationStatus = _lineField(10, 11, False)
+	countryId = _lineField(12, 15)
+	stateId = _lineField(15, 18)
+	cityName = _lineField(18, 34)
+	obstacleType = _lineField(62, 74)
+	lighting = _lineField(89, 90, False)
+	horizontalAccuracy = _lineField(91, 92)
+	verticalAccuracy = _lineField(93, 94)
+	markIndicator = _lineField(95, 96, False)
+	faaStudyNo = _lineField(97, 111)
+	action = _lineField(112, 113, False)
+	
+	@property
+	def line(self):
+		"""The DOF record the obstacle was read from."""
+		return self._line
+	@property
+	def latitude(self):
+		return _fieldDms(self._line, 35, 37, 38, 41, 46)
+	@property
+	def longitude(self):
+		return _fieldDms(self._line, 48, 51, 52, 55, 60)
+	@property
+	def quantity(self):
+		return _fieldInt(self._line[75])
+	@property
+	def date(self):
+		return julianDateToDate(self._line[114:121])
+	
+	def __str__(self, *args, **kwargs):
+		return object.__str__(self, *args, **kwargs)
+	
+	@classmethod
+	def fromColumns(cls, columns, index):
+		"""Creates an Obstacle from one row of the arrays returned by parseDofColumns without parsing the line again.
+		@param columns: A dict of arrays as returned by parseDofColumns.
+		@type columns: dict
+		@param index: The index of the record within the arrays.
+		@type index: int
+		@rtype: Obstacle
+		"""
+		obstacle = cls.__new__(cls)
+		obstacle._line = str(columns["line"][index])
+		obstacle.latitudeDD = float(columns["latitude"][index])
+		obstacle.longitudeDD = float(columns["longitude"][index])
+		obstacle.aglHT = int(columns["aglHT"][index])
+		obstacle.AmslHT = int(columns["AmslHT"][index])
+		return obstacle
+
+# Fixed-width layout of a DOF record: attribute name -> (start, end) column positions.
+_textColumns = {
+	"orsCode": (0, 2),
+	"obstacleNumber": (3, 10),
+	"verificationStatus": (10, 11),
+	"countryId": (12, 15),
+	"stateId": (15, 18),
+	"cityName": (18, 34),
+	"obstacleType": (62, 74),
+	"lighting": (89, 90),
+	"horizontalAccuracy": (91, 92),
+	"verticalAccuracy": (93, 94),
+	"markIndicator": (95, 96),
+	"faaStudyNo": (97, 111),
+	"action": (112, 113)
+}
+# Text columns that Obstacle stores without stripping trailing whitespace.
+_unstrippedColumns = ("orsCode", "obstacleNumber", "verificationStatus", "lighting", "markIndicator", "action")
+_intColumns = {
+	"quantity": (75, 76),
+	"aglHT": (77, 82),
+	"AmslHT": (83, 88)
+}
+_dofRecordLength = 121
+_defaultShardSize = 4 << 20 # Bytes of a DOF file parsed by one task when parsing in a process pool.
+
+class DofColumns(object):
+	"""A read-only sequence of Obstacle objects backed by the column arrays returned by parseDofColumns.
+	Obstacle objects are only created when an item is accessed.
+	"""
+	def __init__(self, columns):
+		self.columns = columns
+	def __len__(self):
+		return len(self.columns["date"])
+	def __getitem__(self, index):
+		if index < 0:
+			index += len(self)
+		if index < 0 or index >= len(self):
+			raise IndexError("DOF record index out of range")
+		return Obstacle.fromColumns(self.columns, index)
+	def __iter__(self):
+		for i in xrange(len(self)):
+			yield Obstacle.fromColumns(self.columns, i)
+
+def _splitDofData(data, headerLines=4):
+	"""Splits the raw contents of a DOF file into its header lines and an (n, stride) matrix of record bytes.
+	@param data: The contents of a DOF file.
+	@type data: str
+	@return: A tuple: (list of header lines, numpy.ndarray of uint8 with one row per record)
+	"""
+	header = []
+	start = 0
+	for i in range(headerLines):
+		end = data.find("\n", start)
+		if end < 0:
+			end = len(data)
+		header.append(data[start:end].rstrip("\r"))
+		start = end + 1
+	body = data[start:]
+	if len(body.strip()) == 0:
+		return header, numpy.zeros((0, _dofRecordLength + 1), numpy.uint8)
+	# The stride is the record length plus the line terminator ("\n" or "\r\n").
+	stride = body.find("\n") + 1
+	if stride <= 0:
+		stride = len(body) + 1
+	if stride <= _dofRecordLength:
+		raise ValueError("DOF records are shorter than %d characters." % _dofRecordLength)
+	# Drop trailing blank lines.  A final line that is missing its terminator is padded with spaces to the record length
+	# (as Obstacle pads a truncated record), and NULs take the place of its terminator so that the "line" column, whose
+	# string dtype drops trailing NULs, holds the same text as Obstacle.line.
+	terminator = "\r\n" if body[stride - 2:stride] == "\r\n" else "\n"
+	recordLength = stride - len(terminator)
+	lines = body.rstrip("\r\n")
+	last = len(lines) % stride
+	if last == recordLength and len(lines) < len(body):
+		body = lines + terminator
+	else:
+		body = lines + " " * (recordLength - last) + "\0" * len(terminator)
+	if len(body) % stride != 0:
+		raise ValueError("DOF records do not have a fixed length of %d characters." % (stride - 1))
+	matrix = numpy.frombuffer(body, numpy.uint8).reshape((-1, stride))
+	return header, matrix
+
+def _columnInts(matrix, start, end):
+	"""Decodes the digits in a fixed-width column of a record matrix into integers.  Spaces are treated as zeros.
+	"""
+	field = matrix[:, start:end]
+	digits = field.astype(numpy.int64) - ord("0")
+	digits[(digits < 0) | (digits > 9)] = 0
+	values = digits.dot(10 ** numpy.arange(end - start - 1, -1, -1, dtype=numpy.int64))
+	negative = (field == ord("-")).any(axis=1)
+	values[negative] *= -1
+	return values
+
+def _columnStrings(matrix, start, end, strip=True):
+	"""Extracts a fixed-width text column of a record matrix as an array of strings.
+	"""
+	width = end - start
+	values = numpy.ascontiguousarray(matrix[:, start:end]).view("S%d" % width).ravel()
+	if strip:
+		values = numpy.char.rstrip(values)
+	return values
+
+def _columnDms(matrix, degStart, degEnd, minStart, secStart, hemi):
+	"""Decodes a fixed-width DMS column into degrees, minutes, seconds, hemisphere and decimal degree arrays.
+	Decimal degrees are calculated in the same order of operations as dmsToDD so that the results are identical.
+	"""
+	degrees = _columnInts(matrix, degStart, degEnd)
+	minutes = _columnInts(matrix, minStart, minStart + 2)
+	# Seconds are formatted as "SS.ss".  Divide the integer hundredths so the result matches float().
+	seconds = (_columnInts(matrix, secStart, secStart + 2) * 100 + _columnInts(matrix, secStart + 3, secStart + 5)) / 100.0
+	hemisphere = _columnStrings(matrix, hemi, hemi + 1, False)
+	negative = (hemisphere == "S") | (hemisphere == "W")
+	dd = numpy.where(negative, 
+					degrees * -1 - minutes.astype(numpy.float64) / 60 - seconds / 3600, 
+					degrees + minutes.astype(numpy.float64) / 60 + seconds / 3600)
+	return degrees, minutes, seconds, hemisphere, dd
+
+def _columnJulianDates(matrix, start):
+	"""Decodes a fixed-width "YYYYDDD" column into an array of proleptic Gregorian ordinals (see datetime.date.toordinal).
+	Values that are not valid Julian dates are returned as 0.
+	"""
+	field = matrix[:, start:start + 7]
+	valid = ((field >= ord("0")) & (field <= ord("9"))).all(axis=1)
+	year = _columnInts(matrix, start, start + 4)
+	days = _columnInts(matrix, start + 4, start + 7)
+	y = year - 1
+	ordinals = y * 365 + y // 4 - y // 100 + y // 400 + days
+	ordinals[~valid | (year < 1)] = 0
+	return ordinals
+
+def parseDofColumns(data):
+	"""Parses the contents of a DOF file into columns.  Every record is decoded in bulk using numpy rather than one line at a time.
+	@param data: The contents of a DOF file.
+	@type data: str
+	@return: A dict with the keys "columns" and "currencyDate".  "columns" is a dict of numpy arrays keyed by Obstacle 
+	attribute name.  The "latitude" and "longitude" arrays are decimal degrees, the DMS components are in the 
+	"latDegrees", "latMinutes", "latSeconds", "latHemisphere" (and "lon*") arrays, and "date" contains date ordinals.
+	@rtype: dict
+	@raise ImportError: Raised if numpy is not installed.
+	"""
+	if numpy is None:
+		raise ImportError("numpy is required to parse DOF files into columns.")
+	header, matrix = _splitDofData(data)
+	columns = {}
+	for name, (start, end) in _textColumns.items():
+		columns[name] = _columnStrings(matrix, start, end, name not in _unstrippedColumns)
+	for name, (start, end) in _intColumns.items():
+		columns[name] = _columnInts(matrix, start, end)
+	(columns["latDegrees"], columns["latMinutes"], columns["latSeconds"], 
+		columns["latHemisphere"], columns["latitude"]) = _columnDms(matrix, 35, 37, 38, 41, 46)
+	(columns["lonDegrees"], columns["lonMinutes"], columns["lonSeconds"], 
+		columns["lonHemisphere"], columns["longitude"]) = _columnDms(matrix, 48, 51, 52, 55, 60)
+	columns["date"] = _columnJulianDates(matrix, 114)
+	# The original lines (a view of the same buffer, not a copy).
+	columns["line"] = matrix.view("S%d" % matrix.shape[1]).ravel()
+	return { "columns": columns, "currencyDate": _parseCurrencyDate(header[0]) }
+
+# Attribute fields of the Obstacles feature class, in the order of the values returned by _obstacleValues.
+_obstacleFields = ("OrsCode", "ObstacleNo", "VerificationStatus", "CountryId", "StateId", "CityName", "ObstacleType", 
+			"Quantity", "AglHT", "AmslHt", "Lighting", "HorizontalAccuracy", "VerticalAccuracy", "MarkIndicator", 
+			"FaaStudyNo", "Action", "Date")
+
+def _obstacleValues(obstacle):
+	"""Returns the attribute values of an obstacle in the order of _obstacleFields.
+	"""
+	return (obstacle.orsCode, obstacle.obstacleNumber, obstacle.verificationStatus, obstacle.countryId, 
+			obstacle.stateId, obstacle.cityName, obstacle.obstacleType, obstacle.quantity, obstacle.aglHT, 
+			obstacle.AmslHT, obstacle.lighting, obstacle.horizontalAccuracy, obstacle.verticalAccuracy, 
+			obstacle.markIndicator, obstacle.faaStudyNo, obstacle.action, obstacle.date)
+
+def obstacleRecord(obstacle, encoded=False):
+	"""Returns an obstacle as a record for batched writing (e.g., by parseDofShards or the sinks in dofsink).
+	@param encoded: If True, the values of coded fields are replaced by domain codes (see encodeValues).  Writers must 
+	decode them with decodeValues.
+	@type encoded: bool
+	@rtype: tuple
+	@return: A tuple of: True if the obstacle's heights are NGVD 29 (rather than NAVD 88), the attribute values in the 
+	order of _obstacleFields, the longitude and the latitude.
+	"""
+	values = _obstacleValues(obstacle)
+	if encoded:
+		values = encodeValues(values)
+	return (_isNgvd1929(values[-1]), values, obstacle.longitudeDD, obstacle.latitudeDD)
+
+# Geodatabase domains for the coded fields of a DOF, keyed by domain name.
+_domains = {}
+_domains["OrsCode"] = {
+  "description": "ORS Code",
+  "domains" : {
+	"01": "Alabama",
+	"02": "Alaska",
+	"04": "Arizona",
+	"05": "Arkansas",
+	"06": "California",
+	"08": "Colorado",
+	"09": "Connecticut",
+	"10": "Delaware",
+	"11": "DC",
+	"12": "Florida",
+	"13": "Georgia",
+	"15": "Hawaii",
+	"16": "Idaho",
+	"17": "Illinois",
+	"18": "Indiana",
+	"19": "Iowa",
+	"20": "Kansas",
+	"21": "Kentucky",
+	"22": "Louisiana",
+	"23": "Maine",
+	"24": "Maryland",
+	"25": "Massachusetts",
+	"26": "Michigan",
+	"27": "Minnesota",
+	"28": "Mississippi",
+	"29": "Missouri",
+	"30": "Montana",
+	"31": "Nebraska",
+	"32": "Nevada",
+	"33": "New Hampshire",
+	"34": "New Jersey",
+	"35": "New Mexico",
+	"36": "New York",
+	"37": "North Carolina",
+	"38": "North Dakota",
+	"39": "Ohio",
+	"40": "Oklahoma",
+	"41": "Oregon",
+	"42": "Pennsylvania",
+	"44": "Rhode Island",
+	"45": "South Carolina",
+	"46": "South Dakota",
+	"47": "Tennessee",
+	"48": "Texas",
+	"49": "Utah",
+	"50": "Vermont",
+	"51": "Virginia",
+	"53": "Washington",
+	"54": "West Virginia",
+	"55": "Wisconsin",
+	"56": "Wyoming",
+	"CA": "Canada",
+	"MX": "Mexico",
+	"PR": "Puerto Rico",
+	"BS": "Bahamas",
+	"AG": "Antigua and Barbuda",
+	"AI": "Anguilla",
+	"AN": "Netherlands Antilles",
+	"AW": "Aruba",
+	"CU": "Cuba",
+	"DO": "Dominican Republic",
+	"GP": "Guadeloupe",
+	"HN": "Honduras",
+	"HT": "Haiti",
+	"JM": "Jamaica",
+	"KN": "St. Kitts and Nevis",
+	"KY": "Cayman Islands",
+	"MS": "Montserrat",
+	"TC": "Turks and Caicos Islands",
+	"VG": "British Virgin Islands",
+	"VI": "Virgin Islands",
+	"AS": "American Samoa",
+	"FM": "Federated States of Micronesia",
+	"GU": "Guam",
+	"KI": "Kiribati",
+	"MH": "Marshall Islands",
+	"MI": "Midway Islands",
+	"MP": "Northern Mariana Islands",
+	"PW": "Palau",
+	"RU": "Russia",
+	"TK": "Tokelau",
+	"WQ": "Wake Island",
+	"WS": "Samoa",
+	}
+}
+
+# Verification Status
+_domains["VerificationStatus"] = {
+	"description": "Verification Status",
+	"domains": {
+		"O": "verified",
+		"U": "unverified"
+	}
+}
+
+_domains["LightingType"] = {
+	"description": "Lighting Type",
+	"domains": {
+		"R":  "Red",
+		"D":  "Medium intensity White Strobe & Red", 
+		"H":  "High Intensity White Strobe & Red", 
+		"M": "Medium Intensity White Strobe", 
+		"S" :  "High Intensity White Strobe", 
+		"F" :  'Flood', 
+		"C" : "Dual Medium Catenary", 
+		"W": "Synchronized Red Lighting", 
+		"L" : "Lighted (Type Unknown)", 
+		"N":  "None", 
+		"U":  "Unknown"
+	}
+}
+
+_domains["HorizontalAccuracy"] = {
+	"description": "Horizontal Accuracy",
+	"domains": {
+		"1": "+-20'",
+		"2": "+-50'",
+		"3": "+-100'",
+		"4": "+-250'",
+		"5": "+-500'",
+		"6": "+-1000'",
+		"7": "+-1/2 NM",
+		"8": "+-1 NM",
+		"9": "Unknown"
+	}
+ }
+
+_domains["VerticalAccuracy"] = {
+	"description": "Vertical Accuracy",
+	"domains": {
+		"A": "+-3'",
+		"B": "+-10'",
+		"C": "+-20'",
+		"D": "+-50'",
+		"E": "+-125'",
+		"F": "+-250'",
+		"G": "+-500'",
+		"H": "+-1000'",
+		"I": "Unknown"
+	}
+}
+
+
+_domains["MarkIndicator"] = {
+	"description": "Type of Marking",
+	"domains": {
+		"P":   "Orange or Orange and White Paint",
+		"W": "White Paint Only",
+		"M":  "Marked",
+		"F":   "Flag Marker",
+		"S":   "Spherical Marker",
+		"N":  "None",
+		"U":  "Unknown"
+	}
+}
+
+_domains["Action"] = {
+	"description": "Action",
+	"domains": {
+		"A": "Add",
+		"C": "Change",
+		"D": "Dismantle"
+	}
+}
+
+_domains["StructureTypes"] = {
+	"description": "Structure Types",
+	"domains": {
+		"AG EQUIP":"agricultural equipment",
+		"ARCH":"arch",
+		"BALLOON":"balloon: tethered; weather; other reconnaissance",
+		"BLDG":"building",
+		"BLDG-TWR":"latticework greater than 20' on building",
+		"BRIDGE":"bridge",
+		"CATENARY":"catenary: transmission line span/wire/cable",
+		"COOL TWR":"nuclear cooling tower",
+		"CRANE":"crane: permanent",
+		"CRANE T":"crane: temporary",
+		"CTRL TWR":"airport control tower",
+		"DAM":"Dam",
+		"DOME":"Dome",
+		"ELECTRICAL SYSTEM":"Electrical System",
+		"ELEVATOR":"silo; grain elevator",
+		"FENCE":"Fence",
+		"GENERAL UTILITY":"General Utility",
+		"LIGHTHOUSE":"Lighthouse",
+		"MONUMENT":"Monument",
+		"NAVAID":"airport navigational aid",
+		"PLANT":"plant: multiple close structures used for industrial purposes",
+		"POLE":"flag pole; light pole",
+		"REFINERY":"refinery: multiple close structures used for purifying crude materials",
+		"RIG":"oil rig",
+		"SIGN":"Sign",
+		"SPIRE":"spire: steeple",
+		"STACK":"stack: smoke; industrial",
+		"STADIUM":"Stadium",
+		"T-L TWR":"transmission line tower; telephone pole",
+		"TANK":"tank: water; fuel",
+		"TOWER":"Tower",
+		"TRAMWAY":"Tramway",
+		"TREE":"Tree",
+		"VEGETATION":"Vegetation",
+		"WINDMILL":"windmill: wind turbine"
+	}
+}
+
+# Schema of the Obstacles feature class: (name, type, length, alias, nullable, required, domain) for each field.
+_obstacleSchema = (
+	("OrsCode", "TEXT", 2, "ORS Code", "NON_NULLABLE", "REQUIRED", "OrsCode"),
+	("ObstacleNo", "TEXT", 7, "Obstacle Number", "NON_NULLABLE", None, None),
+	("VerificationStatus", "TEXT", 1, "Verification Status", "NON_NULLABLE", "NON_REQUIRED", "VerificationStatus"),
+	("CountryId", "TEXT", 2, "Country Identifier", None, None, None),
+	("StateId", "TEXT", 2, "State Identifier", None, None, None),
+	("CityName", "TEXT", 16, "City Name", None, None, None),
+	("ObstacleType", "TEXT", 12, "Obstacle Type", None, None, "StructureTypes"),
+	("Quantity", "SHORT", None, None, None, None, None),
+	("AglHT", "SHORT", None, "Above Ground Level Height (Feet)", None, None, None),
+	("AmslHt", "SHORT", None, "Above Mean Sea Level Height (Feet)", None, None, None),
+	("Lighting", "TEXT", 1, None, None, None, "LightingType"),
+	("HorizontalAccuracy", "TEXT", 1, "Horizontal Accuracy", None, None, "HorizontalAccuracy"),
+	("VerticalAccuracy", "TEXT", 1, "Vertical Accuracy", None, None, "VerticalAccuracy"),
+	("MarkIndicator", "TEXT", 1, "Mark Indicator", None, None, "MarkIndicator"),
+	("FaaStudyNo", "TEXT", 14, "FAA Study Number", None, None, None),
+	("Action", "TEXT", 1, None, None, None, "Action"),
+	("Date", "DATE", None, None, None, None, None)
+)
+
+class CodedDomain(object):
+	"""Assigns small integer codes to the coded values of a domain in _domains.
+	Codes are the positions of the values in sorted order, so they are the same in every process (e.g., the workers of
+	parseDofShards) without being exchanged.
+	"""
+	def __init__(self, name):
+		"""@param name: The name of a domain in _domains (e.g., "StructureTypes").
+		@type name: str
+		"""
+		self.name = name
+		self.values = tuple(sorted(_domains[name]["domains"]))
+		self._codes = dict((value, code) for code, value in enumerate(self.values))
+	def encode(self, value):
+		"""Returns the code of a value, or the value itself if it is not one of the domain's values."""
+		return self._codes.get(value, value)
+	def decode(self, code):
+		"""Returns the value of a code.  Values that were not encoded are returned unchanged."""
+		if isinstance(code, int):
+			return self.values[code]
+		return code
+
+# Coded domains, keyed by domain name.
+_codedDomains = dict((name, CodedDomain(name)) for name in _domains)
+# Positions in _obstacleFields of the fields that have a domain, and the domain of each.
+_codedFields = tuple((_obstacleFields.index(fieldName), _codedDomains[domain])
+					for fieldName, fieldType, length, alias, nullable, required, domain in _obstacleSchema
+					if domain is not None)
+# Positions in _obstacleFields of the free text fields whose values repeat often enough to intern.
+_internedFields = tuple(_obstacleFields.index(fieldName) for fieldName in ("CountryId", "StateId", "CityName"))
+
+def encodeValues(values):
+	"""Replaces the values of coded fields (see _codedFields) with their domain codes, and interns repeated free text 
+	(e.g., city names), so that many records held in memory share the same objects.
+	@param values: The attribute values, in the order of _obstacleFields.
+	@type values: tuple
+	@rtype: tuple
+	"""
+	values = list(values)
+	for i, domain in _codedFields:
+		values[i] = domain.encode(values[i])
+	for i in _internedFields:
+		values[i] = intern(values[i])
+	return tuple(values)
+
+def decodeValues(values):
+	"""Replaces domain codes with the values they stand for.  Values that are not encoded are returned unchanged, so it 
+	is safe to call on any record's values.
+	@param values: The attribute values, in the order of _obstacleFields.
+	@type values: tuple
+	@rtype: tuple
+	"""
+	if not any(isinstance(values[i], int) for i, domain in _codedFields):
+		return values
+	values = list(values)
+	for i, domain in _codedFields:
+		values[i] = domain.decode(values[i])
+	return tuple(values)
+
+def _memberOrsCode(memberName):
+	"""Returns the ORS code of a state data file from its name (e.g., "53" for "53-WA.Dat"), or None if the name does not
+	start with an ORS code (e.g., the national "DOF.DAT" file).
+	"""
+	match = re.match(r"(?P<orsCode>\w{2})-", os.path.basename(memberName))
+	if match:
+		return match.group("orsCode")
+	return None
+
+def downloadDofs(url="http://tod.faa.gov/tod/public/", index_url="http://tod.faa.gov/tod/public/TOD_DOF.html", datafiles=('53-WA.Dat',), destDir="../Scratch", lastCurrencyDate=None, session=None, cache=None, workers=1, retries=2, parallel=1, resume=False, importedMembers=None, memberInfo=None, release=None):
+	"""Downloads the specified data files from the FAA website.
+	@param url: The URL of the directory that contains the DOF data zip archives.
+	@type url: str
+	@param datafiles: A set of file names fo the .DAT files that are to be downloaded.
+	@type dataFiles: set
+	@param destDir: The destination directory where the data files will be copied to.
+	@type destDir: str
+	@param lastCurrencyDate: The last currency date since you performed this operation.  If the last update listed of the FAA page is
+	<= lastCurrencyDate then the operation will be aborted because the FAA has no newer information.
+	@type lastCurrencyDate: datetime.date
+	@param session: The HTTP session whose persistent connections are used for the index page and the zip archive.  
+	If omitted, remotezip.default_session is used.
+	@type session: remotezip.HTTPSession
+	@param cache: If provided, the index page, the zip archive's central directory and the data files are cached, and 
+	are only downloaded again if they have changed.
+	@type cache: remotezip.ZipCache
+	@param workers: The number of data files that are downloaded at the same time.
+	@type workers: int
+	@param retries: The number of times the download of a data file is retried if it fails.
+	@type retries: int
+	@param parallel: The number of range requests each data file is split into.  Useful for a large file such as the 
+	national DOF on a high-latency link.
+	@type parallel: int
+	@param resume: If True, a data file whose download was interrupted (e.g., in a previous run) is resumed from where
+	it stopped instead of being downloaded again from the start.  The run is aborted with 
+	remotezip.ArchiveChangedError if the zip archive has changed in the meantime.
+	@type resume: bool
+	@param importedMembers: The CRC-32 and size of the data files that were previously imported (see getImportedMembers).
+	Data files whose CRC-32 and size in the zip archive's central directory are unchanged are not downloaded.
+	@type importedMembers: dict
+	@param memberInfo: If provided, this dict is filled with the (CRC-32, size) of each of the data files in the zip 
+	archive, keyed by data file name.
+	@type memberInfo: dict
+	@param release: If provided, this dict is filled with the "url" and "date" of the newest DOF zip archive.  (When 
+	none of the data files have changed, the date is the only record of the release.)
+	@type release: dict
+	@return: Returns a list paths of the files that were written to the file system.  If there were no newer data to download, None is returned. 
+	If importedMembers is provided and none of the data files have changed, the list is empty.
+	@rtype: list or None
+	"""
+	# This regular expression matches the links to the DOF_* zip files.  Captures are 2-digit year, month, and day, respectively.
+	linkRe = re.compile(r"""<a href=['"](?P<path>DOFS/DOF_(\d{2})(\d{2})(\d{2})\.zip)['"]>""", re.IGNORECASE)
+	
+	print "Reading '%s'..." % url
+	# Open the page and store the HTML in a variable.
+	if session is None:
+		session = remotezip.default_session
+	html = remotezip.get_page(index_url, session, cache)
+	
+	# Extract all of the DOF URLs
+	matches = linkRe.findall(html)
+	# sample matches:
+	#[
+	#	('DOFS/DOF_111020.zip', '11', '10', '20'), 
+	#	('DOFS/DOF_111215.zip', '11', '12', '15'), 
+	#	('DOFS/DOF_120108.zip', '12', '01', '08'), 
+	#	('DOFS/DOF_120304.zip', '12', '03', '04')
+	#]
+	# Convert the matches into a dictionary containing keys "url" and "date".
+	data = map(lambda s: {
+						"url": urllib2.urlparse.urljoin(url, s[0]), 
+						"date": datetime.date(int("20" + s[1]), int(s[2]), int(s[3]))
+						}, matches
+			)
+	
+	# Loop through all of the paths and determine which is the newest.  Download that file.
+	
+	newest = None
+	for info in data:
+		if newest is None or newest["date"] < info["date"]:
+			newest = info
+	print data
+	print "The newest file is %s." %  newest["url"]
+	if release is not None:
+		release.update(newest)
+	
+	if lastCurrencyDate is not None and newest["date"] <= lastCurrencyDate:
+		_addMessage("No new data has been added since %s.  No update is necessary." % lastCurrencyDate)
+		return None
+	else:
+		# Download the desired data files from the zip.
+		hzfile = remotezip.HTTPZipFile(newest["url"], session, cache)
+		#hzfile.printdir()
+		
+		# Create the destination directory if it does not already exist.
+		if not os.path.exists(destDir):
+			os.mkdir(destDir)
+		elif not os.path.isdir(destDir):
+			raise "Destination directory path exists, but is not a directory."
+		
+		# Create the list of (data file, destination path) pairs.
+		members = []
+		for fname in (datafiles):
+			source_name = fname
+			zinfo = hzfile.getinfo(source_name)
+			if memberInfo is not None:
+				memberInfo[source_name] = (zinfo.CRC, zinfo.file_size)
+			if importedMembers is not None and importedMembers.get(source_name) == (zinfo.CRC, zinfo.file_size):
+				print "%s has not changed since it was imported.  Skipping." % source_name
+				continue
+			dest_fname = os.path.join(destDir, os.path.basename(fname))
+			print "Extracing %s to %s" % (source_name, dest_fname)
+			members.append((source_name, dest_fname))
+		
+		# Download, decompress and write each file in chunks, so the whole file is never held in memory.
+		# The output list of table paths is in the same order as datafiles.
+		destNames = hzfile.extract_many(members, workers, retries, parallel=parallel, resume=resume)
+	
+		return destNames
+
+class DofReader(object):
+	"""Reads the obstacles in a DOF file one at a time, so that the entire file never has to be held in memory.
+	The header is read when the reader is created, so the currency date is available before any obstacles are read.
+	Iterating over the reader yields Obstacle objects.
+	"""
+	def __init__(self, source, headerLines=4, closeSource=False):
+		"""Opens the DOF file and reads its header.
+		@param source: Path to a DOF file, or a file-like object (e.g., an open file, StringIO, or the ZipExtFile returned by
+		remotezip.HTTPZipFile.open) positioned at the start of the DOF data.
+		@type source: str or file
+		@param headerLines: The number of header lines that precede the obstacle records.
+		@type headerLines: int
+		@param closeSource: If True, a file-like source is closed when the reader is closed.  (A file opened from a path
+		is always closed.)
+		@type closeSource: bool
+		@raise IOError: Raised if source is a path that does not exist.
+		"""
+		if isinstance(source, basestring):
+			if not os.path.exists(source):
+				raise IOError("File not found: %s" % source)
+			self._file = open(source, "rb")
+			self._ownsFile = True
+		else:
+			self._file = source
+			self._ownsFile = closeSource
+		self.currencyDate = None
+		for i in range(headerLines):
+			line = self._file.readline()
+			if i == 0:
+				self.currencyDate = _parseCurrencyDate(line)
+	def __iter__(self):
+		for line in self.iterLines():
+			yield Obstacle(line)
+	def iterLines(self):
+		"""Yields the unparsed obstacle records, skipping blank lines (e.g., at the end of the file).  The reader is 
+		closed when all lines have been read.
+		"""
+		try:
+			for line in self._file:
+				if line.strip():
+					yield line
+		finally:
+			self.close()
+	def close(self):
+		"""Closes the underlying file if it was opened by this reader."""
+		if self._ownsFile:
+			self._file.close()
+	def __enter__(self):
+		return self
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+class MappedDofFile(object):
+	"""A memory-mapped DOF file whose records are accessed by index.
+	The file is mapped instead of read, and records are located by multiplying their index by the record stride (the
+	record length plus the line terminator), so no line is read until it is requested.  Indexing returns an Obstacle;
+	slicing returns another MappedDofFile over the same mapping.
+	The final record may lack its line terminator or be truncated; it is padded with spaces to the record length, and
+	its blank numeric fields are decoded as zeros (see Obstacle), as parseDofColumns does.
+	"""
+	def __init__(self, path, headerLines=4):
+		"""Maps a DOF file, reads its header and checks that every record has the same length.
+		@param path: Path to a DOF file.
+		@type path: str
+		@param headerLines: The number of header lines that precede the obstacle records.
+		@type headerLines: int
+		@raise IOError: Raised if path does not exist.
+		@raise ValueError: Raised if the records do not all have the same length, or are shorter than a DOF record.
+		"""
+		if not os.path.exists(path):
+			raise IOError("File not found: %s" % path)
+		self.path = path
+		with open(path, "rb") as f:
+			if os.fstat(f.fileno()).st_size > 0:
+				self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			else:
+				self._map = ""
+		data = self._map
+		self.header = []
+		start = 0
+		for i in range(headerLines):
+			end = data.find("\n", start)
+			if end < 0:
+				end = len(data)
+			self.header.append(data[start:end].rstrip("\r"))
+			start = min(end + 1, len(data))
+		self.currencyDate = _parseCurrencyDate(self.header[0]) if self.header else None
+		self._dataStart = start
+		# Ignore line terminators (blank lines) at the end of the file.
+		end = len(data)
+		while end > start and data[end - 1] in "\r\n":
+			end -= 1
+		self._dataEnd = end
+
+		terminator = data.find("\n", start, end)
+		if terminator < 0:
+			# A single record without a terminator.
+			self.lineTerminator = "\n"
+			self.recordLength = max(end - start, _dofRecordLength)
+		else:
+			self.lineTerminator = "\r\n" if terminator > start and data[terminator - 1] == "\r" else "\n"
+			self.recordLength = terminator - start - len(self.lineTerminator) + 1
+		self.stride = self.recordLength + len(self.lineTerminator)
+		if end > start and self.recordLength < _dofRecordLength:
+			raise ValueError("DOF records in %s are shorter than %d characters." % (path, _dofRecordLength))
+		# Every record but the last is followed by a terminator.  The last may be truncated.
+		self._completeRecords, remainder = divmod(end - start, self.stride)
+		self._start, self._step = 0, 1
+		self._count = self._completeRecords + (1 if remainder else 0)
+		self._checkStride()
+
+	def _checkStride(self):
+		"""Raises a ValueError if any complete record is not followed by a line terminator at the expected position."""
+		data, start, stride, count = self._map, self._dataStart, self.stride, self._completeRecords
+		terminatorLength = len(self.lineTerminator)
+		if count == 0:
+			return
+		if numpy is not None:
+			matrix = self.matrix
+			bad = matrix[:, -1] != ord("\n")
+			if terminatorLength == 2:
+				bad |= matrix[:, -2] != ord("\r")
+			if bad.any():
+				self._strideError(int(numpy.flatnonzero(bad)[0]))
+		else:
+			for i in xrange(count):
+				position = start + (i + 1) * stride - terminatorLength
+				if data[position:position + terminatorLength] != self.lineTerminator:
+					self._strideError(i)
+
+	def _strideError(self, index):
+		raise ValueError("DOF record %d in %s does not have the length of the first record (%d characters)." %
+						(index + 1, self.path, self.recordLength))
+
+	@property
+	def matrix(self):
+		"""A read-only (n, stride) numpy array of uint8 over the complete records (including their line terminators),
+		backed by the mapped file.  Does not include a final record that lacks its terminator.
+		"""
+		if numpy is None:
+			raise ImportError("numpy is required for the record matrix.")
+		count = self._completeRecords
+		matrix = numpy.frombuffer(self._map, numpy.uint8, count * self.stride, self._dataStart)
+		return matrix.reshape((count, self.stride))
+
+	def __len__(self):
+		return self._count
+
+	def _index(self, index):
+		"""Converts an index in this (possibly sliced) sequence to a record index in the file."""
+		if index < 0:
+			index += self._count
+		if index < 0 or index >= self._count:
+			raise IndexError("DOF record index out of range")
+		return self._start + index * self._step
+
+	def _line(self, record):
+		offset = self._dataStart + record * self.stride
+		if record < self._completeRecords:
+			return self._map[offset:offset + self.recordLength]
+		# The final record is missing its terminator and may be truncated.
+		return self._map[offset:self._dataEnd].ljust(self.recordLength)
+
+	def line(self, index):
+		"""Returns the text of a record, without its line terminator.
+		@type index: int
+		@rtype: str
+		"""
+		return self._line(self._index(index))
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			start, stop, step = index.indices(self._count)
+			view = object.__new__(MappedDofFile)
+			view.__dict__.update(self.__dict__)
+			view._start = self._start + start * self._step
+			view._step = self._step * step
+			view._count = len(xrange(start, stop, step))
+			return view
+		return Obstacle(self._line(self._index(index)))
+
+	def iterLines(self):
+		"""Yields the text of each record, without line terminators."""
+		for i in xrange(self._count):
+			yield self._line(self._start + i * self._step)
+
+	def __iter__(self):
+		for line in self.iterLines():
+			yield Obstacle(line)
+
+	def close(self):
+		"""Unmaps the file.  Slices of this object cannot be used afterwards."""
+		if self._map:
+			self._map.close()
+		self._map = ""
+	def __enter__(self):
+		return self
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+def iterDofFile(source):
+	"""Returns an iterator over the obstacles in a DOF file.  Records are parsed as they are read.
+	@param source: Path to a DOF file or a file-like object.
+	@type source: str or file
+	@return: A DofReader.  Its currencyDate attribute is set before iteration begins.
+	@rtype: DofReader
+	@raise IOError: Raised if source is a path that does not exist.
+	"""
+	return DofReader(source)
+
+def readDofFile(dofPath, columnar=False):
+	"""Reads DOF file and converts to Obstacle objects.
+	@param dofPath: Path to the DOF file or a file-like object.
+	@param columnar: If True, the file is parsed in bulk by parseDofColumns (requires numpy).
+	@type columnar: bool
+	@return: A dict with the following keys: "obstacles" and "currencyDate".  "obstacles" is a list of Obstacle objects,
+	or a DofColumns sequence if columnar is True.
+	@rtype: dict
+	@raise IOError: Raised if dofPath does not exist.
+	"""
+	if columnar:
+		return readDofColumns(dofPath)
+	reader = iterDofFile(dofPath)
+	obstacles = list(reader)
+	return { "obstacles": obstacles, "currencyDate": reader.currencyDate }
+
+def readDofColumns(dofPath):
+	"""Reads a DOF file in columnar mode.  See parseDofColumns.
+	@param dofPath: Path to the DOF file or a file-like object.
+	@return: A dict with the following keys: "obstacles", "columns" and "currencyDate".  "obstacles" is a DofColumns 
+	sequence over the "columns" arrays.
+	@rtype: dict
+	@raise IOError: Raised if dofPath does not exist.
+	"""
+	if isinstance(dofPath, basestring):
+		if not os.path.exists(dofPath):
+			raise IOError("File not found: %s" % dofPath)
+		with open(dofPath, "rb") as f:
+			result = parseDofColumns(f.read())
+	else:
+		result = parseDofColumns(dofPath.read())
+	result["obstacles"] = DofColumns(result["columns"])
+	return result
+
+class DofRecords(object):
+	"""A read-only sequence of records (see obstacleRecord) for selected rows of the column arrays returned by 
+	parseDofColumns.  Records are only created when they are accessed.
+	"""
+	def __init__(self, columns, indices):
+		self.columns = columns
+		self.indices = indices
+	def __len__(self):
+		return len(self.indices)
+	def __iter__(self):
+		columns = self.columns
+		for i in self.indices:
+			yield obstacleRecord(Obstacle.fromColumns(columns, i))
+	def batches(self, batchSize):
+		"""Yields the records as lists of at most batchSize records."""
+		columns = self.columns
+		for start in xrange(0, len(self.indices), batchSize):
+			yield [obstacleRecord(Obstacle.fromColumns(columns, i)) for i in self.indices[start:start + batchSize]]
+
+def datumPartitions(columns):
+	"""Splits the records of a columnar DOF by vertical datum with a single vectorized comparison of the date column.
+	@param columns: The column arrays returned by parseDofColumns.
+	@return: A tuple of two arrays of record indices, each in file order: the NAVD 88 records and the NGVD 29 records.
+	(Records with an invalid date, which parseDofColumns stores as 0, are NGVD 29, as with _isNgvd1929.)
+	@rtype: tuple
+	"""
+	is29 = columns["date"] < _zDate.toordinal()
+	return numpy.flatnonzero(~is29), numpy.flatnonzero(is29)
+
+def readDofPartitions(dofPath):
+	"""Reads a DOF file in columnar mode and partitions its records by vertical datum, so that each partition can be 
+	written as one contiguous run.  The whole file is held in memory.
+	@param dofPath: Path to the DOF file or a file-like object.
+	@return: A dict with the keys "currencyDate", "navd88" and "ngvd29".  The partitions are DofRecords sequences.
+	@rtype: dict
+	@raise IOError: Raised if dofPath does not exist.
+	@raise ImportError: Raised if numpy is not installed.
+	"""
+	result = readDofColumns(dofPath)
+	columns = result["columns"]
+	indices88, indices29 = datumPartitions(columns)
+	return {
+		"currencyDate": result["currencyDate"],
+		"navd88": DofRecords(columns, indices88),
+		"ngvd29": DofRecords(columns, indices29)
+	}
+
+def _planShards(dofPaths, shardSize):
+	"""Splits DOF files into (path, start, stop) ranges of record indices, each covering about shardSize bytes.
+	"""
+	shards = []
+	for dofPath in dofPaths:
+		with MappedDofFile(dofPath) as dof:
+			count, stride = len(dof), dof.stride
+		step = max(1, shardSize // stride)
+		start = 0
+		while True:
+			stop = min(start + step, count)
+			shards.append((dofPath, start, stop))
+			if stop >= count:
+				break
+			start = stop
+	return shards
+
+def _parseShard(shard):
+	"""Parses a range of the records of a DOF file.  This runs in the worker processes of parseDofShards, so it has to
+	be a module-level function.
+	@param shard: A (path, start, stop) tuple of record indices.  The currency date is returned for the shard that
+	starts at 0.
+	@return: A tuple of the currency date (None unless the shard is the first) and a list of encoded records as
+	returned by obstacleRecord.
+	@rtype: tuple
+	"""
+	dofPath, start, stop = shard
+	with MappedDofFile(dofPath) as dof:
+		currencyDate = dof.currencyDate if start == 0 else None
+		records = [obstacleRecord(obstacle, True) for obstacle in dof[start:stop]]
+	return currencyDate, records
+
+def parseDofShards(dofPaths, processes=None, shardSize=_defaultShardSize):
+	"""Parses DOF files in a process pool.  Each file is split into shards of about shardSize bytes (at record 
+	boundaries), and each shard is parsed by one worker.
+	Results are yielded in file order.  At most two shards per process are parsed ahead of the consumer, so memory 
+	use does not grow with the size of the files when the consumer (e.g., a geodatabase insert cursor) is slower than 
+	the workers.
+	@param dofPaths: Paths to DOF files.
+	@param processes: The number of worker processes.  Defaults to the number of CPUs.
+	@type processes: int
+	@param shardSize: The approximate number of bytes in a shard.
+	@type shardSize: int
+	@return: Yields (currency date, records) tuples as returned by _parseShard.  The currency date is only set for the 
+	first shard of each file.  The records are encoded (see encodeValues) to reduce the memory they use and the data 
+	passed between processes.
+	@raise IOError: Raised if one of the files does not exist.
+	"""
+	shards = _planShards(dofPaths, shardSize)
+	pool = multiprocessing.Pool(processes)
+	try:
+		window = 2 * (processes or multiprocessing.cpu_count())
+		pending = collections.deque()
+		for shard in shards:
+			pending.append(pool.apply_async(_parseShard, (shard,)))
+			if len(pending) >= window:
+				yield pending.popleft().get()
+		while pending:
+			yield pending.popleft().get()
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def _obstacleKey(orsCode, obstacleNumber):
+	"""Returns the key that identifies an obstacle, ignoring any padding of the values read from the geodatabase.
+	"""
+	return (orsCode or "").strip(), (obstacleNumber or "").strip()
+
+def _obstacleSignature(values, x, y):
+	"""Returns a hash of an obstacle's attribute values and coordinates that is the same whether the obstacle was read 
+	from a DOF file or from the geodatabase.  (Text read back from the geodatabase may be unicode, padded or NULL, dates 
+	are read back as datetimes, and coordinates are only compared to the precision of a DOF file: hundredths of an 
+	arc-second.  The geodatabase stores coordinates on a much finer grid, so rounding them to a number of decimal 
+	degrees would flip values that lie near a rounding boundary.)
+	@param values: The attribute values, in the order of _obstacleFields.
+	@param x: The longitude in decimal degrees.
+	@param y: The latitude in decimal degrees.
+	@rtype: int
+	"""
+	normalized = []
+	for value in values:
+		if value is None:
+			value = ""
+		elif isinstance(value, basestring):
+			value = value.strip()
+		elif isinstance(value, datetime.datetime):
+			value = value.date()
+		normalized.append(value)
+	normalized.append(int(round(x * 360000)))
+	normalized.append(int(round(y * 360000)))
+	return hash(tuple(normalized))
+
+def computeDofDelta(existing, obstacles):
+	"""Compares obstacles read from DOF files with the obstacles already in a geodatabase.
+	@param existing: The dict returned by readObstacleSignatures.  Matched obstacles are removed from it.
+	@type existing: dict
+	@param obstacles: The obstacles read from the DOF files.
+	@return: A tuple of three lists: the obstacles that are new, (object ID, obstacle) tuples for the obstacles that 
+	have changed, and the object IDs of the obstacles that no longer exist.
+	@rtype: tuple
+	"""
+	added, changed = [], []
+	for obstacle in obstacles:
+		values = _obstacleValues(obstacle)
+		key = _obstacleKey(*values[:2])
+		match = existing.get(key)
+		if match is None:
+			added.append(obstacle)
+			continue
+		if isinstance(match, list):
+			match = match.pop(0)
+			if not existing[key]:
+				del existing[key]
+		else:
+			del existing[key]
+		if match[1] != _obstacleSignature(values, obstacle.longitudeDD, obstacle.latitudeDD):
+			changed.append((match[0], obstacle))
+	removed = []
+	for match in existing.itervalues():
+		if isinstance(match, list):
+			removed.extend(objectId for objectId, signature in match)
+		else:
+			removed.append(match[0])
+	return added, changed, removed
+
+def findDailyChangeFiles(url="http://tod.faa.gov/tod/public/", index_url="http://tod.faa.gov/tod/public/TOD_DOF.html", after=None, session=None, cache=None):
+	"""Lists the daily change (DDOF) files published on the FAA website.
+	@param url: The URL that the links on the index page are relative to.
+	@type url: str
+	@param index_url: The URL of the page that links to the DDOF_* zip archives.
+	@type index_url: str
+	@param after: If provided, only files dated after this date are listed.
+	@type after: datetime.date
+	@param session: The HTTP session used to read the index page.  If omitted, remotezip.default_session is used.
+	@type session: remotezip.HTTPSession
+	@param cache: If provided, the index page is only downloaded again if it has changed.
+	@type cache: remotezip.ZipCache
+	@return: A list of dicts with keys "name", "url" and "date", oldest first.
+	@rtype: list
+	"""
+	# This regular expression matches the links to the DDOF_* zip files.  Captures are 2-digit year, month, and day.
+	linkRe = re.compile(r"""<a href=['"](?P<path>[^'"]*DDOF_(\d{2})(\d{2})(\d{2})\.zip)['"]>""", re.IGNORECASE)
+	if session is None:
+		session = remotezip.default_session
+	html = remotezip.get_page(index_url, session, cache)
+	output = {}
+	for path, year, month, day in linkRe.findall(html):
+		fileUrl = urllib2.urlparse.urljoin(url, path)
+		date = datetime.date(int("20" + year), int(month), int(day))
+		if after is None or date > after:
+			output[fileUrl] = {"name": os.path.basename(path), "url": fileUrl, "date": date}
+	return sorted(output.values(), key=lambda changeFile: changeFile["date"])
+
+def readDailyChanges(changeFiles, orsCodes=None, session=None, cache=None):
+	"""Reads the change records of daily change files.
+	@param changeFiles: The change files, as returned by findDailyChangeFiles.
+	@type changeFiles: list
+	@param orsCodes: If provided, only records with these ORS codes are read.
+	@type orsCodes: set
+	@param session: The HTTP session used to download the files.
+	@type session: remotezip.HTTPSession
+	@param cache: If provided, downloaded files are cached.
+	@type cache: remotezip.ZipCache
+	@return: The obstacles, in the order in which the changes must be applied.
+	@rtype: list
+	@raise ValueError: Raised if a change file's zip archive does not contain exactly one .Dat file.
+	"""
+	obstacles = []
+	for changeFile in changeFiles:
+		archive = remotezip.HTTPZipFile(changeFile["url"], session, cache)
+		names = [name for name in archive.namelist() if name.lower().endswith(".dat")]
+		if len(names) != 1:
+			raise ValueError("Expected one data file in %s, found %d." % (changeFile["url"], len(names)))
+		for obstacle in DofReader(archive.open(names[0]), closeSource=True):
+			if orsCodes is None or obstacle.orsCode in orsCodes:
+				obstacles.append(obstacle)
+	return obstacles
+
+def computeDailyDelta(existing, obstacles):
+	"""Converts daily change records into the changes to make to a geodatabase.  Records are applied in order, using 
+	their action code: "A" (added), "C" (changed) or "D" (dismantled).  Only the last record for each obstacle counts.
+	@param existing: The dict returned by readObstacleSignatures.
+	@type existing: dict
+	@param obstacles: The change records.
+	@return: A tuple of three lists in the form returned by computeDofDelta.
+	@rtype: tuple
+	@raise ValueError: Raised if a record has an unknown action code.
+	"""
+	final = {}
+	order = []
+	for obstacle in obstacles:
+		action = obstacle.action
+		if action not in ("A", "C", "D"):
+			raise ValueError("Unknown action %r for obstacle %s-%s." % (action, obstacle.orsCode, obstacle.obstacleNumber))
+		key = _obstacleKey(obstacle.orsCode, obstacle.obstacleNumber)
+		if key not in final:
+			order.append(key)
+		final[key] = None if action == "D" else obstacle
+	
+	added, changed, removed = [], [], []
+	for key in order:
+		obstacle = final[key]
+		match = existing.get(key)
+		matches = match if isinstance(match, list) else [match] if match is not None else []
+		if obstacle is None:
+			removed.extend(objectId for objectId, signature in matches)
+		elif not matches:
+			added.append(obstacle)
+		else:
+			# An obstacle that was added again, or changed, replaces the existing feature (and any duplicates).
+			changed.append((matches[0][0], obstacle))
+			removed.extend(objectId for objectId, signature in matches[1:])
+	return added, changed, removed
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+'''
+Compares two releases of a Digital Obstacle File (DOF) and lists the obstacles that were added, changed or removed.
+
+Both releases are sorted by obstacle number and merged, so the files never have to be loaded into lists of obstacles.
+Inputs that do not fit in the memory budget are sorted in runs that are spilled to temporary files and merged.
+
+@author: Jeff Jacobson
+'''
+
+import sys, os, heapq, tempfile, zipfile, dofcore, remotezip
+
+_defaultMemoryBudget = 64 << 20 # Bytes of record lines held in memory while sorting both inputs.
+_lineOverhead = 40 # Approximate memory used by a str object in addition to its characters.
+_keyLength = 10 # Records are keyed by the ORS code and obstacle number (e.g., "53-000001").
+
+# Fixed-width position of each field that is compared, keyed by the name of the Obstacle attribute.
+_diffColumns = dict(dofcore._textColumns)
+_diffColumns.update(dofcore._intColumns)
+_diffColumns.update({
+	"latitude": (35, 47),
+	"longitude": (48, 61),
+	"date": (114, 121)
+})
+
+class DofChange(object):
+	"""A difference between two releases of a DOF.
+	The action is one of the DOF action codes: "A" if the obstacle was added, "C" if it was changed, or "D" if it was
+	removed (dismantled).
+	"""
+	__slots__ = ("action", "key", "oldLine", "newLine")
+	def __init__(self, action, key, oldLine, newLine):
+		self.action = action
+		self.key = key
+		self.oldLine = oldLine
+		self.newLine = newLine
+	@property
+	def old(self):
+		"""The obstacle in the old release, or None if it was added."""
+		if self.oldLine is not None:
+			return dofcore.Obstacle(self.oldLine)
+	@property
+	def new(self):
+		"""The obstacle in the new release, or None if it was removed."""
+		if self.newLine is not None:
+			return dofcore.Obstacle(self.newLine)
+	@property
+	def changedFields(self):
+		"""The names of the Obstacle attributes that differ between the releases, sorted by their position in the
+		record.  Empty unless the obstacle was changed.
+		"""
+		if self.oldLine is None or self.newLine is None:
+			return []
+		return [name for name, (start, end) in sorted(_diffColumns.items(), key=lambda item: item[1])
+				if self.oldLine[start:end] != self.newLine[start:end]]
+	def __repr__(self):
+		return "DofChange(%r, %r, %s)" % (self.action, self.key, ",".join(self.changedFields))
+
+class _MemberFile(object):
+	"""A DOF file read from a ZIP archive.  Closing it also closes the archive, and deletes the file if it is a temporary
+	copy of the member.
+	"""
+	def __init__(self, f, archive=None, tempPath=None):
+		self._file = f
+		self._archive = archive
+		self._tempPath = tempPath
+	def readline(self, *args):
+		return self._file.readline(*args)
+	def __iter__(self):
+		return iter(self._file)
+	def close(self):
+		self._file.close()
+		if self._archive is not None:
+			self._archive.close()
+			self._archive = None
+		if self._tempPath is not None:
+			os.remove(self._tempPath)
+			self._tempPath = None
+
+def _datafileName(archive, source, member):
+	"""Returns the name of the DOF file to read from an archive."""
+	if member is not None:
+		return member
+	datafiles = [name for name in archive.namelist() if name.lower().endswith(".dat")]
+	if len(datafiles) != 1:
+		raise ValueError("Specify which data file in %s to compare: %s" % (source, ", ".join(datafiles)))
+	return datafiles[0]
+
+def openDof(source, member=None, tempDir=None):
+	"""Opens a DOF file for reading.
+	A member of a remote archive is extracted to a temporary file (which is deleted when the reader is closed) rather 
+	than read into memory, so memory use does not depend on the size of the member.
+	@param source: The path to a DOF file, or the path or URL of a ZIP archive (e.g., DOF_120304.zip) that contains one.
+	@type source: str
+	@param member: The name of the DOF file in the ZIP archive.  May be omitted if the archive contains only one .Dat
+	file.
+	@type member: str
+	@param tempDir: The directory for the temporary copy of a member of a remote archive.
+	@type tempDir: str
+	@rtype: dofcore.DofReader
+	@raise ValueError: Raised if member was omitted and the archive contains more than one .Dat file, or none.
+	"""
+	if source.lower().startswith(("http://", "https://")):
+		archive = remotezip.HTTPZipFile(source)
+		member = _datafileName(archive, source, member)
+		handle, tempPath = tempfile.mkstemp(".Dat", dir=tempDir)
+		os.close(handle)
+		try:
+			archive.extract_to(member, tempPath)
+			f = open(tempPath, "rb")
+		except:
+			os.remove(tempPath)
+			raise
+		return dofcore.DofReader(_MemberFile(f, tempPath=tempPath), closeSource=True)
+	if not source.lower().endswith(".zip"):
+		return dofcore.DofReader(source)
+	archive = zipfile.ZipFile(source)
+	try:
+		f = archive.open(_datafileName(archive, source, member))
+	except:
+		archive.close()
+		raise
+	return dofcore.DofReader(_MemberFile(f, archive), closeSource=True)
+
+def _normalizedLines(reader):
+	"""Yields the records of a DofReader with a single LF line ending."""
+	for line in reader.iterLines():
+		yield line.rstrip("\r\n") + "\n"
+
+def _spill(lines, tempDir):
+	"""Writes sorted lines to a temporary file and returns its path."""
+	handle, path = tempfile.mkstemp(".dofrun", dir=tempDir)
+	with os.fdopen(handle, "wb") as f:
+		f.writelines(lines)
+	return path
+
+def _readRun(path):
+	"""Yields the lines of a sorted run, deleting the file when done."""
+	try:
+		with open(path, "rb") as f:
+			for line in f:
+				yield line
+	finally:
+		os.remove(path)
+
+def sortedLines(lines, memoryBudget=_defaultMemoryBudget, tempDir=None):
+	"""Sorts DOF records by obstacle number.  If the records do not fit in the memory budget, they are sorted in runs
+	that are written to temporary files and then merged.
+	@param lines: Record lines, each ending in a single LF.
+	@param memoryBudget: The approximate number of bytes of lines to hold in memory.
+	@type memoryBudget: int
+	@param tempDir: The directory for the temporary files.  Defaults to the system temporary directory.
+	@type tempDir: str
+	"""
+	runs, readers = [], []
+	try:
+		chunk, size = [], 0
+		for line in lines:
+			chunk.append(line)
+			size += len(line) + _lineOverhead
+			if size >= memoryBudget:
+				chunk.sort()
+				runs.append(_spill(chunk, tempDir))
+				chunk, size = [], 0
+		chunk.sort()
+		if not runs:
+			for line in chunk:
+				yield line
+			return
+		if chunk:
+			runs.append(_spill(chunk, tempDir))
+		del chunk
+		readers = [_readRun(path) for path in runs]
+		for line in heapq.merge(*readers):
+			yield line
+	finally:
+		for reader in readers:
+			reader.close()
+		for path in runs:
+			if os.path.exists(path):
+				os.remove(path)
+
+class DofDiff(object):
+	"""Compares two releases of a DOF.  Iterating yields a DofChange for each obstacle that was added, changed or
+	removed, in order of obstacle number.
+	Both files are opened and their headers read when the object is created, so their currency dates are available
+	before the comparison begins.
+	"""
+	def __init__(self, old, new, member=None, memoryBudget=_defaultMemoryBudget, tempDir=None):
+		"""Opens both releases.
+		@param old: The older release: the path to a DOF file, or the path or URL of a ZIP archive.
+		@type old: str
+		@param new: The newer release, in the same forms as old.
+		@type new: str
+		@param member: The name of the DOF file to compare when old or new is a ZIP archive with more than one.
+		@type member: str
+		@param memoryBudget: The approximate number of bytes of records held in memory, shared between the two inputs.
+		@type memoryBudget: int
+		@param tempDir: The directory for sorted runs that do not fit in memory, and for the members of remote archives.
+		@type tempDir: str
+		"""
+		self._oldReader = openDof(old, member, tempDir)
+		try:
+			self._newReader = openDof(new, member, tempDir)
+		except:
+			self._oldReader.close()
+			raise
+		self.oldCurrencyDate = self._oldReader.currencyDate
+		self.newCurrencyDate = self._newReader.currencyDate
+		self._memoryBudget = memoryBudget
+		self._tempDir = tempDir
+	def __iter__(self):
+		budget = self._memoryBudget // 2
+		oldLines = sortedLines(_normalizedLines(self._oldReader), budget, self._tempDir)
+		newLines = sortedLines(_normalizedLines(self._newReader), budget, self._tempDir)
+		try:
+			oldLine = next(oldLines, None)
+			newLine = next(newLines, None)
+			while oldLine is not None or newLine is not None:
+				oldKey = oldLine[:_keyLength] if oldLine is not None else None
+				newKey = newLine[:_keyLength] if newLine is not None else None
+				if newLine is None or (oldLine is not None and oldKey < newKey):
+					yield DofChange("D", oldKey.rstrip(), oldLine, None)
+					oldLine = next(oldLines, None)
+				elif oldLine is None or newKey < oldKey:
+					yield DofChange("A", newKey.rstrip(), None, newLine)
+					newLine = next(newLines, None)
+				else:
+					if oldLine != newLine:
+						yield DofChange("C", oldKey.rstrip(), oldLine, newLine)
+					oldLine = next(oldLines, None)
+					newLine = next(newLines, None)
+		finally:
+			# Closing the generators deletes any remaining sorted runs.
+			oldLines.close()
+			newLines.close()
+			self.close()
+	def close(self):
+		"""Closes both files."""
+		self._oldReader.close()
+		self._newReader.close()
+	def __enter__(self):
+		return self
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+def diffDofs(old, new, member=None, memoryBudget=_defaultMemoryBudget, tempDir=None):
+	"""Returns the change feed between two releases of a DOF.
+	@param old: The older release: the path to a DOF file, or the path or URL of a ZIP archive.
+	@param new: The newer release.
+	@param member: The name of the DOF file to compare when an archive contains more than one.
+	@param memoryBudget: The approximate number of bytes of records held in memory.
+	@param tempDir: The directory for sorted runs that do not fit in memory.
+	@return: A DofDiff, which yields DofChange objects in order of obstacle number.
+	@rtype: DofDiff
+	"""
+	return DofDiff(old, new, member, memoryBudget, tempDir)
+
+def main(argv=None):
+	"""Prints the changes between two releases.
+	Usage: dofdiff.py old new [member]
+	"""
+	if argv is None:
+		argv = sys.argv
+	if len(argv) < 3:
+		print main.__doc__
+		return 2
+	member = argv[3] if len(argv) > 3 else None
+	with diffDofs(argv[1], argv[2], member) as diff:
+		print "Old currency date: %s, new currency date: %s" % (diff.oldCurrencyDate, diff.newCurrencyDate)
+		for change in diff:
+			print "%s %s %s" % (change.action, change.key, " ".join(change.changedFields))
+
+if __name__ == "__main__":
+	sys.exit(main())
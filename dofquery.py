@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+'''
+Indexed attribute queries over DOF records parsed into columns (see dofcore.readDofColumns).
+
+Fields that have a domain (see dofcore._domains) get a bitmap for each of their values.  The height and date columns get
+sorted indexes, so a range is found with a binary search.  Obstacle numbers and FAA study numbers are looked up through
+hash indexes.  A query combines the bitmaps of its conditions with bitwise operations instead of testing every record.
+Requires numpy.
+
+@author: Jeff Jacobson
+'''
+
+import dofcore
+from dofcore import numpy
+
+def _domainColumns():
+	"""Returns the names of the columns (Obstacle attributes) of the fields that have a domain.
+	"""
+	return [fieldName[0].lower() + fieldName[1:]
+			for fieldName, fieldType, length, alias, nullable, required, domain in dofcore._obstacleSchema
+			if domain is not None]
+
+_rangeColumns = ("aglHT", "AmslHT", "date")
+
+class ObstacleTable(object):
+	"""Indexes the columns of a parsed DOF for attribute queries.
+	Conditions are given as keyword arguments named after Obstacle attributes:
+		- a domain field (e.g., obstacleType, lighting, markIndicator, verificationStatus) takes a value or a list of
+		values.
+		- aglHT, AmslHT and date take a (minimum, maximum) tuple.  Both ends are inclusive and either may be None.
+		Dates are datetime.date objects; a record without a valid date does not meet a date condition.
+	All conditions must be met.  For example, unlit towers more than 200 feet above ground level:
+		table.find(obstacleType="TOWER", lighting="N", aglHT=(201, None))
+	"""
+	def __init__(self, columns):
+		"""Builds the indexes.
+		@param columns: The "columns" dict returned by dofcore.readDofColumns or dofcore.parseDofColumns.
+		@type columns: dict
+		@raise ImportError: Raised if numpy is not installed.
+		"""
+		if numpy is None:
+			raise ImportError("numpy is required to query DOF columns.")
+		self.columns = columns
+		self._count = count = len(columns["date"])
+		self._all = numpy.packbits(numpy.ones(count, dtype=bool))
+
+		# Bitmap indexes: column name -> {value: packed bitmap}
+		self._bitmaps = {}
+		for name in _domainColumns():
+			values, inverse = numpy.unique(columns[name], return_inverse=True)
+			self._bitmaps[name] = dict((value, numpy.packbits(inverse == i)) for i, value in enumerate(values.tolist()))
+
+		# Sorted indexes: column name -> (sorted values, record indices in that order)
+		self._sorted = {}
+		for name in _rangeColumns:
+			order = numpy.argsort(columns[name], kind="mergesort")
+			self._sorted[name] = (columns[name][order], order)
+
+		# Hash indexes
+		numbers = numpy.char.add(numpy.char.add(columns["orsCode"], "-"), numpy.char.rstrip(columns["obstacleNumber"]))
+		self._byNumber = dict((number, i) for i, number in enumerate(numbers.tolist()))
+		self._byStudy = {}
+		for i, study in enumerate(columns["faaStudyNo"].tolist()):
+			if study:
+				self._byStudy.setdefault(study, []).append(i)
+
+	def __len__(self):
+		return self._count
+
+	def obstacle(self, index):
+		"""Returns the obstacle at a record index."""
+		return dofcore.Obstacle.fromColumns(self.columns, index)
+
+	def getByNumber(self, obstacleNumber):
+		"""Returns an obstacle by its ORS code and obstacle number (e.g., "53-000123"), or None if there is none."""
+		index = self._byNumber.get(obstacleNumber)
+		return self.obstacle(index) if index is not None else None
+
+	def getByStudy(self, faaStudyNo):
+		"""Returns the obstacles with an FAA study number, in file order."""
+		return [self.obstacle(index) for index in self._byStudy.get(faaStudyNo, ())]
+
+	def _valueBitmap(self, name, value):
+		bitmaps = self._bitmaps[name]
+		if isinstance(value, (list, tuple, set, frozenset)):
+			result = numpy.zeros_like(self._all)
+			for item in value:
+				if item in bitmaps:
+					result |= bitmaps[item]
+			return result
+		if value in bitmaps:
+			return bitmaps[value]
+		return numpy.zeros_like(self._all)
+
+	def _rangeBitmap(self, name, bounds):
+		minimum, maximum = bounds
+		if name == "date":
+			# Records without a valid date (ordinal 0) do not meet any date condition.
+			minimum = minimum.toordinal() if minimum is not None else 1
+			maximum = maximum.toordinal() if maximum is not None else None
+		values, order = self._sorted[name]
+		start = numpy.searchsorted(values, minimum, "left") if minimum is not None else 0
+		end = numpy.searchsorted(values, maximum, "right") if maximum is not None else len(values)
+		selected = numpy.zeros(self._count, dtype=bool)
+		selected[order[start:end]] = True
+		return numpy.packbits(selected)
+
+	def _bitmap(self, conditions):
+		result = self._all
+		for name, value in conditions.items():
+			if name in self._bitmaps:
+				bitmap = self._valueBitmap(name, value)
+			elif name in self._sorted:
+				bitmap = self._rangeBitmap(name, value)
+			else:
+				raise ValueError("%s is not an indexed field." % name)
+			result = result & bitmap
+		return result
+
+	def find(self, **conditions):
+		"""Returns the record indices that meet all of the conditions, in file order.
+		@rtype: numpy.ndarray
+		@raise ValueError: Raised if a condition names a field that is not indexed.
+		"""
+		return numpy.flatnonzero(numpy.unpackbits(self._bitmap(conditions))[:self._count])
+
+	def count(self, **conditions):
+		"""Returns the number of records that meet all of the conditions.
+		@rtype: int
+		"""
+		return int(numpy.unpackbits(self._bitmap(conditions))[:self._count].sum())
+
+	def findObstacles(self, **conditions):
+		"""Returns the obstacles that meet all of the conditions, in file order.
+		@rtype: list
+		"""
+		return [self.obstacle(index) for index in self.find(**conditions)]
+
+def readObstacleTable(dofPath):
+	"""Reads a DOF file in columnar mode and indexes it.
+	@param dofPath: Path to the DOF file or a file-like object.
+	@rtype: ObstacleTable
+	"""
+	return ObstacleTable(dofcore.readDofColumns(dofPath)["columns"])
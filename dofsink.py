@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+'''
+Output sinks that write batches of parsed DOF records.
+
+A sink receives lists of records as returned by dofcore.obstacleRecord, so a loader only has to group the parsed records
+into batches.  ArcGisSink writes to a file geodatabase created by faadof.createDofGdb.  GeoPackageSink writes a
+GeoPackage (SQLite) file with the same schema, domains and currency date table, and does not need ArcGIS.
+
+@author: Jeff Jacobson
+'''
+
+import os, datetime, struct, sqlite3, dofcore, faadof
+
+_defaultBatchSize = 5000
+_feetPerMeter = 1 / 0.3048006096012192 # NGVD 29 heights are in US survey feet, NAVD 88 heights in meters.
+
+class DofSink(object):
+	"""Base class of the output sinks.  Subclasses implement writeBatch and, if needed, setCurrencyDate and close.
+	A sink can be used in a with statement.  If the block raises an exception, the sink is closed without saving the
+	current batch.
+	"""
+	def writeBatch(self, records):
+		"""Writes a batch of records.
+		@param records: A list of records as returned by dofcore.obstacleRecord.  Their values may be encoded (see
+		dofcore.encodeValues), and are decoded as they are written.
+		@type records: list
+		"""
+		raise NotImplementedError()
+	def setCurrencyDate(self, currencyDate):
+		"""Sets the currency date of the data that has been written.
+		@type currencyDate: datetime.date
+		"""
+		raise NotImplementedError()
+	def close(self, commit=True):
+		"""Releases the resources held by the sink.
+		@param commit: If False, changes that have not been saved are discarded.
+		@type commit: bool
+		"""
+		pass
+	def __enter__(self):
+		return self
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close(exc_type is None)
+
+class ArcGisSink(DofSink):
+	"""Writes records to the Obstacles feature class of a DOF geodatabase (see faadof.createDofGdb) with a single
+	arcpy.da.InsertCursor, which takes each row as a tuple rather than through per-field calls.
+	Records whose heights are NGVD 29 are inserted as geometries with the WGS 84 + NGVD 29 spatial reference, so that
+	they are converted to the feature class's vertical coordinate system the same way as with readDofsIntoGdb's
+	cursor29.
+	"""
+	def __init__(self, gdbPath):
+		"""Opens the insert cursor.
+		@param gdbPath: The path to an existing DOF geodatabase.
+		@type gdbPath: str
+		"""
+		arcpy = faadof.arcpy
+		self._arcpy = arcpy
+		self._gdbPath = gdbPath
+		self._spatialReference29 = arcpy.SpatialReference()
+		self._spatialReference29.loadFromString("%s,%s" % (dofcore._wgs84, dofcore._ngvd1929))
+		self._cursor = arcpy.da.InsertCursor(os.path.join(gdbPath, "Obstacles"), ("SHAPE@",) + dofcore._obstacleFields)
+		self._currencyDate = None
+	def writeBatch(self, records):
+		arcpy = self._arcpy
+		insertRow = self._cursor.insertRow
+		for is29, values, x, y in records:
+			values = dofcore.decodeValues(values)
+			point = arcpy.Point(x, y, values[8]) # Z is the above ground level height.
+			if is29:
+				shape = arcpy.PointGeometry(point, self._spatialReference29, True)
+			else:
+				shape = arcpy.PointGeometry(point, None, True)
+			date = values[-1]
+			if date is not None:
+				date = datetime.datetime(date.year, date.month, date.day)
+			insertRow((shape,) + values[:-1] + (date,))
+	def setCurrencyDate(self, currencyDate):
+		self._currencyDate = currencyDate
+	def close(self, commit=True):
+		if self._cursor is None:
+			return
+		# An insert cursor has no rollback; rows that have been inserted are kept.
+		del self._cursor
+		self._cursor = None
+		if commit and self._currencyDate is not None:
+			faadof._updateCurrencyDate(os.path.join(self._gdbPath, "CurrencyDate"), self._currencyDate)
+
+# GeoPackage spatial reference systems for the two vertical datums: vertical datum name -> (srs_id, name, definition).
+_gpkgSrs = {
+	"NAVD88": (95703, "WGS 84 + NAVD88 height", "%s,%s" % (dofcore._wgs84, dofcore._navd1988)),
+	"NGVD29": (95702, "WGS 84 + NGVD29 height", "%s,%s" % (dofcore._wgs84, dofcore._ngvd1929))
+}
+# SQLite column types of the geodatabase field types used by dofcore._obstacleSchema.
+_gpkgTypes = {
+	"TEXT": "TEXT",
+	"SHORT": "SMALLINT",
+	"LONG": "INTEGER",
+	"DATE": "DATE"
+}
+
+def _gpkgPoint(srsId, x, y, z):
+	"""Encodes a point with a Z value as a GeoPackage geometry blob (little-endian, no envelope)."""
+	return buffer(struct.pack("<2sBBi", "GP", 0, 1, srsId) + struct.pack("<BIddd", 1, 1001, x, y, z))
+
+class GeoPackageSink(DofSink):
+	"""Writes records to a new GeoPackage file.
+	The file contains an Obstacles point (Z) layer with the fields of faadof.createDofFeatureClass, the domains of
+	faadof.createDomains as enum constraints of the schema extension (gpkg_data_column_constraints), and a CurrencyDate
+	attribute table.  Each batch is written with executemany in its own transaction.
+	"""
+	def __init__(self, path, verticalDatum="NAVD88"):
+		"""Creates the GeoPackage, replacing any existing file.
+		@param path: The path of the GeoPackage file.
+		@type path: str
+		@param verticalDatum: The vertical datum of the Obstacles layer: "NAVD88" (meters) or "NGVD29" (US survey
+		feet).  The heights of records in the other datum are converted to the layer's units.
+		@type verticalDatum: str
+		@raise ValueError: Raised if verticalDatum is not one of the supported values.
+		"""
+		if verticalDatum not in _gpkgSrs:
+			raise ValueError("Unsupported vertical datum: %s" % verticalDatum)
+		if os.path.exists(path):
+			os.remove(path)
+		self._is29 = verticalDatum == "NGVD29"
+		self._srsId = _gpkgSrs[verticalDatum][0]
+		self._connection = sqlite3.connect(path)
+		self._createSchema()
+		columns = ("Shape",) + dofcore._obstacleFields
+		self._insertSql = "INSERT INTO Obstacles (%s) VALUES (%s)" % (", ".join(columns), ", ".join("?" * len(columns)))
+		self._extent = None
+	def _createSchema(self):
+		connection = self._connection
+		now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+		with connection:
+			connection.execute("PRAGMA application_id = 1196444487") # "GPKG"
+			connection.execute("PRAGMA user_version = 10200")
+			connection.execute("""CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY,
+				organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL,
+				description TEXT)""")
+			srsRows = [
+				("WGS 84 geodetic", 4326, "EPSG", 4326, dofcore._wgs84, None),
+				("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+				("Undefined geographic SRS", 0, "NONE", 0, "undefined", None)
+			]
+			srsRows.extend((name, srsId, "NONE", srsId, definition, None) for srsId, name, definition in _gpkgSrs.values())
+			connection.executemany("INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", srsRows)
+			connection.execute("""CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY,
+				data_type TEXT NOT NULL, identifier TEXT UNIQUE, description TEXT DEFAULT '',
+				last_change DATETIME NOT NULL, min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER,
+				CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""")
+			connection.execute("""CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL,
+				column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL,
+				z TINYINT NOT NULL, m TINYINT NOT NULL, PRIMARY KEY (table_name, column_name))""")
+			connection.execute("""CREATE TABLE gpkg_extensions (table_name TEXT, column_name TEXT,
+				extension_name TEXT NOT NULL, definition TEXT NOT NULL, scope TEXT NOT NULL,
+				CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))""")
+			connection.execute("""CREATE TABLE gpkg_data_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+				name TEXT, title TEXT, description TEXT, mime_type TEXT, constraint_name TEXT,
+				CONSTRAINT pk_gdc PRIMARY KEY (table_name, column_name))""")
+			connection.execute("""CREATE TABLE gpkg_data_column_constraints (constraint_name TEXT NOT NULL,
+				constraint_type TEXT NOT NULL, value TEXT, min NUMERIC, min_is_inclusive BOOLEAN, max NUMERIC,
+				max_is_inclusive BOOLEAN, description TEXT,
+				CONSTRAINT gdcc_ntv UNIQUE (constraint_name, constraint_type, value))""")
+			connection.executemany("INSERT INTO gpkg_extensions VALUES (?, NULL, 'gpkg_schema', ?, 'read-write')", [
+				("gpkg_data_columns", "http://www.geopackage.org/spec/#extension_schema"),
+				("gpkg_data_column_constraints", "http://www.geopackage.org/spec/#extension_schema")
+			])
+
+			# Domains
+			for domainName, domainDef in dofcore._domains.items():
+				connection.executemany("INSERT INTO gpkg_data_column_constraints VALUES (?, 'enum', ?, NULL, NULL, NULL, NULL, ?)",
+									[(domainName, code, description) for code, description in domainDef["domains"].items()])
+
+			# Obstacles layer
+			columns = ["fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL", "Shape POINTZ"]
+			dataColumns = []
+			for fieldName, fieldType, length, alias, nullable, required, domain in dofcore._obstacleSchema:
+				column = "%s %s" % (fieldName, _gpkgTypes[fieldType])
+				if length is not None:
+					column += "(%d)" % length
+				if nullable == "NON_NULLABLE":
+					column += " NOT NULL"
+				columns.append(column)
+				if alias is not None or domain is not None:
+					dataColumns.append(("Obstacles", fieldName, fieldName, alias, domain))
+			connection.execute("CREATE TABLE Obstacles (%s)" % ", ".join(columns))
+			connection.executemany("INSERT INTO gpkg_data_columns (table_name, column_name, name, title, constraint_name) VALUES (?, ?, ?, ?, ?)", dataColumns)
+			connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, last_change, srs_id) VALUES ('Obstacles', 'features', 'Obstacles', ?, ?)",
+							(now, self._srsId))
+			connection.execute("INSERT INTO gpkg_geometry_columns VALUES ('Obstacles', 'Shape', 'POINT', ?, 1, 0)", (self._srsId,))
+
+			# Currency date table
+			connection.execute("CREATE TABLE CurrencyDate (fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, CurrencyDate DATE)")
+			connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, last_change) VALUES ('CurrencyDate', 'attributes', 'CurrencyDate', ?)",
+							(now,))
+			connection.execute("INSERT INTO gpkg_data_columns (table_name, column_name, name, title) VALUES ('CurrencyDate', 'CurrencyDate', 'CurrencyDate', 'Currency Date')")
+	def writeBatch(self, records):
+		srsId = self._srsId
+		rows = []
+		minX, minY, maxX, maxY = self._extent or (None, None, None, None)
+		for is29, values, x, y in records:
+			values = dofcore.decodeValues(values)
+			z = values[8] # Z is the above ground level height.
+			if is29 != self._is29:
+				z = z * _feetPerMeter if self._is29 else z / _feetPerMeter
+			date = values[-1]
+			rows.append((_gpkgPoint(srsId, x, y, z),) + values[:-1] + (date.isoformat() if date is not None else None,))
+			minX, maxX = min(x, minX) if minX is not None else x, max(x, maxX)
+			minY, maxY = min(y, minY) if minY is not None else y, max(y, maxY)
+		with self._connection:
+			self._connection.executemany(self._insertSql, rows)
+		if rows:
+			self._extent = (minX, minY, maxX, maxY)
+	def setCurrencyDate(self, currencyDate):
+		with self._connection:
+			self._connection.execute("DELETE FROM CurrencyDate")
+			self._connection.execute("INSERT INTO CurrencyDate (CurrencyDate) VALUES (?)", (str(currencyDate),))
+	def close(self, commit=True):
+		if self._connection is None:
+			return
+		if commit:
+			with self._connection:
+				self._connection.execute("UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ? WHERE table_name = 'Obstacles'",
+									self._extent or (None, None, None, None))
+		else:
+			self._connection.rollback()
+		self._connection.close()
+		self._connection = None
+
+def writeDofs(sink, dofPaths, batchSize=_defaultBatchSize, processes=1, partitioned=False):
+	"""Parses DOF files and writes their obstacles to a sink in batches, then sets the sink's currency date to that of
+	the last file.
+	@param sink: The sink that receives the records.
+	@type sink: DofSink
+	@param dofPaths: Paths to DOF files.
+	@param batchSize: The number of records in each batch.
+	@type batchSize: int
+	@param processes: If greater than 1, the files are parsed in a process pool (see dofcore.parseDofShards).
+	@type processes: int
+	@param partitioned: If True, each file is parsed in columnar mode and split by vertical datum (see 
+	dofcore.readDofPartitions), so every batch holds records of a single datum.  Requires numpy.
+	@type partitioned: bool
+	@return: The number of records written.
+	@rtype: int
+	"""
+	count = 0
+	currencyDate = None
+	if processes > 1:
+		for shardCurrencyDate, records in dofcore.parseDofShards(dofPaths, processes):
+			if shardCurrencyDate is not None:
+				currencyDate = shardCurrencyDate
+			for i in xrange(0, len(records), batchSize):
+				sink.writeBatch(records[i:i + batchSize])
+			count += len(records)
+	elif partitioned:
+		for dofPath in dofPaths:
+			partitions = dofcore.readDofPartitions(dofPath)
+			for records in (partitions["navd88"], partitions["ngvd29"]):
+				for batch in records.batches(batchSize):
+					sink.writeBatch(batch)
+					count += len(batch)
+			currencyDate = partitions["currencyDate"]
+	else:
+		for dofPath in dofPaths:
+			with dofcore.iterDofFile(dofPath) as reader:
+				batch = []
+				for obstacle in reader:
+					batch.append(dofcore.obstacleRecord(obstacle))
+					if len(batch) >= batchSize:
+						sink.writeBatch(batch)
+						count += len(batch)
+						batch = []
+				if batch:
+					sink.writeBatch(batch)
+					count += len(batch)
+			currencyDate = reader.currencyDate
+	if currencyDate is not None:
+		sink.setCurrencyDate(currencyDate)
+	return count
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+'''
+Binary snapshots of parsed DOF data.
+
+A snapshot holds the column arrays of a DOF (see dofcore.parseDofColumns) as fixed-width binary columns.  Text columns
+with few distinct values are dictionary-encoded as small integer codes, and small integers are stored as 16-bit
+integers; columns are read back with the dtypes that parseDofColumns returns.  The original record lines are not stored;
+they are rebuilt from the columns when Obstacle objects are needed.  Only the few lines that cannot be rebuilt exactly
+(e.g., those with an invalid date) are kept, in the header, so the rebuilt lines are identical to the originals.  The 
+header records the currency date and the CRC-32 of the source .Dat file.  Opening a snapshot memory-maps the file, so columns are read without copying and
+without parsing any text.  openSnapshot writes the snapshot the first time a DOF is read and again only when the CRC of
+the DOF changes.  Requires numpy.
+
+@author: Jeff Jacobson
+'''
+
+import os, struct, mmap, zlib, cPickle, datetime, dofcore
+from dofcore import numpy
+
+_magic = "DOFSNAP\0"
+_fileVersion = 3
+_prefix = struct.Struct("<8sII") # Magic, version, length of the header that follows.
+_alignment = 8
+_crcBlockSize = 1 << 20
+_extension = ".dofsnap"
+
+# Text columns that are stored as they are instead of dictionary-encoded, because nearly every value is distinct.
+_plainColumns = ("obstacleNumber", "faaStudyNo")
+# Columns that are not stored because they can be rebuilt from the others.
+_derivedColumns = ("line",)
+# Positions of the latitude and longitude fields: (prefix of the column names, degrees, minutes, seconds, hemisphere).
+_dmsColumns = (("lat", (35, 37), (38, 40), 41, 46), ("lon", (48, 51), (52, 54), 55, 60))
+_dateColumn = 114
+
+def _storageType(array):
+	"""Returns the little-endian dtype a column is stored as."""
+	if array.dtype.kind in "iu":
+		if len(array) == 0 or (array.min() >= -0x8000 and array.max() <= 0x7fff):
+			return numpy.dtype("<i2")
+		return numpy.dtype("<i4")
+	if array.dtype.kind == "f":
+		return numpy.dtype("<f8")
+	return array.dtype
+
+def _codeType(size):
+	"""Returns the smallest unsigned integer dtype that holds codes for a dictionary of the given size."""
+	for dtype in ("<u1", "<u2"):
+		if size <= numpy.iinfo(dtype).max + 1:
+			return numpy.dtype(dtype)
+	return numpy.dtype("<u4")
+
+def _aligned(offset):
+	return (offset + _alignment - 1) // _alignment * _alignment
+
+def _putText(matrix, start, end, values):
+	"""Writes a text column into a record matrix, padded with spaces."""
+	width = end - start
+	field = numpy.ascontiguousarray(values, "S%d" % width).view(numpy.uint8).reshape((-1, width))
+	matrix[:, start:end] = numpy.where(field == 0, ord(" "), field)
+
+def _putDigits(matrix, start, end, values):
+	"""Writes an integer column into a record matrix as zero-padded digits.  A negative value is written with a leading
+	minus sign (e.g., "-0012"), which dofcore._columnInts reads back as the same value.
+	"""
+	values = numpy.asarray(values, numpy.int64)
+	powers = 10 ** numpy.arange(end - start - 1, -1, -1, dtype=numpy.int64)
+	matrix[:, start:end] = numpy.abs(values)[:, numpy.newaxis] // powers % 10 + ord("0")
+	matrix[values < 0, start] = ord("-")
+
+def _formatLines(columns, width=dofcore._dofRecordLength + 1, terminator="\n"):
+	"""Rebuilds the DOF record lines from the other columns (the inverse of dofcore.parseDofColumns).
+	Fields that could not be decoded when the DOF was parsed (e.g., an invalid date) are written as zeros or spaces, so
+	those lines differ from the originals (see _lineExceptions).
+	@param width: The width of each line, including its terminator.
+	@param terminator: The line terminator ("\n" or "\r\n").
+	@return: An array of lines.
+	@rtype: numpy.ndarray
+	"""
+	count = len(columns["date"])
+	matrix = numpy.empty((count, width), numpy.uint8)
+	matrix.fill(ord(" "))
+	matrix[:, 2] = ord("-")
+	matrix[:, width - len(terminator):] = numpy.frombuffer(terminator, numpy.uint8)
+	for name, (start, end) in dofcore._textColumns.items():
+		_putText(matrix, start, end, columns[name])
+	for name, (start, end) in dofcore._intColumns.items():
+		_putDigits(matrix, start, end, columns[name])
+	for prefix, degrees, minutes, seconds, hemisphere in _dmsColumns:
+		_putDigits(matrix, degrees[0], degrees[1], columns[prefix + "Degrees"])
+		_putDigits(matrix, minutes[0], minutes[1], columns[prefix + "Minutes"])
+		hundredths = numpy.rint(numpy.asarray(columns[prefix + "Seconds"]) * 100).astype(numpy.int64)
+		_putDigits(matrix, seconds, seconds + 2, hundredths // 100)
+		matrix[:, seconds + 2] = ord(".")
+		_putDigits(matrix, seconds + 3, seconds + 5, hundredths % 100)
+		_putText(matrix, hemisphere, hemisphere + 1, columns[prefix + "Hemisphere"])
+	# Julian dates (yyyyddd) from date ordinals.  Ordinals of 0 are dates that could not be parsed.
+	ordinals = numpy.asarray(columns["date"], numpy.int64)
+	valid = ordinals > 0
+	days = (ordinals[valid] - datetime.date(1970, 1, 1).toordinal()).astype("M8[D]")
+	years = days.astype("M8[Y]")
+	julian = (years.astype(numpy.int64) + 1970) * 1000 + (days - years).astype(numpy.int64) + 1
+	dates = matrix[valid]
+	_putDigits(dates, _dateColumn, _dateColumn + 7, julian)
+	matrix[valid] = dates
+	return matrix.view("S%d" % matrix.shape[1]).ravel()
+
+def _lineExceptions(columns):
+	"""Compares the record lines with the lines rebuilt by _formatLines.
+	@return: A dict with the "width" and "terminator" of the lines, and the "indices" and original "lines" of the 
+	records whose rebuilt lines differ.
+	@rtype: dict
+	"""
+	lines = columns["line"]
+	width = lines.dtype.itemsize
+	terminator = "\r\n" if len(lines) and str(lines[0]).endswith("\r\n") else "\n"
+	indices = numpy.flatnonzero(_formatLines(columns, width, terminator) != lines)
+	return {"width": width, "terminator": terminator, "indices": indices.tolist(), "lines": lines[indices].tolist()}
+
+def _restoreLines(columns, exceptions):
+	"""Rebuilds the record lines of a snapshot, including the lines recorded by _lineExceptions."""
+	lines = _formatLines(columns, exceptions["width"], exceptions["terminator"])
+	if exceptions["indices"]:
+		lines[exceptions["indices"]] = exceptions["lines"]
+	return lines
+
+def fileCrc(path):
+	"""Returns the CRC-32 of a file, as an unsigned integer.
+	@param path: The path of the file.
+	@type path: str
+	@rtype: int
+	"""
+	crc = 0
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(_crcBlockSize), ""):
+			crc = zlib.crc32(block, crc)
+	return crc & 0xffffffff
+
+def writeSnapshot(path, columns, currencyDate=None, sourceCrc=None):
+	"""Writes column arrays to a snapshot file.
+	@param path: The path of the snapshot file.  It is replaced if it exists.
+	@type path: str
+	@param columns: The "columns" dict returned by dofcore.parseDofColumns.
+	@type columns: dict
+	@param currencyDate: The currency date of the DOF.
+	@type currencyDate: datetime.date
+	@param sourceCrc: The CRC-32 of the .Dat file the columns were parsed from (see fileCrc).
+	@type sourceCrc: int
+	@raise ImportError: Raised if numpy is not installed.
+	"""
+	if numpy is None:
+		raise ImportError("numpy is required to write DOF snapshots.")
+	count = len(columns["date"])
+	lineExceptions = _lineExceptions(columns)
+	arrays = []
+	directory = {}
+	offset = 0
+	for name in sorted(columns):
+		if name in _derivedColumns:
+			continue
+		values = columns[name]
+		dictionary = None
+		if values.dtype.kind == "S" and name not in _plainColumns:
+			dictionary, values = numpy.unique(values, return_inverse=True)
+			dictionary = dictionary.tolist()
+			values = values.astype(_codeType(len(dictionary)))
+		else:
+			values = numpy.ascontiguousarray(values, _storageType(values))
+		offset = _aligned(offset)
+		directory[name] = {
+			"dtype": values.dtype.str,
+			"columnDtype": columns[name].dtype.str,
+			"offset": offset,
+			"dictionary": dictionary,
+			"width": columns[name].dtype.itemsize if dictionary is not None else None
+		}
+		arrays.append((offset, values))
+		offset += values.nbytes
+	header = cPickle.dumps({
+		"count": count,
+		"currencyDate": currencyDate.toordinal() if currencyDate is not None else None,
+		"sourceCrc": sourceCrc,
+		"columns": directory,
+		"lineExceptions": lineExceptions
+	}, cPickle.HIGHEST_PROTOCOL)
+	dataStart = _aligned(_prefix.size + len(header))
+
+	# Write to a temporary file first so a reader never sees a partly written snapshot.
+	tempPath = path + ".tmp"
+	with open(tempPath, "wb") as f:
+		f.write(_prefix.pack(_magic, _fileVersion, len(header)))
+		f.write(header)
+		for offset, values in arrays:
+			f.seek(dataStart + offset)
+			f.write(values.tostring())
+	if os.path.exists(path):
+		os.remove(path)
+	os.rename(tempPath, path)
+
+def _readHeader(f, path):
+	"""Reads the header of a snapshot file.  Returns the header dict and the offset of the column data."""
+	prefix = f.read(_prefix.size)
+	if len(prefix) < _prefix.size:
+		raise ValueError("%s is not a DOF snapshot." % path)
+	magic, version, headerLength = _prefix.unpack(prefix)
+	if magic != _magic:
+		raise ValueError("%s is not a DOF snapshot." % path)
+	if version != _fileVersion:
+		raise ValueError("%s is not a version %d DOF snapshot." % (path, _fileVersion))
+	header = cPickle.loads(f.read(headerLength))
+	return header, _aligned(_prefix.size + headerLength)
+
+def readSnapshotCrc(path):
+	"""Returns the CRC-32 of the source .Dat file recorded in a snapshot, without mapping the file.
+	@param path: The path of the snapshot file.
+	@type path: str
+	@rtype: int
+	@raise ValueError: Raised if the file is not a snapshot written by this version of the module.
+	"""
+	with open(path, "rb") as f:
+		return _readHeader(f, path)[0]["sourceCrc"]
+
+class _SnapshotColumns(dict):
+	"""The columns of a snapshot.  The record lines are rebuilt from the other columns when they are first looked up."""
+	def __init__(self, items, lineExceptions):
+		dict.__init__(self, items)
+		self._lineExceptions = lineExceptions
+	def __missing__(self, name):
+		if name not in _derivedColumns:
+			raise KeyError(name)
+		lines = self[name] = _restoreLines(self, self._lineExceptions)
+		return lines
+
+class DofSnapshot(object):
+	"""A memory-mapped snapshot file.
+	Plain columns are read-only numpy arrays backed by the mapped file, except that integer columns stored in fewer 
+	bytes are widened to the dtype returned by parseDofColumns (a copy).  Dictionary-encoded columns are decoded when
+	column is called; codes and dictionary return the encoded form.
+	Arrays backed by the file keep the mapping open, so they stay valid after the snapshot is closed.  On Windows, the
+	file cannot be replaced until the snapshot is closed and those arrays have been released.
+	"""
+	def __init__(self, path):
+		"""Opens a snapshot.
+		@param path: The path of the snapshot file.
+		@type path: str
+		@raise ValueError: Raised if the file is not a snapshot written by this version of the module.
+		@raise ImportError: Raised if numpy is not installed.
+		"""
+		if numpy is None:
+			raise ImportError("numpy is required to read DOF snapshots.")
+		self.path = path
+		with open(path, "rb") as f:
+			header, self._dataStart = _readHeader(f, path)
+			self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		self._count = header["count"]
+		self._directory = header["columns"]
+		self._lineExceptions = header["lineExceptions"]
+		self.sourceCrc = header["sourceCrc"]
+		self.currencyDate = None
+		if header["currencyDate"] is not None:
+			self.currencyDate = datetime.date.fromordinal(header["currencyDate"])
+		self._dictionaries = {}
+		self._lines = None
+
+	def __len__(self):
+		return self._count
+
+	@property
+	def names(self):
+		"""The names of the columns, including those rebuilt from the others, sorted."""
+		return sorted(list(self._directory) + list(_derivedColumns))
+
+	def isEncoded(self, name):
+		"""Returns True if a column is dictionary-encoded."""
+		return name in self._directory and self._directory[name]["dictionary"] is not None
+
+	def codes(self, name):
+		"""Returns the stored array of a column without copying.  For a dictionary-encoded column, these are the codes:
+		indices into dictionary(name).
+		@rtype: numpy.ndarray
+		"""
+		if self._map is None:
+			raise ValueError("The snapshot %s is closed." % self.path)
+		entry = self._directory[name]
+		return numpy.frombuffer(self._map, numpy.dtype(entry["dtype"]), self._count, self._dataStart + entry["offset"])
+
+	def dictionary(self, name):
+		"""Returns the distinct values of a dictionary-encoded column, sorted, as an array.
+		@rtype: numpy.ndarray
+		"""
+		dictionary = self._dictionaries.get(name)
+		if dictionary is None:
+			entry = self._directory[name]
+			dictionary = self._dictionaries[name] = numpy.array(entry["dictionary"], "S%d" % entry["width"])
+		return dictionary
+
+	def column(self, name):
+		"""Returns the values of a column, in the form returned by dofcore.parseDofColumns.  The "line" column is
+		rebuilt from the other columns the first time it is requested.
+		@rtype: numpy.ndarray
+		"""
+		if name in _derivedColumns:
+			if self._lines is None:
+				self._lines = self.toColumns()[name]
+			return self._lines
+		if self.isEncoded(name):
+			return self.dictionary(name)[self.codes(name)]
+		codes = self.codes(name)
+		dtype = numpy.dtype(self._directory[name]["columnDtype"])
+		if codes.dtype != dtype:
+			# Integers stored in fewer bytes are widened back to the dtype of the parsed column.
+			return codes.astype(dtype)
+		return codes
+
+	def toColumns(self):
+		"""Returns a dict of all of the columns, as the "columns" entry returned by dofcore.parseDofColumns.  The "line" 
+		column is rebuilt the first time it is looked up (e.g., when an Obstacle is created from the columns).
+		@rtype: dict
+		"""
+		columns = _SnapshotColumns(((name, self.column(name)) for name in self._directory), self._lineExceptions)
+		if self._lines is not None:
+			columns["line"] = self._lines
+		return columns
+
+	@property
+	def obstacles(self):
+		"""A dofcore.DofColumns sequence of the obstacles in the snapshot."""
+		return dofcore.DofColumns(self.toColumns())
+
+	def close(self):
+		"""Releases the snapshot's reference to the mapped file.  The mapping is not closed explicitly: arrays returned by
+		codes, column and toColumns hold references to it, and it is unmapped once they have all been released.
+		"""
+		self._map = None
+
+	def __enter__(self):
+		return self
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+def snapshotPath(dofPath):
+	"""Returns the default path of the snapshot of a .Dat file: the same path with a .dofsnap extension."""
+	return os.path.splitext(dofPath)[0] + _extension
+
+def openSnapshot(dofPath, path=None):
+	"""Opens the snapshot of a .Dat file, writing it first if it does not exist or if it was written from a different
+	version of the file (its CRC-32 differs).
+	@param dofPath: The path of the .Dat file.
+	@type dofPath: str
+	@param path: The path of the snapshot file.  Defaults to snapshotPath(dofPath).
+	@type path: str
+	@rtype: DofSnapshot
+	@raise IOError: Raised if dofPath does not exist.
+	"""
+	if path is None:
+		path = snapshotPath(dofPath)
+	if not os.path.exists(dofPath):
+		raise IOError("File not found: %s" % dofPath)
+	crc = fileCrc(dofPath)
+	current = False
+	if os.path.exists(path):
+		try:
+			current = readSnapshotCrc(path) == crc
+		except (ValueError, EOFError, cPickle.UnpicklingError):
+			current = False
+	if not current:
+		result = dofcore.readDofColumns(dofPath)
+		writeSnapshot(path, result["columns"], result["currencyDate"], crc)
+	return DofSnapshot(path)
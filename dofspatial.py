@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+'''
+In-memory spatial index of DOF obstacles.
+
+Obstacles are grouped into a grid of latitude/longitude cells, so radius, bounding box and nearest-neighbor queries only
+examine the cells near the query instead of every obstacle.  Distances are great-circle distances on a spherical Earth.
+
+@author: Jeff Jacobson
+'''
+
+import math, heapq, array, cPickle, dofcore
+
+_earthRadius = 6371008.8 # Mean radius of the Earth, in meters.
+# Conversion factors from distance units to meters.
+_units = {
+	"m": 1.0,
+	"km": 1000.0,
+	"ft": 0.3048,
+	"mi": 1609.344,
+	"NM": 1852.0
+}
+_defaultCellSize = 0.1 # Degrees.  About 11 km north-south.
+_fileVersion = 1
+
+def greatCircleDistance(lat1, lon1, lat2, lon2, unit="m"):
+	"""Returns the great-circle (haversine) distance between two points.
+	@param lat1: Latitude of the first point, in decimal degrees.
+	@param lon1: Longitude of the first point, in decimal degrees.
+	@param lat2: Latitude of the second point, in decimal degrees.
+	@param lon2: Longitude of the second point, in decimal degrees.
+	@param unit: The unit of the result: "m", "km", "ft", "mi" or "NM".
+	@type unit: str
+	@rtype: float
+	"""
+	return _haversine(math.radians(lat1), math.radians(lon1), math.radians(lat2), math.radians(lon2)) / _units[unit]
+
+def _haversine(phi1, lambda1, phi2, lambda2):
+	"""Returns the great-circle distance in meters between two points given in radians."""
+	a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin((lambda2 - lambda1) / 2) ** 2
+	return 2 * _earthRadius * math.asin(min(1.0, math.sqrt(a)))
+
+class ObstacleIndex(object):
+	"""A grid index of obstacles by their decimal-degree coordinates.
+	Query results are Obstacle objects, created from the stored DOF records when they are returned.
+	"""
+	def __init__(self, obstacles=(), cellSize=_defaultCellSize):
+		"""Builds the index.
+		@param obstacles: The obstacles to index (e.g., a DofReader, or the list returned by dofcore.readDofFile).
+		@param cellSize: The width and height of the grid cells, in degrees.
+		@type cellSize: float
+		"""
+		self.cellSize = cellSize
+		self._lines = []
+		self._latitudes = array.array("d")
+		self._longitudes = array.array("d")
+		self._cells = {}
+		for obstacle in obstacles:
+			self._add(obstacle.line.rstrip("\r\n"), obstacle.latitudeDD, obstacle.longitudeDD)
+	def _add(self, line, latitude, longitude):
+		index = len(self._lines)
+		self._lines.append(line)
+		self._latitudes.append(latitude)
+		self._longitudes.append(longitude)
+		key = self._cell(latitude, longitude)
+		cell = self._cells.get(key)
+		if cell is None:
+			cell = self._cells[key] = array.array("i")
+		cell.append(index)
+	def __len__(self):
+		return len(self._lines)
+	def obstacle(self, index):
+		"""Returns the obstacle with the given position in the index."""
+		return dofcore.Obstacle(self._lines[index])
+
+	def _cell(self, latitude, longitude):
+		cellSize = self.cellSize
+		return int(math.floor(latitude / cellSize)), self._normalizeColumn(int(math.floor(longitude / cellSize)))
+	def _normalizeColumn(self, column):
+		"""Maps a column number onto the -180..180 range of longitudes."""
+		columnCount = self._columnCount()
+		half = columnCount // 2
+		return (column + half) % columnCount - half
+	def _columnCount(self):
+		return int(math.ceil(360.0 / self.cellSize))
+	def _candidates(self, minLat, minLon, maxLat, maxLon):
+		"""Yields the indices of the obstacles in the cells that overlap a bounding box.  minLon may be greater than
+		maxLon if the box crosses the 180th meridian.
+		"""
+		cellSize = self.cellSize
+		cells = self._cells
+		rows = xrange(int(math.floor(minLat / cellSize)), int(math.floor(maxLat / cellSize)) + 1)
+		first = int(math.floor(minLon / cellSize))
+		last = int(math.floor(maxLon / cellSize))
+		columnCount = self._columnCount()
+		if last < first:
+			last += columnCount
+		if last - first + 1 >= columnCount:
+			columns = range(-(columnCount // 2), columnCount - columnCount // 2)
+		else:
+			columns = [self._normalizeColumn(column) for column in xrange(first, last + 1)]
+		# Loop over whichever of the occupied cells and the overlapped cells is smaller.
+		if len(rows) * len(columns) > len(cells):
+			rowSet, columnSet = set(rows), set(columns)
+			for (row, column), cell in cells.iteritems():
+				if row in rowSet and column in columnSet:
+					for index in cell:
+						yield index
+		else:
+			for row in rows:
+				for column in columns:
+					cell = cells.get((row, column))
+					if cell is not None:
+						for index in cell:
+							yield index
+
+	def withinBox(self, minLat, minLon, maxLat, maxLon):
+		"""Returns the obstacles within a bounding box, in the order they were added.
+		@param minLat: The southern edge, in decimal degrees.
+		@param minLon: The western edge.  If it is greater than maxLon, the box crosses the 180th meridian.
+		@param maxLat: The northern edge.
+		@param maxLon: The eastern edge.
+		@rtype: list
+		"""
+		latitudes, longitudes = self._latitudes, self._longitudes
+		crosses = minLon > maxLon
+		indices = []
+		for index in self._candidates(minLat, minLon, maxLat, maxLon):
+			latitude, longitude = latitudes[index], longitudes[index]
+			if latitude < minLat or latitude > maxLat:
+				continue
+			if crosses:
+				if longitude < minLon and longitude > maxLon:
+					continue
+			elif longitude < minLon or longitude > maxLon:
+				continue
+			indices.append(index)
+		indices.sort()
+		return [self.obstacle(index) for index in indices]
+
+	def _withinDistance(self, latitude, longitude, meters):
+		"""Returns (distance in meters, index) tuples for the obstacles within a distance, nearest first."""
+		phi, lam = math.radians(latitude), math.radians(longitude)
+		angle = meters / _earthRadius
+		minLat = latitude - math.degrees(angle)
+		maxLat = latitude + math.degrees(angle)
+		if minLat <= -90 or maxLat >= 90 or angle >= math.pi / 2:
+			# The circle contains a pole, so it spans every longitude.
+			minLat, maxLat = max(minLat, -90.0), min(maxLat, 90.0)
+			minLon, maxLon = -180.0, 180.0
+		else:
+			# Longitude half-width of the circle at its widest.
+			halfWidth = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(phi))))
+			minLon, maxLon = longitude - halfWidth, longitude + halfWidth
+			if minLon < -180:
+				minLon += 360
+			if maxLon > 180:
+				maxLon -= 360
+		latitudes, longitudes = self._latitudes, self._longitudes
+		results = []
+		for index in self._candidates(minLat, minLon, maxLat, maxLon):
+			distance = _haversine(phi, lam, math.radians(latitudes[index]), math.radians(longitudes[index]))
+			if distance <= meters:
+				results.append((distance, index))
+		results.sort()
+		return results
+
+	def withinDistance(self, latitude, longitude, distance, unit="NM"):
+		"""Returns the obstacles within a great-circle distance of a point, nearest first.
+		@param latitude: The latitude of the point, in decimal degrees.
+		@param longitude: The longitude of the point, in decimal degrees.
+		@param distance: The search radius.
+		@param unit: The unit of distance: "m", "km", "ft", "mi" or "NM" (nautical miles).
+		@type unit: str
+		@return: A list of (distance, obstacle) tuples, with distances in the given unit.
+		@rtype: list
+		"""
+		factor = _units[unit]
+		return [(meters / factor, self.obstacle(index))
+				for meters, index in self._withinDistance(latitude, longitude, distance * factor)]
+
+	def nearest(self, latitude, longitude, k=1, unit="NM"):
+		"""Returns the k obstacles nearest to a point.
+		@param latitude: The latitude of the point, in decimal degrees.
+		@param longitude: The longitude of the point, in decimal degrees.
+		@param k: The number of obstacles to return.
+		@type k: int
+		@param unit: The unit of the returned distances.
+		@type unit: str
+		@return: A list of (distance, obstacle) tuples, nearest first.
+		@rtype: list
+		"""
+		k = min(k, len(self))
+		if k <= 0:
+			return []
+		# Search circles of doubling size until one contains k obstacles.  They are the k nearest, since every obstacle
+		# outside the circle is farther away.
+		meters = self.cellSize * math.pi / 180 * _earthRadius
+		while True:
+			results = self._withinDistance(latitude, longitude, meters)
+			if len(results) >= k or meters >= math.pi * _earthRadius:
+				break
+			meters *= 2
+		factor = _units[unit]
+		return [(distance / factor, self.obstacle(index)) for distance, index in heapq.nsmallest(k, results)]
+
+	def save(self, path):
+		"""Writes the index to a file that can be read with ObstacleIndex.load.
+		@param path: The path of the file.
+		@type path: str
+		"""
+		data = {
+			"version": _fileVersion,
+			"cellSize": self.cellSize,
+			"lines": "\n".join(self._lines),
+			"latitudes": self._latitudes.tostring(),
+			"longitudes": self._longitudes.tostring(),
+			"cells": dict((key, cell.tostring()) for key, cell in self._cells.iteritems())
+		}
+		with open(path, "wb") as f:
+			cPickle.dump(data, f, cPickle.HIGHEST_PROTOCOL)
+
+	@classmethod
+	def load(cls, path):
+		"""Reads an index written by save.
+		@param path: The path of the file.
+		@type path: str
+		@rtype: ObstacleIndex
+		@raise ValueError: Raised if the file was written by an incompatible version of this module.
+		"""
+		with open(path, "rb") as f:
+			data = cPickle.load(f)
+		if data.get("version") != _fileVersion:
+			raise ValueError("%s is not a version %d obstacle index." % (path, _fileVersion))
+		index = cls(cellSize=data["cellSize"])
+		index._lines = data["lines"].split("\n") if data["lines"] else []
+		index._latitudes.fromstring(data["latitudes"])
+		index._longitudes.fromstring(data["longitudes"])
+		for key, cell in data["cells"].iteritems():
+			index._cells[key] = array.array("i", cell)
+		return index
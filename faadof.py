@@ -7,122 +7,53 @@ Created on Apr 23, 2012
 @todo: add optional command line parameter for which z value to use in geometry: above ground or above sea level column
 '''
 
-import sys, os.path, re, datetime, urllib2, remotezip
-print "Importing arcpy..."
-import arcpy
-print "Finished importing arcpy..."
+import sys, os.path, datetime, itertools
+# The parsing and download functions are re-exported, so scripts that use them through faadof keep working.
+from dofcore import julianDateToDate, dmsToDD, Dms, Obstacle, DofColumns, parseDofColumns, obstacleRecord, \
+	downloadDofs, DofReader, iterDofFile, readDofFile, readDofColumns, parseDofShards, computeDofDelta, \
+	findDailyChangeFiles, readDailyChanges, computeDailyDelta, DofRecords, datumPartitions, readDofPartitions, \
+	MappedDofFile, CodedDomain, encodeValues, decodeValues
+from dofcore import _wgs84, _ngvd1929, _navd1988, _isNgvd1929, _domains, _obstacleSchema, _obstacleFields, \
+	_obstacleValues, _obstacleKey, _obstacleSignature, _memberOrsCode, _defaultShardSize
 
-_jdatere = re.compile("(?P<year>\d{4})(?P<days>\d{3})")
-_wgs84 = 'GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433],AUTHORITY["EPSG",4326]]'
-_ngvd1929 = 'VERTCS["NGVD_1929",VDATUM["National_Geodetic_Vertical_Datum_1929"],PARAMETER["Vertical_Shift",0.0],PARAMETER["Direction",1.0],UNIT["Foot_US",0.3048006096012192],AUTHORITY["EPSG",5702]]'
-_navd1988 = 'VERTCS["NAVD_1988",VDATUM["North_American_Vertical_Datum_1988"],PARAMETER["Vertical_Shift",0.0],PARAMETER["Direction",1.0],UNIT["Meter",1.0],AUTHORITY["EPSG",5703]]'
-
-_zDate = datetime.date(2001, 3, 12) # Records on or after this date are in NAVD 1988.  Prior are NGVD 1929.
-
-def _parseCurrencyDate(line, out_format=None):
-	"""Parses the currency date
+class _LazyModule(object):
+	"""Stands in for a module that is slow to import.  The module is imported the first time one of its attributes is 
+	used.
 	"""
-	regex = re.compile(r"\s*CURRENCY\sDATE\s*=\s*(?P<month>\d{2})/(?P<day>\d{2})/(?P<year>\d{2})",re.IGNORECASE)
-	r = regex.search(line)
-	output = None
-	if r is not None:
-		d = r.groupdict()
-		if out_format == "str":
-			output = "%(month)s-%(day)s-20%(year)s" % d
-		else:
-			output = datetime.date(int("20" + d["year"]), int(d["month"]), int(d["day"]))
-	return output
-		
-
-def julianDateToDate(jDate):
-	match =_jdatere.match(jDate)
-	if match:
-		d = match.groupdict()
-		year = int(d["year"])
-		days = int(d["days"])
-		date = datetime.date(year,1,1) + datetime.timedelta(days=days-1)
-		return date
-	
-def dmsToDD(degrees, minutes, seconds, hemisphere):
-	if hemisphere == "S" or hemisphere == "W":
-		dd = degrees * - 1 - float(minutes) / 60 - float(seconds)/3600
-	else:
-		dd = degrees + float(minutes) / 60 + float(seconds)/3600
-	return dd
-
-class Dms(object): 
-	def __init__(self, degrees, minutes, seconds, hemisphere):
-		self.degrees = degrees
-		self.minutes = minutes
-		self.seconds = seconds
-		self.hemisphere = hemisphere
-	def toDD(self):
-		dd = dmsToDD(self.degrees, self.minutes, self.seconds, self.hemisphere)
-		return dd
-	def __str__(self, *args, **kwargs):
-		# return "%s %s %s %s" % (self.degrees, self.minutes, self.seconds, self.hemisphere)
-		if re.match("[SW]", self.hemisphere):
-			return "%s %s %s %s" % (self.degrees, self.minutes, self.seconds, self.hemisphere)
-		else:
-			return "%s %s %s %s" % (self.degrees, self.minutes, self.seconds, self.hemisphere)
+	def __init__(self, name):
+		self._name = name
+		self._module = None
+	def __getattr__(self, name):
+		if self._module is None:
+			print "Importing %s..." % self._name
+			self._module = __import__(self._name)
+			print "Finished importing %s..." % self._name
+		return getattr(self._module, name)
 
+# arcpy takes several seconds to import, and is only needed by the geodatabase functions.
+arcpy = _LazyModule("arcpy")
 
-class Obstacle(object):
-	def __init__(self, line):
-		self.orsCode = line[0:2]
-		self.obstacleNumber = line[3:10]
-		self.verificationStatus = line[10]
-		self.countryId = line[12:15].rstrip()
-		self.stateId = line[15:18].rstrip()
-		self.cityName = line[18:34].rstrip()
-		
-		self.latitude = Dms(int(line[35:37]), int(line[38:40]), float(line[41:46]), line[46])
-		self.longitude = Dms(int(line[48:51]), int(line[52:54]), float(line[55:60]), line[60])
-		
-		self.obstacleType = line[62:74].rstrip()
-		self.quantity = int(line[75])
-		self.aglHT = int(line[77:82])
-		self.AmslHT = int(line[83:88])
-		
-		self.lighting = line[89]
-		self.horizontalAccuracy = line[91].rstrip()
-		self.verticalAccuracy = line[93].rstrip()
-		self.markIndicator = line[95]
-		
-		self.faaStudyNo = line[97:111].rstrip()
-		self.action = line[112]
-		self.date = julianDateToDate(line[114:121])
-	def __str__(self, *args, **kwargs):
-		return object.__str__(self, *args, **kwargs)
-
-def addObstacleToRow(row, obstacle):
-	row.orsCode = obstacle.orsCode
-	row.obstacleNo = obstacle.obstacleNumber
-	row.verificationStatus = obstacle.verificationStatus
-	row.countryId = obstacle.countryId
-	row.stateId = obstacle.stateId
-	row.cityName = obstacle.cityName
-	#	row.latitude = obstacle.latitude
-	#	row.longitude = obstacle.longitude
-	row.obstacleType = obstacle.obstacleType
-	row.quantity = obstacle.quantity
-	row.aglHT = obstacle.aglHT
-	row.AmslHT = obstacle.AmslHT
-	row.lighting = obstacle.lighting
-	row.horizontalAccuracy = obstacle.horizontalAccuracy
-	row.verticalAccuracy = obstacle.verticalAccuracy
-	row.markIndicator = obstacle.markIndicator
-	row.faaStudyNo = obstacle.faaStudyNo
-	row.action = obstacle.action
-	row.date = str(obstacle.date) # Dates have to be set as strings
+def _setRowValues(row, values, x, y):
+	"""Sets the attribute values and shape of a row from an insert or update cursor.
+	@param values: The attribute values, in the order of _obstacleFields.  Domain codes (see encodeValues) are decoded.
+	@param x: The longitude in decimal degrees.
+	@param y: The latitude in decimal degrees.
+	"""
+	values = decodeValues(values)
+	for field, value in zip(_obstacleFields, values):
+		if isinstance(value, datetime.date):
+			value = str(value) # Dates have to be set as strings
+		row.setValue(field, value)
 	
 	point = arcpy.Point()
-	point.X = obstacle.longitude.toDD()
-	point.Y = obstacle.latitude.toDD()
-	point.Z = obstacle.aglHT
+	point.X = x
+	point.Y = y
+	point.Z = values[8] # AglHT
 	pointGeometry = arcpy.PointGeometry(point)
 	row.shape = pointGeometry
 
+def addObstacleToRow(row, obstacle):
+	_setRowValues(row, _obstacleValues(obstacle), obstacle.longitudeDD, obstacle.latitudeDD)
 
 
 def createDomains(gdbPath):
@@ -131,226 +62,16 @@ def createDomains(gdbPath):
 	@author: Jeff Jacobson
 	@organization: WSDOT
 	"""
-	domains = {}
-	domains["OrsCode"] = {
-	  "description": "ORS Code",
-	  "domains" : {
-		"01": "Alabama",
-		"02": "Alaska",
-		"04": "Arizona",
-		"05": "Arkansas",
-		"06": "California",
-		"08": "Colorado",
-		"09": "Connecticut",
-		"10": "Delaware",
-		"11": "DC",
-		"12": "Florida",
-		"13": "Georgia",
-		"15": "Hawaii",
-		"16": "Idaho",
-		"17": "Illinois",
-		"18": "Indiana",
-		"19": "Iowa",
-		"20": "Kansas",
-		"21": "Kentucky",
-		"22": "Louisiana",
-		"23": "Maine",
-		"24": "Maryland",
-		"25": "Massachusetts",
-		"26": "Michigan",
-		"27": "Minnesota",
-		"28": "Mississippi",
-		"29": "Missouri",
-		"30": "Montana",
-		"31": "Nebraska",
-		"32": "Nevada",
-		"33": "New Hampshire",
-		"34": "New Jersey",
-		"35": "New Mexico",
-		"36": "New York",
-		"37": "North Carolina",
-		"38": "North Dakota",
-		"39": "Ohio",
-		"40": "Oklahoma",
-		"41": "Oregon",
-		"42": "Pennsylvania",
-		"44": "Rhode Island",
-		"45": "South Carolina",
-		"46": "South Dakota",
-		"47": "Tennessee",
-		"48": "Texas",
-		"49": "Utah",
-		"50": "Vermont",
-		"51": "Virginia",
-		"53": "Washington",
-		"54": "West Virginia",
-		"55": "Wisconsin",
-		"56": "Wyoming",
-		"CA": "Canada",
-		"MX": "Mexico",
-		"PR": "Puerto Rico",
-		"BS": "Bahamas",
-		"AG": "Antigua and Barbuda",
-		"AI": "Anguilla",
-		"AN": "Netherlands Antilles",
-		"AW": "Aruba",
-		"CU": "Cuba",
-		"DO": "Dominican Republic",
-		"GP": "Guadeloupe",
-		"HN": "Honduras",
-		"HT": "Haiti",
-		"JM": "Jamaica",
-		"KN": "St. Kitts and Nevis",
-		"KY": "Cayman Islands",
-		"MS": "Montserrat",
-		"TC": "Turks and Caicos Islands",
-		"VG": "British Virgin Islands",
-		"VI": "Virgin Islands",
-		"AS": "American Samoa",
-		"FM": "Federated States of Micronesia",
-		"GU": "Guam",
-		"KI": "Kiribati",
-		"MH": "Marshall Islands",
-		"MI": "Midway Islands",
-		"MP": "Northern Mariana Islands",
-		"PW": "Palau",
-		"RU": "Russia",
-		"TK": "Tokelau",
-		"WQ": "Wake Island",
-		"WS": "Samoa",
-		}
-	}
-	
-	# Verification Status
-	domains["VerificationStatus"] = {
-		"description": "Verification Status",
-		"domains": {
-			"O": "verified",
-			"U": "unverified"
-		}
-	}
-	
-	domains["LightingType"] = {
-		"description": "Lighting Type",
-		"domains": {
-			"R":  "Red",
-			"D":  "Medium intensity White Strobe & Red", 
-			"H":  "High Intensity White Strobe & Red", 
-			"M": "Medium Intensity White Strobe", 
-			"S" :  "High Intensity White Strobe", 
-			"F" :  'Flood', 
-			"C" : "Dual Medium Catenary", 
-			"W": "Synchronized Red Lighting", 
-			"L" : "Lighted (Type Unknown)", 
-			"N":  "None", 
-			"U":  "Unknown"
-		}
-	}
-	
-	domains["HorizontalAccuracy"] = {
-		"description": "Horizontal Accuracy",
-		"domains": {
-			"1": "+-20'",
-			"2": "+-50'",
-			"3": "+-100'",
-			"4": "+-250'",
-			"5": "+-500'",
-			"6": "+-1000'",
-			"7": "+-1/2 NM",
-			"8": "+-1 NM",
-			"9": "Unknown"
-		}
-	 }
-	
-	domains["VerticalAccuracy"] = {
-		"description": "Vertical Accuracy",
-		"domains": {
-			"A": "+-3'",
-			"B": "+-10'",
-			"C": "+-20'",
-			"D": "+-50'",
-			"E": "+-125'",
-			"F": "+-250'",
-			"G": "+-500'",
-			"H": "+-1000'",
-			"I": "Unknown"
-		}
-	}
-	
-	
-	domains["MarkIndicator"] = {
-		"description": "Type of Marking",
-		"domains": {
-			"P":   "Orange or Orange and White Paint",
-			"W": "White Paint Only",
-			"M":  "Marked",
-			"F":   "Flag Marker",
-			"S":   "Spherical Marker",
-			"N":  "None",
-			"U":  "Unknown"
-		}
-	}
-	
-	domains["Action"] = {
-		"description": "Action",
-		"domains": {
-			"A": "Add",
-			"C": "Change",
-			"D": "Dismantle"
-		}
-	}
-	
-	domains["StructureTypes"] = {
-		"description": "Structure Types",
-		"domains": {
-			"AG EQUIP":"agricultural equipment",
-			"ARCH":"arch",
-			"BALLOON":"balloon: tethered; weather; other reconnaissance",
-			"BLDG":"building",
-			"BLDG-TWR":"latticework greater than 20' on building",
-			"BRIDGE":"bridge",
-			"CATENARY":"catenary: transmission line span/wire/cable",
-			"COOL TWR":"nuclear cooling tower",
-			"CRANE":"crane: permanent",
-			"CRANE T":"crane: temporary",
-			"CTRL TWR":"airport control tower",
-			"DAM":"Dam",
-			"DOME":"Dome",
-			"ELECTRICAL SYSTEM":"Electrical System",
-			"ELEVATOR":"silo; grain elevator",
-			"FENCE":"Fence",
-			"GENERAL UTILITY":"General Utility",
-			"LIGHTHOUSE":"Lighthouse",
-			"MONUMENT":"Monument",
-			"NAVAID":"airport navigational aid",
-			"PLANT":"plant: multiple close structures used for industrial purposes",
-			"POLE":"flag pole; light pole",
-			"REFINERY":"refinery: multiple close structures used for purifying crude materials",
-			"RIG":"oil rig",
-			"SIGN":"Sign",
-			"SPIRE":"spire: steeple",
-			"STACK":"stack: smoke; industrial",
-			"STADIUM":"Stadium",
-			"T-L TWR":"transmission line tower; telephone pole",
-			"TANK":"tank: water; fuel",
-			"TOWER":"Tower",
-			"TRAMWAY":"Tramway",
-			"TREE":"Tree",
-			"VEGETATION":"Vegetation",
-			"WINDMILL":"windmill: wind turbine"
-		}
-	}
-
 	# Create table for domains
 	arcpy.management.CreateTable("in_memory", "DomainValues")
 	tempTable = "in_memory/DomainValues"
 	arcpy.management.AddField(tempTable, "Name", "TEXT")
 	arcpy.management.AddField(tempTable, "Value", "TEXT")
 	
-	for domainName in domains:
+	for domainName in _domains:
 		cursor = arcpy.InsertCursor(tempTable)
 		row = None
-		domainDef = domains[domainName]
+		domainDef = _domains[domainName]
 		domainValues = domainDef["domains"]
 		for name in domainValues:
 			row = cursor.newRow()
@@ -372,23 +93,8 @@ def createDofFeatureClass(out_path, name, projection):
 	"""
 	arcpy.management.CreateFeatureclass(out_path, name, "POINT", None, None, "ENABLED", projection)
 	fcPath = os.path.join(out_path, name)
-	arcpy.management.AddField(fcPath, "OrsCode", "TEXT", None, None, 2, "ORS Code", "NON_NULLABLE", "REQUIRED", "OrsCode")
-	arcpy.management.AddField(fcPath, "ObstacleNo", "TEXT", None, None, 7, "Obstacle Number", "NON_NULLABLE")
-	arcpy.management.AddField(fcPath, "VerificationStatus", "TEXT", None, None, 1, "Verification Status", "NON_NULLABLE", "NON_REQUIRED", "VerificationStatus")
-	arcpy.management.AddField(fcPath, "CountryId", "TEXT", None, None, 2, "Country Identifier")
-	arcpy.management.AddField(fcPath, "StateId", "TEXT", None, None, 2, "State Identifier")
-	arcpy.management.AddField(fcPath, "CityName", "TEXT", None, None, 16, "City Name")
-	arcpy.management.AddField(fcPath, "ObstacleType", "TEXT", None, None, 12, "Obstacle Type", None, None, "StructureTypes")
-	arcpy.management.AddField(fcPath, "Quantity", "SHORT")
-	arcpy.management.AddField(fcPath, "AglHT", "SHORT", field_alias="Above Ground Level Height (Feet)")
-	arcpy.management.AddField(fcPath, "AmslHt", "SHORT", field_alias="Above Mean Sea Level Height (Feet)")
-	arcpy.management.AddField(fcPath, "Lighting", "TEXT", field_length=1, field_domain="LightingType")
-	arcpy.management.AddField(fcPath, "HorizontalAccuracy", "TEXT", None, None, 1, "Horizontal Accuracy", None, None, "HorizontalAccuracy")
-	arcpy.management.AddField(fcPath, "VerticalAccuracy", "TEXT", None, None, 1, "Vertical Accuracy", None, None, "VerticalAccuracy")
-	arcpy.management.AddField(fcPath, "MarkIndicator", "TEXT", None, None, 1, "Mark Indicator", None, None, "MarkIndicator")
-	arcpy.management.AddField(fcPath, "FaaStudyNo", "TEXT", None, None, 14, "FAA Study Number")
-	arcpy.management.AddField(fcPath, "Action", "TEXT", None, None, 1, None, None, None, "Action")
-	arcpy.management.AddField(fcPath, "Date", "DATE")
+	for fieldName, fieldType, length, alias, nullable, required, domain in _obstacleSchema:
+		arcpy.management.AddField(fcPath, fieldName, fieldType, None, None, length, alias, nullable, required, domain)
 
 def _updateCurrencyDate(tablePath, currencyDate):
 	"""Updates the Currency Date table with the new currency date.  If there are no existing rows, a new row will be added.  
@@ -471,6 +177,124 @@ def getCurrencyDate(gdbPath, currencyDateTableName="CurrencyDate", currencyDateF
 			del row, cursor
 	return output
 
+def createImportedMembersTable(out_path, out_name="ImportedMembers"):
+	"""Creates the "ImportedMembers" table, which records the CRC-32 and size of each data file that has been imported, 
+	as listed in the central directory of the zip archive it came from.
+	@param out_path: The path to the geodatabase where the table will be created.
+	@type out_path: str
+	@param out_name: The name to be given to the new table.
+	@type out_name: str
+	"""
+	tablePath = os.path.join(out_path, out_name)
+	arcpy.management.CreateTable(out_path, out_name)
+	arcpy.management.AddField(tablePath, "Name", "TEXT", None, None, 255, "Data File")
+	# CRC-32 values don't fit in a (signed) LONG field, so they are stored as hexadecimal text.
+	arcpy.management.AddField(tablePath, "Crc32", "TEXT", None, None, 8, "CRC-32")
+	arcpy.management.AddField(tablePath, "FileSize", "LONG", field_alias="Size (Bytes)")
+
+def getImportedMembers(gdbPath, tableName="ImportedMembers"):
+	"""Gets the CRC-32 and size of each data file that has been imported into the geodatabase.
+	@param gdbPath: The path to the geodatabase.
+	@return: A dict of (CRC-32, size) tuples keyed by data file name, or None if the geodatabase has no ImportedMembers 
+	table (e.g., it was created by an older version of this module).
+	@rtype: dict or None
+	"""
+	tablePath = os.path.join(gdbPath, tableName)
+	if not (arcpy.Exists(gdbPath) and arcpy.Exists(tablePath)):
+		return None
+	output = {}
+	cursor, row = None, None
+	try:
+		cursor = arcpy.SearchCursor(tablePath)
+		for row in cursor:
+			output[row.Name] = (int(row.Crc32, 16), int(row.FileSize))
+	finally:
+		del row, cursor
+	return output
+
+def _updateImportedMembers(tablePath, memberInfo):
+	"""Records the CRC-32 and size of imported data files, replacing any existing rows for the same files.
+	@param tablePath: The path to the ImportedMembers table.
+	@type tablePath: str
+	@param memberInfo: A dict of (CRC-32, size) tuples keyed by data file name.
+	@type memberInfo: dict
+	"""
+	remaining = dict(memberInfo)
+	cursor, row = None, None
+	try:
+		cursor = arcpy.UpdateCursor(tablePath)
+		for row in cursor:
+			if row.Name in remaining:
+				crc, size = remaining.pop(row.Name)
+				row.Crc32 = "%08x" % crc
+				row.FileSize = size
+				cursor.updateRow(row)
+	finally:
+		del row, cursor
+	cursor, row = None, None
+	try:
+		cursor = arcpy.InsertCursor(tablePath)
+		for name, (crc, size) in remaining.items():
+			row = cursor.newRow()
+			row.Name = name
+			row.Crc32 = "%08x" % crc
+			row.FileSize = size
+			cursor.insertRow(row)
+	finally:
+		del row, cursor
+
+def createDailyChangesTable(out_path, out_name="DailyChanges"):
+	"""Creates the "DailyChanges" table, which records the daily change (DDOF) files that have been applied.
+	@param out_path: The path to the geodatabase where the table will be created.
+	@type out_path: str
+	@param out_name: The name to be given to the new table.
+	@type out_name: str
+	"""
+	tablePath = os.path.join(out_path, out_name)
+	arcpy.management.CreateTable(out_path, out_name)
+	arcpy.management.AddField(tablePath, "Name", "TEXT", None, None, 255, "Change File")
+	arcpy.management.AddField(tablePath, "Date", "DATE")
+
+def getLastDailyChange(gdbPath, tableName="DailyChanges"):
+	"""Gets the date of the newest daily change file that has been applied to the geodatabase.
+	@param gdbPath: The path to the geodatabase.
+	@return: The date, or None if no daily change files have been applied.
+	@rtype: datetime.date
+	"""
+	tablePath = os.path.join(gdbPath, tableName)
+	if not (arcpy.Exists(gdbPath) and arcpy.Exists(tablePath)):
+		return None
+	output = None
+	cursor, row = None, None
+	try:
+		cursor = arcpy.SearchCursor(tablePath)
+		for row in cursor:
+			date = row.getValue("Date")
+			if type(date) == datetime.datetime:
+				date = date.date()
+			if date is not None and (output is None or date > output):
+				output = date
+	finally:
+		del row, cursor
+	return output
+
+def _addDailyChanges(tablePath, changeFiles):
+	"""Records applied daily change files.
+	@param tablePath: The path to the DailyChanges table.
+	@param changeFiles: The change files, as returned by findDailyChangeFiles.
+	@type changeFiles: list
+	"""
+	cursor, row = None, None
+	try:
+		cursor = arcpy.InsertCursor(tablePath)
+		for changeFile in changeFiles:
+			row = cursor.newRow()
+			row.Name = changeFile["name"]
+			row.Date = str(changeFile["date"]) # Dates have to be set as strings
+			cursor.insertRow(row)
+	finally:
+		del row, cursor
+
 def createDofGdb(gdbPath, currencyDate=None):
 	"""Creates a file Geodatabase for FAA DOF data.  Creates the necessary domains as well.
 	@param gdbParam: The path where the GDB will be created.
@@ -489,130 +313,16 @@ def createDofGdb(gdbPath, currencyDate=None):
 	createDofFeatureClass(gdbPath, "Obstacles", _wgs84 + ',' + _navd1988)
 	print "Creating currency date table..."
 	createCurrencyDateTable(gdbPath, currencyDate=currencyDate)
+	print "Creating imported members table..."
+	createImportedMembersTable(gdbPath)
+	print "Creating daily changes table..."
+	createDailyChangesTable(gdbPath)
 
 
-def downloadDofs(url="http://tod.faa.gov/tod/public/", index_url="http://tod.faa.gov/tod/public/TOD_DOF.html", datafiles=('53-WA.Dat',), destDir="../Scratch", lastCurrencyDate=None):
-	"""Downloads the specified data files from the FAA website.
-	@param url: The URL of the directory that contains the DOF data zip archives.
-	@type url: str
-	@param datafiles: A set of file names fo the .DAT files that are to be downloaded.
-	@type dataFiles: set
-	@param destDir: The destination directory where the data files will be copied to.
-	@type destDir: str
-	@param lastCurrencyDate: The last currency date since you performed this operation.  If the last update listed of the FAA page is
-	<= lastCurrencyDate then the operation will be aborted because the FAA has no newer information.
-	@type lastCurrencyDate: datetime.date
-	@return: Returns a list paths of the files that were written to the file system.  If there were no newer data to download, None is returned. 
-	@rtype: list or None
-	"""
-	# This regular expression matches the links to the DOF_* zip files.  Captures are 2-digit year, month, and day, respectively.
-	linkRe = re.compile(r"""<a href=['"](?P<path>DOFS/DOF_(\d{2})(\d{2})(\d{2})\.zip)['"]>""", re.IGNORECASE)
-	
-	print "Reading '%s'..." % url
-	# Open the page and store the HTML in a variable.
-	f = urllib2.urlopen(index_url)
-	html = f.read()
-	del f # Delete references to unused variables.
-	
-	# Extract all of the DOF URLs
-	matches = linkRe.findall(html)
-	# sample matches:
-	#[
-	#	('DOFS/DOF_111020.zip', '11', '10', '20'), 
-	#	('DOFS/DOF_111215.zip', '11', '12', '15'), 
-	#	('DOFS/DOF_120108.zip', '12', '01', '08'), 
-	#	('DOFS/DOF_120304.zip', '12', '03', '04')
-	#]
-	# Convert the matches into a dictionary containing keys "url" and "date".
-	data = map(lambda s: {
-						"url": urllib2.urlparse.urljoin(url, s[0]), 
-						"date": datetime.date(int("20" + s[1]), int(s[2]), int(s[3]))
-						}, matches
-			)
-	
-	# Loop through all of the paths and determine which is the newest.  Download that file.
-	
-	newest = None
-	for info in data:
-		if newest is None or newest["date"] < info["date"]:
-			newest = info
-	print data
-	print "The newest file is %s." %  newest["url"]
-	
-	if lastCurrencyDate is not None and newest["date"] <= lastCurrencyDate:
-		arcpy.AddMessage("No new data has been added since %s.  No update is necessary." % lastCurrencyDate)
-		return None
-	else:
-		# Download the desired data files from the zip.
-		hzfile = remotezip.HTTPZipFile(newest["url"])
-		#hzfile.printdir()
-		
-		# Create the destination directory if it does not already exist.
-		if not os.path.exists(destDir):
-			os.mkdir(destDir)
-		elif not os.path.isdir(destDir):
-			raise "Destination directory path exists, but is not a directory."
-		
-		# Create the output list of table paths.
-		destNames = []
-		
-		# Loop thorugh the list of requested data files.  Extract and save a copy of each.
-		for fname in (datafiles):
-			source_name = fname
-			dest_fname = os.path.join(destDir, os.path.basename(fname))
-			print "Extracing %s to %s" % (source_name, dest_fname)
-			
-			# Get the data for the requested file.
-			f = hzfile.open(source_name)
-			# Initialize the new file.
-			new_file = None
-			try:
-				# Read the file data.
-				data = f.read()
-				# Create the destination file.
-				new_file = open(dest_fname, 'wb') # must open file as binary (unless you know you're only dealing with text files).
-				# Write the data from the source to destination.
-				new_file.write(data)
-				# Close the newly created file (the local copy).
-				new_file.close()
-				# Add this file's path to the output list of files.
-				destNames.append(dest_fname)
-			finally:
-				# Close the http zip file.
-				f.close()
-				# Close the new file if it is open.
-				if new_file is not None:
-					new_file.close()
-	
-		return destNames
-
-def readDofFile(dofPath):
-	"""Reads DOF file and converts to Obstacle objects.
-	@param dofPath: Path to the DOF file
-	@return: A dict with the following keys: "obstacles" and "currencyDate".  "obstacles" is a list of Obstacle objects.
-	@rtype: dict
-	"""
-	obstacles = []
-	currencyDate = None
-	if os.path.exists(dofPath):
-		with open(dofPath) as f:
-			i = 0
-			for line in f:
-				if i == 0:
-					currencyDate =_parseCurrencyDate(line)
-				elif i >= 4:
-					obstacle = Obstacle(line)
-					obstacles.append(obstacle)
-				i += 1
-				
-	else:
-		raise "File not found: %s" % dofPath
-	return { "obstacles": obstacles, "currencyDate": currencyDate }
-
 def _readDofIntoGdb(dofPath, cursor88, cursor29):
-	"""Reads a DOF file into a geodatabase using the specified cursors.
-	@param dofPath: Path to the DOF file.
-	@type dofPath: str
+	"""Reads a DOF file into a geodatabase using the specified cursors.  Obstacles are read and inserted one at a time.
+	@param dofPath: Path to the DOF file or a file-like object.
+	@type dofPath: str or file
 	@param cursor88: Cursor to the "Obstacles" feature class.
 	@type cursor88: arcpy.InsertCursor
 	@param cursor29: Cursor to the "Obstacles" feature class with the coordinate system set to WGS84 + NGVD1929.
@@ -621,35 +331,40 @@ def _readDofIntoGdb(dofPath, cursor88, cursor29):
 	@rtype: datetime.date
 	@raise IOError: Raised if dofPath does not exist.
 	"""
-	if not os.path.exists(dofPath):
-		raise IOError("File not found: %s" % dofPath)
-	
-	currencyDate = None
-	with open(dofPath) as f:
-		cursor = None
-		i = 0
-		for line in f:
-			if i == 0:
-				currencyDate = _parseCurrencyDate(line)
-			elif i >= 4:
-				obstacle = Obstacle(line)
+	with iterDofFile(dofPath) as reader:
+		for obstacle in reader:
+			# Choose the correct cursor based on the date
+			if _isNgvd1929(obstacle.date):
+				cursor = cursor29
+			else:
+				cursor = cursor88
 				
-				# Choose the correct cursor based on the date
-				if obstacle.date < _zDate:
-					cursor = cursor29
-				else:
-					cursor = cursor88
-					
-				row = cursor.newRow()
-				addObstacleToRow(row, obstacle)
-				cursor.insertRow(row)
-			i += 1
-	return currencyDate
+			row = cursor.newRow()
+			addObstacleToRow(row, obstacle)
+			cursor.insertRow(row)
+	return reader.currencyDate
+
+def _insertRecords(cursor, records):
+	"""Inserts records (see obstacleRecord) through an insert cursor.
+	"""
+	for is29, values, x, y in records:
+		row = cursor.newRow()
+		_setRowValues(row, values, x, y)
+		cursor.insertRow(row)
 
-def readDofsIntoGdb(gdbPath, dofPaths):
+def readDofsIntoGdb(gdbPath, dofPaths, processes=1, shardSize=_defaultShardSize, partitioned=False):
 	"""Reads DOF file into file geodatabase.
 	@param gdbPath: Path to the GDB.
 	@param dofPaths: Paths to DOF files
+	@param processes: The number of processes that parse the DOF files.  If greater than 1, the files are split into 
+	shards that are parsed in a process pool, while this process inserts the parsed records.
+	@type processes: int
+	@param shardSize: The approximate number of bytes of a DOF file parsed by each task of the process pool.
+	@type shardSize: int
+	@param partitioned: If True, each file is parsed in columnar mode and split by vertical datum (see 
+	readDofPartitions), and all of its NAVD 88 records are inserted, followed by all of its NGVD 29 records, instead of
+	switching between the two cursors record by record.  Requires numpy, and holds each file in memory.
+	@type partitioned: bool
 	"""
 	featureClassPath = os.path.join(gdbPath, "Obstacles")
 	currencyDateTablePath = os.path.join(gdbPath, "CurrencyDate")
@@ -657,44 +372,280 @@ def readDofsIntoGdb(gdbPath, dofPaths):
 	cursor88 = arcpy.InsertCursor(featureClassPath)
 	cursor29 = arcpy.InsertCursor(featureClassPath, "%s,%s" % (_wgs84, _ngvd1929))
 	currencyDate = None
-	for dofPath in dofPaths:
-		currencyDate =_readDofIntoGdb(dofPath, cursor88, cursor29)
+	if processes > 1:
+		for shardCurrencyDate, records in parseDofShards(dofPaths, processes, shardSize):
+			if shardCurrencyDate is not None:
+				currencyDate = shardCurrencyDate
+			for is29, values, x, y in records:
+				cursor = cursor29 if is29 else cursor88
+				row = cursor.newRow()
+				_setRowValues(row, values, x, y)
+				cursor.insertRow(row)
+	elif partitioned:
+		for dofPath in dofPaths:
+			partitions = readDofPartitions(dofPath)
+			_insertRecords(cursor88, partitions["navd88"])
+			_insertRecords(cursor29, partitions["ngvd29"])
+			currencyDate = partitions["currencyDate"]
+	else:
+		for dofPath in dofPaths:
+			currencyDate =_readDofIntoGdb(dofPath, cursor88, cursor29)
 	del cursor88, cursor29
 	
 	# Update the currency date.
 	if currencyDate is not None:
 		_updateCurrencyDate(currencyDateTablePath, currencyDate)
 
+_deltaBatchSize = 1000 # Maximum number of object IDs in the where clause of a single cursor.
+
+def readObstacleSignatures(featureClassPath, orsCodes=None):
+	"""Reads the object ID and signature of each obstacle in a DOF feature class.
+	@param featureClassPath: The path to the Obstacles feature class.
+	@param orsCodes: If provided, only obstacles with these ORS codes are read.
+	@type orsCodes: set
+	@return: A dict keyed by (ORS code, obstacle number).  Values are (object ID, signature) tuples, or a list of such 
+	tuples if the feature class contains more than one obstacle with the same key.
+	@rtype: dict
+	"""
+	whereClause = None
+	if orsCodes is not None:
+		whereClause = "OrsCode IN (%s)" % ",".join("'%s'" % orsCode for orsCode in sorted(orsCodes))
+	existing = {}
+	with arcpy.da.SearchCursor(featureClassPath, ("OID@", "SHAPE@X", "SHAPE@Y") + _obstacleFields, whereClause) as cursor:
+		for row in cursor:
+			key = _obstacleKey(row[3], row[4])
+			match = (row[0], _obstacleSignature(row[3:], row[1], row[2]))
+			previous = existing.get(key)
+			if previous is None:
+				existing[key] = match
+			elif isinstance(previous, list):
+				previous.append(match)
+			else:
+				existing[key] = [previous, match]
+	return existing
 
+def _objectIdBatches(objectIds, oidFieldName):
+	"""Yields where clauses that select the given object IDs, at most _deltaBatchSize at a time.
+	"""
+	objectIds = sorted(objectIds)
+	for i in xrange(0, len(objectIds), _deltaBatchSize):
+		yield "%s IN (%s)" % (oidFieldName, ",".join(str(objectId) for objectId in objectIds[i:i + _deltaBatchSize]))
 
-def main(argv=None):
-	"""This method will be run if this file is run as a script (as opposed to a module).
+def applyDofDelta(gdbPath, added, changed, removed, currencyDate=None, memberInfo=None, changeFiles=None):
+	"""Applies the output of computeDofDelta to a DOF geodatabase.  All edits, including the update of the currency 
+	date, are made in a single edit session, so either all of them are saved or, if an error occurs, none of them are.
+	@param gdbPath: The path to the GDB.
+	@param added: The obstacles to insert.
+	@param changed: (object ID, obstacle) tuples for the features to update.
+	@param removed: The object IDs of the features to delete.
+	@param currencyDate: If provided, the new currency date.
+	@type currencyDate: datetime.date
+	@param memberInfo: If provided, a dict of (CRC-32, size) tuples keyed by data file name to record in the 
+	ImportedMembers table.
+	@type memberInfo: dict
+	@param changeFiles: If provided, the daily change files (as returned by findDailyChangeFiles) to record in the 
+	DailyChanges table.
+	@type changeFiles: list
 	"""
+	featureClassPath = os.path.join(gdbPath, "Obstacles")
+	oidFieldName = arcpy.Describe(featureClassPath).OIDFieldName
+	spatialReference29 = "%s,%s" % (_wgs84, _ngvd1929)
 	
-	if argv is None:
-		argv = sys.argv
+	# Split the updates by vertical datum, since each needs a cursor with its own spatial reference.
+	changed88, changed29 = {}, {}
+	for objectId, obstacle in changed:
+		if _isNgvd1929(obstacle.date):
+			changed29[objectId] = obstacle
+		else:
+			changed88[objectId] = obstacle
+	
+	with arcpy.da.Editor(gdbPath):
+		for whereClause in _objectIdBatches(removed, oidFieldName):
+			cursor, row = None, None
+			try:
+				cursor = arcpy.UpdateCursor(featureClassPath, whereClause)
+				for row in cursor:
+					cursor.deleteRow(row)
+			finally:
+				del row, cursor
 		
-	# Get the parameter for the output GDB.
-	if len(argv) > 1:
-		gdbPath = os.path.abspath(arcpy.GetParameterAsText(0))
-	else:
-		gdbPath = os.path.abspath("../FaaObstruction.gdb")
+		for obstacles, spatialReference in ((changed88, None), (changed29, spatialReference29)):
+			for whereClause in _objectIdBatches(obstacles, oidFieldName):
+				cursor, row = None, None
+				try:
+					cursor = arcpy.UpdateCursor(featureClassPath, whereClause, spatialReference)
+					for row in cursor:
+						addObstacleToRow(row, obstacles[row.getValue(oidFieldName)])
+						cursor.updateRow(row)
+				finally:
+					del row, cursor
+		
+		if added:
+			cursor88, cursor29 = None, None
+			try:
+				cursor88 = arcpy.InsertCursor(featureClassPath)
+				cursor29 = arcpy.InsertCursor(featureClassPath, spatialReference29)
+				for obstacle in added:
+					cursor = cursor29 if _isNgvd1929(obstacle.date) else cursor88
+					row = cursor.newRow()
+					addObstacleToRow(row, obstacle)
+					cursor.insertRow(row)
+			finally:
+				del cursor88, cursor29
+		
+		if currencyDate is not None:
+			_updateCurrencyDate(os.path.join(gdbPath, "CurrencyDate"), currencyDate)
+		if memberInfo:
+			_updateImportedMembers(os.path.join(gdbPath, "ImportedMembers"), memberInfo)
+		if changeFiles:
+			_addDailyChanges(os.path.join(gdbPath, "DailyChanges"), changeFiles)
+
+def updateDofsInGdb(gdbPath, dofPaths, memberInfo=None):
+	"""Updates an existing DOF geodatabase from DOF files, writing only the obstacles that were added, changed or 
+	removed.  Obstacles are matched by ORS code and obstacle number.
+	
+	If every DOF file is a state file (e.g., "53-WA.Dat"), only obstacles with the ORS codes of those files are 
+	compared, so obstacles imported from other files are kept.  Otherwise the DOF files are taken to be the complete 
+	data set and any obstacle not in them is removed.
+	@param gdbPath: The path to the GDB.
+	@param dofPaths: Paths to DOF files
+	@param memberInfo: If provided, a dict of (CRC-32, size) tuples keyed by data file name to record in the 
+	ImportedMembers table.
+	@return: A dict with the number of obstacles "added", "changed" and "removed".
+	@rtype: dict
+	"""
+	orsCodes = set(_memberOrsCode(os.path.basename(dofPath)) for dofPath in dofPaths)
+	if None in orsCodes:
+		orsCodes = None
+	existing = readObstacleSignatures(os.path.join(gdbPath, "Obstacles"), orsCodes)
+	
+	readers = []
+	try:
+		for dofPath in dofPaths:
+			readers.append(DofReader(dofPath))
+		added, changed, removed = computeDofDelta(existing, itertools.chain(*readers))
+	finally:
+		for reader in readers:
+			reader.close()
+	currencyDate = readers[-1].currencyDate if readers else None
+	
+	applyDofDelta(gdbPath, added, changed, removed, currencyDate, memberInfo)
+	return {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+def _dailyChangesAfter(currencyDate, lastDailyChange):
+	"""Returns the date after which daily change files have not been applied: the later of the currency date and the 
+	date of the last daily change file applied, either of which may be None (e.g., before the first daily change file 
+	has been applied).  Returns None if both are None.
+	"""
+	dates = [date for date in (currencyDate, lastDailyChange) if date is not None]
+	return max(dates) if dates else None
+
+def applyDailyChanges(gdbPath, datafiles=('53-WA.Dat',), url="http://tod.faa.gov/tod/public/", index_url="http://tod.faa.gov/tod/public/TOD_DOF.html", session=None, cache=None):
+	"""Applies the daily change (DDOF) files published since the geodatabase was last updated.
+	Only files dated after both the currency date and the last daily change file applied are read.  All of their 
+	changes are applied, and the files recorded, in a single edit session.
+	@param gdbPath: The path to an existing DOF geodatabase.
+	@param datafiles: The names of the data files the geodatabase was loaded from.  Only changes to obstacles with the 
+	ORS codes of these files are applied.  If any name does not start with an ORS code, all changes are applied.
+	@param url: The URL that the links on the index page are relative to.
+	@param index_url: The URL of the page that links to the DDOF_* zip archives.
+	@param session: The HTTP session used for the downloads.
+	@type session: remotezip.HTTPSession
+	@param cache: If provided, the index page and change files are cached.
+	@type cache: remotezip.ZipCache
+	@return: The change files that were applied.
+	@rtype: list
+	"""
+	if not arcpy.Exists(os.path.join(gdbPath, "DailyChanges")):
+		# The geodatabase was created before daily change files were recorded.
+		createDailyChangesTable(gdbPath)
+	after = _dailyChangesAfter(getCurrencyDate(gdbPath), getLastDailyChange(gdbPath))
+	changeFiles = findDailyChangeFiles(url, index_url, after, session, cache)
+	if not changeFiles:
+		print "No daily change files have been published since %s." % after
+		return []
 	
+	orsCodes = set(_memberOrsCode(name) for name in datafiles)
+	if None in orsCodes:
+		orsCodes = None
+	print "Reading %s..." % ", ".join(changeFile["name"] for changeFile in changeFiles)
+	obstacles = readDailyChanges(changeFiles, orsCodes, session, cache)
+	if orsCodes is None:
+		orsCodes = set(obstacle.orsCode for obstacle in obstacles)
+	existing = readObstacleSignatures(os.path.join(gdbPath, "Obstacles"), orsCodes) if orsCodes else {}
+	added, changed, removed = computeDailyDelta(existing, obstacles)
+	print "%d added, %d changed, %d removed." % (len(added), len(changed), len(removed))
+	applyDofDelta(gdbPath, added, changed, removed, changeFiles=changeFiles)
+	return changeFiles
+
+def updateDofGdb(gdbPath, datafiles=('53-WA.Dat',), daily=False, **downloadOptions):
+	"""Creates or updates a DOF geodatabase with the newest data from the FAA website.
+	If the geodatabase already exists, only the obstacles that were added, changed or removed are written (see 
+	updateDofsInGdb).  If it also records the CRC-32 and size of the data files it was loaded from, only the data files 
+	that have changed are downloaded and compared.
+	@param gdbPath: The path to the geodatabase.
+	@param datafiles: The names of the data files to load.
+	@param daily: If True, the daily change files published since the newest full DOF are applied afterwards (see 
+	applyDailyChanges).
+	@type daily: bool
+	@param downloadOptions: Other keyword arguments are passed to downloadDofs.
+	"""
 	currencyDate = None
-	if arcpy.Exists(gdbPath):
+	importedMembers = None
+	incremental = arcpy.Exists(gdbPath)
+	if incremental:
 		# Get the currency date
 		currencyDate = getCurrencyDate(gdbPath)
-		
+		importedMembers = getImportedMembers(gdbPath)
+		if importedMembers is None:
+			# The geodatabase was created before imported data files were recorded.
+			createImportedMembersTable(gdbPath)
+	
 	print "Downloading DOFs..."
-	dofFilePaths = downloadDofs(lastCurrencyDate=currencyDate);
+	memberInfo = {}
+	release = {}
+	dofFilePaths = downloadDofs(datafiles=datafiles, lastCurrencyDate=currencyDate, importedMembers=importedMembers, 
+							memberInfo=memberInfo, release=release, **downloadOptions)
 	
-	if dofFilePaths is not None:
-		
+	if dofFilePaths == [] and incremental:
+		# There is a newer release, but none of its data files have changed.  Record it, so that later runs (and the
+		# daily change files) start from it.
+		print "No data files have changed.  Recording the currency date of %s..." % release["url"]
+		_updateCurrencyDate(os.path.join(gdbPath, "CurrencyDate"), release["date"])
+		_updateImportedMembers(os.path.join(gdbPath, "ImportedMembers"), memberInfo)
+	elif dofFilePaths and incremental:
+		print "Updating changed obstacles..."
+		counts = updateDofsInGdb(gdbPath, dofFilePaths, memberInfo)
+		print "%(added)d added, %(changed)d changed, %(removed)d removed." % counts
+	elif dofFilePaths:
 		print "Creating new geodatabase: %s..." % gdbPath
 		createDofGdb(gdbPath)
-		
 		print "Importing data..."
 		readDofsIntoGdb(gdbPath, dofFilePaths)
+		_updateImportedMembers(os.path.join(gdbPath, "ImportedMembers"), memberInfo)
+	
+	if daily and arcpy.Exists(gdbPath):
+		print "Applying daily changes..."
+		dailyOptions = dict((name, downloadOptions[name]) for name in ("url", "index_url", "session", "cache") 
+						if name in downloadOptions)
+		applyDailyChanges(gdbPath, datafiles, **dailyOptions)
+
+def main(argv=None):
+	"""This method will be run if this file is run as a script (as opposed to a module).
+	"""
+	
+	if argv is None:
+		argv = sys.argv
+		
+	# Get the parameter for the output GDB.
+	if len(argv) > 1:
+		gdbPath = os.path.abspath(arcpy.GetParameterAsText(0))
+	else:
+		gdbPath = os.path.abspath("../FaaObstruction.gdb")
+	# The optional second parameter turns on the application of daily change files.
+	daily = len(argv) > 2 and arcpy.GetParameterAsText(1).lower() in ("true", "daily")
+	
+	updateDofGdb(gdbPath, daily=daily)
 	
 	print "Finished"
 
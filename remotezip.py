@@ -6,12 +6,28 @@ Read remote ZIP files using HTTP range requests
 @see: http://stackoverflow.com/a/7843535
 """
 import struct
+import sys
+import urllib
 import urllib2
-# import zlib
+import urlparse
+import httplib
+import socket
+import threading
+import zlib
 import cStringIO
-from zipfile import ZipExtFile, ZipInfo, BadZipfile
+import cPickle
+import json
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import Queue
+import asyncore
+import mimetools
+from zipfile import ZipExtFile, ZipInfo, BadZipfile, ZIP_STORED, ZIP_DEFLATED
 from os.path import join, basename, exists, isdir
-from os import mkdir
+from os import mkdir, remove
 
 # The code is mostly adatpted from the zipfile module
 # NOTE: ZIP64 is not supported
@@ -82,66 +98,709 @@ _FH_FILENAME_LENGTH = 10
 _FH_EXTRA_FIELD_LENGTH = 11
 
 
-def _http_get_partial_data(url, start_range, end_range=None):
-	req = urllib2.Request(url)
+# Default number of bytes read from the network (and inflated) at a time by HTTPZipFile.extract_to.
+_CHUNK_SIZE = 1 << 16
+
+# Number of consecutive range responses without data after which HTTPZipFile.extract_to gives up.
+_MAX_EMPTY_RESPONSES = 3
+
+# Number of bytes downloaded between updates of a resumable download's checkpoint file.
+_CHECKPOINT_INTERVAL = 1 << 20
+
+# Number of bytes at the end of an archive requested by HTTPZipFile when opening an archive from a host that it 
+# hasn't opened an archive from before.  (The central directory of a DOF zip is a few kilobytes.)
+_DEFAULT_TAIL_SIZE = 1 << 14
+
+# Number of bytes read past the file name (plus the central directory's copy of the extra field) when opening a
+# member, so that a local extra field longer than the central directory's copy usually arrives in the same request.
+_LOCAL_EXTRA_ALLOWANCE = 1 << 8
+
+
+class HTTPSessionResponse(object):
+	"""File-like response returned by HTTPSession.request.  Provides the parts of the urllib2 response interface used
+	by this module (read, close, getcode, geturl, info and headers).  When the body has been read completely the
+	connection is returned to the session's pool."""
+	def __init__(self, session, key, conn, response, url):
+		self._session = session
+		self._key = key
+		self._conn = conn
+		self._response = response
+		self.url = url
+		self.code = response.status
+		self.msg = response.reason
+		self.headers = response.msg
+
+	def read(self, amt=None):
+		if self._response is None:
+			return ""
+		if amt is None:
+			data = self._response.read()
+		else:
+			data = self._response.read(amt)
+		if self._response.isclosed() or (amt is not None and not data):
+			self._release()
+		return data
+
+	def getcode(self):
+		return self.code
+
+	def geturl(self):
+		return self.url
+
+	def info(self):
+		return self.headers
+
+	def _release(self):
+		if self._response is not None:
+			reusable = self._response.isclosed() and not self._response.will_close
+			self._session._release(self._key, self._conn, reusable)
+			self._response = None
+			self._conn = None
+
+	def close(self):
+		"""Close the response.  If the body was not read completely, the connection is discarded."""
+		if self._response is not None:
+			if not self._response.isclosed():
+				self._response.close()
+				self._conn.close()
+				self._session._release(self._key, self._conn, False)
+				self._response = None
+				self._conn = None
+			else:
+				self._release()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+class HTTPSession(object):
+	"""Keeps persistent (keep-alive) HTTP connections to each host so that consecutive requests (e.g., the range
+	requests made by HTTPZipFile) do not each have to set up a new TCP (and TLS) connection.  Safe to share between
+	threads.
+	@ivar connections_opened: The number of connections that have been opened.
+	@ivar connections_reused: The number of requests that were sent on an already open connection.
+	"""
+	max_redirects = 5
+
+	def __init__(self, pool_size=4, timeout=60):
+		"""
+		@param pool_size: The maximum number of idle connections kept open per host.
+		@type pool_size: int
+		@param timeout: Socket timeout, in seconds, for connecting and reading.
+		@type timeout: float
+		"""
+		self.pool_size = pool_size
+		self.timeout = timeout
+		self.connections_opened = 0
+		self.connections_reused = 0
+		self._idle = {} # (scheme, host, port) -> list of idle connections
+		self._lock = threading.Lock()
+		# Host -> number of bytes at the end of the archives from that host that contain the end of central directory 
+		# record and the central directory.  Used by HTTPZipFile to size its first request.
+		self.tail_sizes = {}
+
+	def _new_connection(self, scheme, host, port):
+		proxy = urllib.getproxies().get(scheme)
+		if proxy and not urllib.proxy_bypass(host):
+			proxy = urlparse.urlsplit(proxy)
+			if scheme == "https":
+				conn = httplib.HTTPSConnection(proxy.hostname, proxy.port, timeout=self.timeout)
+				conn.set_tunnel(host, port)
+			else:
+				conn = httplib.HTTPConnection(proxy.hostname, proxy.port, timeout=self.timeout)
+			conn.via_proxy = scheme == "http"
+		else:
+			if scheme == "https":
+				conn = httplib.HTTPSConnection(host, port, timeout=self.timeout)
+			else:
+				conn = httplib.HTTPConnection(host, port, timeout=self.timeout)
+			conn.via_proxy = False
+		with self._lock:
+			self.connections_opened += 1
+		return conn
+
+	def _acquire(self, key):
+		"""Return (connection, reused) for the host."""
+		with self._lock:
+			idle = self._idle.get(key)
+			if idle:
+				self.connections_reused += 1
+				return idle.pop(), True
+		return self._new_connection(*key), False
+
+	def _release(self, key, conn, reusable):
+		if conn is None:
+			return
+		with self._lock:
+			idle = self._idle.setdefault(key, [])
+			if reusable and len(idle) < self.pool_size:
+				idle.append(conn)
+				return
+		conn.close()
+
+	def request(self, url, headers=None, method="GET"):
+		"""Send a request and return an HTTPSessionResponse.  Redirects are followed.
+		@raise urllib2.HTTPError: Raised if the server responds with an error status.
+		"""
+		headers = dict(headers or {})
+		for i in range(self.max_redirects + 1):
+			parts = urlparse.urlsplit(url)
+			scheme = parts.scheme.lower()
+			key = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+			path = parts.path or "/"
+			if parts.query:
+				path += "?" + parts.query
+			conn, reused = self._acquire(key)
+			try:
+				conn.request(method, url if conn.via_proxy else path, headers=headers)
+				response = conn.getresponse()
+			except (httplib.HTTPException, socket.error):
+				conn.close()
+				if not reused:
+					raise
+				# The server closed an idle keep-alive connection.  Retry once on a new connection.
+				conn = self._new_connection(*key)
+				conn.request(method, url if conn.via_proxy else path, headers=headers)
+				response = conn.getresponse()
+			result = HTTPSessionResponse(self, key, conn, response, url)
+			if response.status in (301, 302, 303, 307) and response.getheader("Location"):
+				result.read()
+				result.close()
+				url = urlparse.urljoin(url, response.getheader("Location"))
+				continue
+			if response.status >= 400:
+				body = result.read()
+				result.close()
+				raise urllib2.HTTPError(url, response.status, response.reason, response.msg, cStringIO.StringIO(body))
+			return result
+		raise urllib2.HTTPError(url, response.status, "Too many redirects", response.msg, None)
+
+	def close(self):
+		"""Close all idle connections."""
+		with self._lock:
+			idle, self._idle = self._idle, {}
+		for conns in idle.values():
+			for conn in conns:
+				conn.close()
+
+
+# The session used when one is not provided.
+default_session = HTTPSession()
+
+
+class _WholeFileRange(object):
+	"""Reads a byte range from a response that contains the whole file, because the server ignored the Range header.
+	The bytes before the range are read and discarded, and reading stops at the end of the range."""
+	def __init__(self, f, start, end=None):
+		self._f = f
+		self.headers = f.headers
+		self._remaining = end - start + 1 if end is not None else None
+		while start > 0:
+			data = f.read(min(start, _CHUNK_SIZE))
+			if not data:
+				break
+			start -= len(data)
+
+	def read(self, amt=None):
+		if self._remaining is not None:
+			amt = self._remaining if amt is None else min(amt, self._remaining)
+			if amt <= 0:
+				return ""
+		data = self._f.read(amt) if amt is not None else self._f.read()
+		if self._remaining is not None:
+			self._remaining -= len(data)
+		return data
+
+	def getcode(self):
+		return self._f.getcode()
+
+	def close(self):
+		self._f.close()
+
+
+def _http_get_partial_data(url, start_range, end_range=None, session=None):
+	"""Request a byte range of url.
+	@return: A file-like object that reads the bytes from start_range through end_range (inclusive), even if the server
+	ignores the Range header."""
 	range_header = "bytes=%s" % start_range
 	if end_range is not None:
 		range_header += "-%s" % end_range
-	req.headers['Range'] = range_header
-	f = urllib2.urlopen(req)	
+	f = (session or default_session).request(url, {'Range': range_header})
+	if f.getcode() == 200:
+		return _WholeFileRange(f, start_range, end_range)
 	return f
 
 
-def _EndRecData(url):
-	"""Return data from the "End of Central Directory" record, or None.
+def _http_get_ranges(url, ranges, session=None):
+	"""Requests several byte ranges of a URL in a single request.
+	@param ranges: A list of (start, end) tuples.  end is inclusive.
+	@return: A list of (start, data) tuples containing the bytes the server returned.  The server may merge
+	ranges or ignore the request for multiple ranges, so this may not correspond one to one with ranges.  If the server
+	ignores the Range header entirely, an empty list is returned.
+	"""
+	range_header = "bytes=" + ",".join(["%d-%d" % r for r in ranges])
+	f = (session or default_session).request(url, {'Range': range_header})
+	try:
+		if f.getcode() != 206:
+			# The whole file is being sent.  Don't download it.
+			return []
+		content_type = f.headers.get('Content-Type', '')
+		if content_type.lower().startswith('multipart/byteranges'):
+			boundary = content_type.split('boundary=')[1].split(';')[0].strip().strip('"')
+			return _parse_byteranges(f.read(), boundary)
+		start = int(f.headers.get('Content-Range').split(' ')[1].split('-')[0])
+		return [(start, f.read())]
+	finally:
+		f.close()
 
-	The data is a list of the nine items in the ZIP "End of central dir"
-	record followed by a tenth item, the file seek offset of this record."""
-	ECD = _http_get_partial_data(url, -sizeEndCentDir)
-	content_range =  ECD.headers.get('Content-Range')
-	filesize = int(content_range.split('/')[1]) if content_range and '/' in content_range else 0
-	data = ECD.read()
-	ECD.close() 
-	if data[0:4] == stringEndArchive and data[-2:] == "\000\000":
+
+def _parse_byteranges(body, boundary):
+	"""Parses the body of a multipart/byteranges response into a list of (start, data) tuples."""
+	parts = []
+	delimiter = "--" + boundary
+	pos = body.find(delimiter)
+	while pos >= 0:
+		pos += len(delimiter)
+		if body[pos:pos+2] == "--":
+			break
+		header_end = body.find("\r\n\r\n", pos)
+		if header_end < 0:
+			break
+		content_range = None
+		for header in body[pos:header_end].split("\r\n"):
+			if header.lower().startswith("content-range:"):
+				content_range = header.split(":", 1)[1].strip()
+		if content_range is None:
+			raise IOError("multipart/byteranges part has no Content-Range header")
+		first, last = content_range.split(" ")[1].split("/")[0].split("-")
+		data_start = header_end + 4
+		data_end = data_start + int(last) - int(first) + 1
+		parts.append((int(first), body[data_start:data_end]))
+		pos = body.find(delimiter, data_end)
+	return parts
+
+
+class ArchiveChangedError(IOError):
+	"""Raised when a partially downloaded member can't be resumed because the archive has changed (its ETag, 
+	Last-Modified date or size differs from when the download started)."""
+	pass
+
+
+class _ParallelRangeReader(object):
+	"""File-like object that reads a byte range of a URL using several range requests made at the same time.  The 
+	range is split into equal segments.  The first segment is read directly from its response while the others are 
+	downloaded into temporary files by worker threads; they are then read in order.  Memory use is therefore bounded 
+	by the read size, not by the size of the range.  Closing the reader stops the downloads that are still running and
+	removes the temporary files."""
+	def __init__(self, url, start, end, parallel, session=None):
+		self.url = url
+		self.session = session or default_session
+		segment_size = -(-(end - start + 1) // parallel)
+		self._segments = [(first, min(first + segment_size - 1, end)) for first in range(start, end + 1, segment_size)]
+		count = len(self._segments)
+		self._files = [None] * count
+		self._errors = [None] * count
+		self._threads = [None] * count
+		self._closed = False
+		self._index = 0
+		self._read = 0
+		self._current = None
+		for i in range(1, count):
+			thread = threading.Thread(target=self._download, args=(i,), name="_ParallelRangeReader segment %d" % i)
+			thread.daemon = True
+			thread.start()
+			self._threads[i] = thread
+		try:
+			self._current = _http_get_partial_data(url, self._segments[0][0], self._segments[0][1], self.session)
+		except:
+			# Stop the other downloads before giving up.
+			self.close()
+			raise
+
+	def _download(self, i):
+		"""Download segment i into a temporary file."""
+		first, last = self._segments[i]
+		try:
+			f = _http_get_partial_data(self.url, first, last, self.session)
+			try:
+				temp = tempfile.TemporaryFile()
+				while not self._closed:
+					data = f.read(_CHUNK_SIZE)
+					if not data:
+						break
+					temp.write(data)
+			finally:
+				f.close()
+			if self._closed:
+				temp.close()
+				return
+			if temp.tell() != last - first + 1:
+				temp.close()
+				raise IOError("Received %d bytes of %d for range %d-%d of %s" % (temp.tell(), last - first + 1, 
+																			  first, last, self.url))
+			temp.seek(0)
+			self._files[i] = temp
+		except Exception, e:
+			self._errors[i] = e
+
+	def _next_segment(self):
+		first, last = self._segments[self._index]
+		self._current.close()
+		if self._read != last - first + 1:
+			raise IOError("Received %d bytes of %d for range %d-%d of %s" % (self._read, last - first + 1, 
+																		  first, last, self.url))
+		self._index += 1
+		self._read = 0
+		if self._index >= len(self._segments):
+			self._current = None
+			return
+		self._threads[self._index].join()
+		if self._errors[self._index] is not None:
+			raise self._errors[self._index]
+		self._current = self._files[self._index]
+
+	def read(self, amt=None):
+		"""Read amt bytes (fewer only at the end of the range), or the rest of the range if amt is omitted."""
+		chunks = []
+		while self._current is not None and (amt is None or amt > 0):
+			data = self._current.read(amt if amt is not None else _CHUNK_SIZE)
+			if data:
+				chunks.append(data)
+				self._read += len(data)
+				if amt is not None:
+					amt -= len(data)
+			else:
+				self._next_segment()
+		return "".join(chunks)
+
+	def close(self):
+		self._closed = True
+		if self._current is not None:
+			self._current.close()
+			self._current = None
+		for thread in self._threads[1:]:
+			thread.join()
+		for f in self._files:
+			if f is not None:
+				f.close()
+
+
+class ZipCache(object):
+	"""A size-bounded, on-disk cache of remote ZIP archive central directories, extracted members and web pages.
+	Central directories are keyed by URL and the archive's ETag or Last-Modified validator.  Members are content 
+	addressed: they are keyed by their CRC-32 and size, so an unchanged member is found no matter which archive
+	(release) it comes from.  When the cache grows beyond max_size, the least recently used entries are removed.
+	Entries are written to a temporary file and then renamed into place, so the cache can be shared by several 
+	threads or processes.
+	"""
+	def __init__(self, path, max_size=1 << 30):
+		"""
+		@param path: The directory where cached data is stored.  It is created if it does not exist.
+		@param max_size: The maximum total size of the cache, in bytes.
+		"""
+		self.path = path
+		self.max_size = max_size
+		self._lock = threading.Lock()
+		for kind in ("directories", "members", "pages"):
+			kind_path = join(path, kind)
+			if not exists(kind_path):
+				try:
+					os.makedirs(kind_path)
+				except OSError:
+					if not isdir(kind_path):
+						raise
+
+	def _entry_path(self, kind, key):
+		if kind != "members":
+			key = hashlib.sha1(key).hexdigest()
+		return join(self.path, kind, key)
+
+	def _get(self, kind, key):
+		"""Return the path of an entry, marking it as recently used, or None if it is not cached."""
+		path = self._entry_path(kind, key)
+		try:
+			os.utime(path, None)
+		except OSError:
+			return None
+		return path
+
+	def _put_file(self, kind, key, source):
+		"""Copy the file-like object source into the cache."""
+		path = self._entry_path(kind, key)
+		fd, temp_path = tempfile.mkstemp(dir=join(self.path, kind))
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				shutil.copyfileobj(source, f)
+			if exists(path):
+				# Another thread or process already added this entry.
+				remove(temp_path)
+			else:
+				os.rename(temp_path, path)
+		except (IOError, OSError):
+			if exists(temp_path):
+				remove(temp_path)
+			raise
+		self._evict()
+		return path
+
+	def _get_object(self, kind, key):
+		path = self._get(kind, key)
+		if path is None:
+			return None
+		try:
+			with open(path, 'rb') as f:
+				return cPickle.load(f)
+		except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+			return None
+
+	def _put_object(self, kind, key, value):
+		self._put_file(kind, key, cStringIO.StringIO(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)))
+
+	def _evict(self):
+		"""Remove the least recently used entries until the cache is no larger than max_size."""
+		with self._lock:
+			entries = []
+			total = 0
+			for kind in ("directories", "members", "pages"):
+				kind_path = join(self.path, kind)
+				for name in os.listdir(kind_path):
+					try:
+						st = os.stat(join(kind_path, name))
+					except OSError:
+						continue
+					entries.append((st.st_mtime, st.st_size, join(kind_path, name)))
+					total += st.st_size
+			entries.sort()
+			for mtime, size, path in entries:
+				if total <= self.max_size:
+					break
+				try:
+					remove(path)
+				except OSError:
+					pass
+				total -= size
+
+	def get_directory(self, url, validator):
+		"""Return the cached (end of central directory record, central directory data) of an archive, or None."""
+		return self._get_object("directories", url + "\0" + validator)
+
+	def put_directory(self, url, validator, endrec, data):
+		self._put_object("directories", url + "\0" + validator, (endrec, data))
+
+	def member_key(self, zinfo):
+		return "%08x-%d" % (zinfo.CRC, zinfo.file_size)
+
+	def get_member(self, zinfo):
+		"""Return the path of a cached copy of an extracted member, or None."""
+		return self._get("members", self.member_key(zinfo))
+
+	def put_member(self, zinfo, path):
+		"""Add a copy of the extracted member at path to the cache, unless it is larger than the cache itself."""
+		if os.path.getsize(path) > self.max_size:
+			return
+		with open(path, 'rb') as f:
+			self._put_file("members", self.member_key(zinfo), f)
+
+	def get_page(self, url):
+		"""Return the cached (validators, body) of a web page, or None.  validators is a dict of the conditional
+		request headers (If-None-Match and If-Modified-Since) to send to check whether it has changed."""
+		return self._get_object("pages", url)
+
+	def put_page(self, url, response, body):
+		"""Add a web page to the cache, if the response has an ETag or Last-Modified header."""
+		validators = {}
+		if response.headers.get('ETag'):
+			validators['If-None-Match'] = response.headers.get('ETag')
+		if response.headers.get('Last-Modified'):
+			validators['If-Modified-Since'] = response.headers.get('Last-Modified')
+		if validators:
+			self._put_object("pages", url, (validators, body))
+
+
+def get_page(url, session=None, cache=None):
+	"""Return the body of a web page.  If a cache is provided, a conditional request is made, and the cached copy is used 
+	if the page has not changed.
+	@type session: HTTPSession
+	@type cache: ZipCache
+	"""
+	headers = {}
+	cached = cache.get_page(url) if cache is not None else None
+	if cached is not None:
+		headers.update(cached[0])
+	f = (session or default_session).request(url, headers)
+	try:
+		if f.getcode() == 304:
+			# Read the (empty) body so that the connection is returned to the session's pool.
+			f.read()
+			return cached[1]
+		body = f.read()
+	finally:
+		f.close()
+	if cache is not None:
+		cache.put_page(url, f, body)
+	return body
+
+
+def _parse_content_range(content_range):
+	"""Return (first, last, total) from a Content-Range header value (e.g., "bytes 0-99/1234")."""
+	byte_range, total = content_range.split(' ')[-1].split('/')
+	first, last = byte_range.split('-')
+	return int(first), int(last), int(total) if total != '*' else None
+
+
+def _find_end_record(data, data_offset):
+	"""Return data from the "End of Central Directory" record found in data, or None.
+	@param data: Bytes from the end of the archive.
+	@param data_offset: The offset of data within the archive.
+	@return: A list of the nine items in the ZIP "End of central dir" record followed by the comment and the file seek
+	offset of this record (see _EndRecData), or None if the record is not in data."""
+	end = len(data) - sizeEndCentDir
+	if end >= 0 and data[end:end+4] == stringEndArchive and data[-2:] == "\000\000":
 		# the signature is correct and there's no comment, unpack structure
-		endrec = struct.unpack(structEndArchive, data)
-		endrec = list(endrec)
+		endrec = list(struct.unpack(structEndArchive, data[end:]))
 
 		# Append a blank comment and record start offset
 		endrec.append("")
-		endrec.append(filesize - sizeEndCentDir)
+		endrec.append(data_offset + end)
 		return endrec
 	# Either this is not a ZIP file, or it is a ZIP file with an archive
-	# comment.  Search the end of the file for the "end of central directory"
-	# record signature. The comment is the last item in the ZIP file and may be
-	# up to 64K long.  It is assumed that the "end of central directory" magic
-	# number does not appear in the comment.
+	# comment.  Search for the "end of central directory" record signature. 
+	# It is assumed that the "end of central directory" magic number does
+	# not appear in the comment.
+	start = data.rfind(stringEndArchive)
+	if start >= 0 and start + sizeEndCentDir <= len(data):
+		# found the magic number; attempt to unpack and interpret
+		recData = data[start:start+sizeEndCentDir]
+		endrec = list(struct.unpack(structEndArchive, recData))
+		commentSize = endrec[_ECD_COMMENT_SIZE] #as claimed by the zip file
+		comment = data[start+sizeEndCentDir:start+sizeEndCentDir+commentSize]
+		endrec.append(comment)
+		endrec.append(data_offset + start)
+		return endrec
+	return None
+
+
+def _range_result(data, content_range):
+	"""Return (data, offset of data within the file, size of the file) for the body and Content-Range header of a
+	response to a range request."""
+	if content_range:
+		first, last, total = _parse_content_range(content_range)
+		return data, first, total if total is not None else first + len(data)
+	# The server sent the whole file.
+	return data, 0, len(data)
+
+
+def _range_data(response, start, end):
+	"""Return bytes start through end (inclusive) of a file from the (data, offset, file size) result of a range request.
+	The data may begin before start, or continue past end, if the server sent more than was requested (e.g., the whole
+	file, because it ignores the Range header)."""
+	data, first, filesize = response
+	return data[start - first:end - first + 1]
+
+
+def _read_range(url, range_header, session=None):
+	"""Make a range request.
+	@param range_header: The value of the Range header (e.g., "bytes=-22" or "bytes=0-99").
+	@return: (data, offset of data within the file, size of the file)"""
+	f = (session or default_session).request(url, {'Range': range_header})
+	try:
+		data = f.read()
+		content_range = f.headers.get('Content-Range')
+	finally:
+		f.close()
+	return _range_result(data, content_range)
+
+
+def _read_tail(url, size, session=None):
+	"""Request the last size bytes of url.
+	@return: (data, offset of data within the file, size of the file)"""
+	return _read_range(url, "bytes=-%d" % size, session)
+
+
+class _Result(object):
+	"""Yielded by a reading steps generator (e.g., HTTPZipFile._contents_steps) as its final value.
 
+	Reading steps contain the ZIP parsing logic without doing any I/O.  They yield the Range header of each request
+	they need and are sent (data, offset, file size) in response, so the same steps can be run with blocking requests
+	(_run_steps) or on an event loop (AsyncHTTPZipFile)."""
+	def __init__(self, value):
+		self.value = value
+
+
+def _run_steps(steps, fetch):
+	"""Run a reading steps generator, using fetch(range_header) to make each request, and return its result."""
+	response = None
+	while True:
+		request = steps.send(response)
+		if isinstance(request, _Result):
+			steps.close()
+			return request.value
+		response = fetch(request)
+
+
+def _EndRecData(url, session=None):
+	"""Return data from the "End of Central Directory" record, or None.
+
+	The data is a list of the nine items in the ZIP "End of central dir"
+	record followed by a tenth item, the file seek offset of this record."""
+	data, offset, filesize = _read_tail(url, sizeEndCentDir, session)
+	endrec = _find_end_record(data, offset)
+	if endrec is not None:
+		return endrec
+	# The comment is the last item in the ZIP file and may be up to 64K long.
 	# Search by retrieving chunks of 256, 1k and 64k
 	try_ranges = (1 << 8, 1 << 10, 1 << 16)
 	for check_range in try_ranges:
-		ECD = _http_get_partial_data(url, -(check_range + sizeEndCentDir))	  
-		data = ECD.read()	   
-		content_range =  ECD.headers.get('Content-Range')	   
-		ECD.close()
-		download_start = content_range.split('-')[0]
-		start = data.rfind(stringEndArchive)		
-		if start >= 0:		  
-			# found the magic number; attempt to unpack and interpret
-			recData = data[start:start+sizeEndCentDir]
-			endrec = list(struct.unpack(structEndArchive, recData))
-			commentSize = endrec[_ECD_COMMENT_SIZE] #as claimed by the zip file
-			comment = data[start+sizeEndCentDir:start+sizeEndCentDir+commentSize]
-			endrec.append(comment)
-			endrec.append(download_start + start)		   
+		data, offset, filesize = _read_tail(url, check_range + sizeEndCentDir, session)
+		endrec = _find_end_record(data, offset)
+		if endrec is not None:
 			return endrec
 
 	raise IOError
 
 
+def _write_checkpoint(path, checkpoint):
+	"""Write a resumable download's checkpoint file, replacing it atomically."""
+	temp_path = path + ".tmp"
+	with open(temp_path, 'w') as f:
+		json.dump(checkpoint, f)
+	try:
+		os.rename(temp_path, path)
+	except OSError:
+		# Windows can't rename over an existing file.
+		remove(path)
+		os.rename(temp_path, path)
+
+
+def _remove_partial(dest_path):
+	"""Remove the partial download and checkpoint files of a resumable download."""
+	for path in (dest_path + ".part", dest_path + ".checkpoint"):
+		if exists(path):
+			remove(path)
+
+
 class HTTPZipFile:
-	def __init__(self, url):
+	def __init__(self, url, session=None, cache=None, single_request=True):
+		"""
+		@param url: The URL of the ZIP archive.
+		@param session: The HTTPSession used for requests.  If omitted, the module's default_session is used.
+		@type session: HTTPSession
+		@param cache: If provided, the central directory and extracted members are cached, and are only downloaded 
+		again if the archive (or member) has changed.
+		@type cache: ZipCache
+		@param single_request: If True, a single speculative request is made for the end of the archive, which is 
+		usually large enough to contain both the end of central directory record and the central directory.  The size 
+		of the request is remembered by the session for each host.  If False, the end of central directory record and
+		the central directory are requested separately.
+		@type single_request: bool
+		"""
 		self.url = url
+		self.session = session or default_session
+		self.cache = cache
+		self.single_request = single_request
 		self.NameToInfo = {}	# Find file info given name
 		self.filelist = []	  # List of ZipInfo instances for archive
 		self.pwd = None
@@ -149,17 +808,89 @@ class HTTPZipFile:
 		self.debug = 0
 		self._RealGetContents()	 
 
+	def _get_validator(self, headers=None):
+		"""Return a string that changes when the archive changes (from the ETag or Last-Modified and Content-Length 
+		headers), or None if the server doesn't provide one.
+		@param headers: The headers of a response for the archive.  If omitted, a HEAD request is made."""
+		if headers is None:
+			try:
+				f = self.session.request(self.url, method="HEAD")
+			except urllib2.HTTPError:
+				return None
+			f.read()
+			f.close()
+			headers = f.headers
+		etag = headers.get('ETag')
+		last_modified = headers.get('Last-Modified')
+		if etag:
+			return "etag:%s:%s" % (etag, headers.get('Content-Length'))
+		elif last_modified:
+			return "modified:%s:%s" % (last_modified, headers.get('Content-Length'))
+		return None
+
 	def _RealGetContents(self):
 		"""Read in the table of contents for the ZIP file."""
-		try:
-			endrec = _EndRecData(self.url)
-		except IOError:
-			raise BadZipfile("File is not a zip file")
+		validator = None
+		if self.cache is not None:
+			validator = self._get_validator()
+			if validator is not None:
+				cached = self.cache.get_directory(self.url, validator)
+				if cached is not None:
+					self._parse_central_directory(*cached)
+					return
+		endrec, data = self._run(self._contents_steps())
+		self._parse_central_directory(endrec, data)
+		if validator is not None:
+			self.cache.put_directory(self.url, validator, endrec, data)
+
+	def _run(self, steps):
+		"""Run reading steps, making each request with this archive's session, and return the result."""
+		return _run_steps(steps, lambda range_header: _read_range(self.url, range_header, self.session))
+
+	def _contents_steps(self):
+		"""Reading steps (see _Result) for the end of central directory record and the central directory.
+
+		In single_request mode, the first request is for a speculative tail of the archive, sized by what was 
+		needed for the last archive opened from the same host.  Otherwise the first request is for the record alone.
+		Larger tails are then requested until the record is found (it is followed by a comment of up to 64K).  The 
+		part of the central directory that wasn't in the tail is requested last.
+		@return: (end of central directory record, central directory data)"""
+		host = urlparse.urlsplit(self.url).netloc
+		if self.single_request:
+			tail_size = self.session.tail_sizes.get(host, _DEFAULT_TAIL_SIZE)
+		else:
+			tail_size = sizeEndCentDir
+		# Search by retrieving chunks of 256, 1k and 64k
+		tail_sizes = [tail_size] + [size + sizeEndCentDir for size in (1 << 8, 1 << 10, 1 << 16) 
+								 if size + sizeEndCentDir > tail_size]
+		endrec = None
+		for size in tail_sizes:
+			data, offset, filesize = yield "bytes=-%d" % size
+			endrec = _find_end_record(data, offset)
+			if endrec is not None:
+				break
 		if not endrec:
 			raise BadZipfile, "File is not a zip file"
 		if self.debug > 1:
 			print endrec
 		size_cd = endrec[_ECD_SIZE]			 # bytes in central directory
+		start_dir = endrec[_ECD_LOCATION] - size_cd
+		if self.single_request:
+			# Remember how much was needed, plus room for growth.  Never shrink, so that a host serving both small
+			# and large archives doesn't alternate between sizes.
+			needed = filesize - start_dir
+			self.session.tail_sizes[host] = max(tail_size, needed + needed // 4)
+		data = data[max(start_dir - offset, 0):endrec[_ECD_LOCATION] - offset]
+		if len(data) < size_cd:
+			# Request the part of the central directory that hasn't been read yet.
+			more_end = start_dir + size_cd - len(data) - 1
+			more = _range_data((yield "bytes=%d-%d" % (start_dir, more_end)), start_dir, more_end)
+			data = more + data
+		yield _Result((endrec, data))
+
+	def _parse_central_directory(self, endrec, data):
+		"""Populate the file list from the "End of Central Directory" record and the central directory data."""
+		size_cd = endrec[_ECD_SIZE]			 # bytes in central directory
 		offset_cd = endrec[_ECD_OFFSET]		 # offset of central directory
 		self.comment = endrec[_ECD_COMMENT]	 # archive comment
 
@@ -174,9 +905,6 @@ class HTTPZipFile:
 			print "given, inferred, offset", offset_cd, inferred, concat
 		# self.start_dir:  Position of start of central directory
 		self.start_dir = offset_cd + concat
-		ECD = _http_get_partial_data(self.url, self.start_dir, self.start_dir+size_cd-1)
-		data = ECD.read()
-		ECD.close()
 		fp = cStringIO.StringIO(data)			   
 		total = 0
 		while total < size_cd:
@@ -243,38 +971,576 @@ class HTTPZipFile:
 
 		return info		 
 
+	def _member_range(self, zinfo):
+		"""Return the (start, end) byte range that should contain the local file header, file name, extra field and
+		compressed data of a member."""
+		start = zinfo.header_offset
+		end = (start + sizeFileHeader + len(zinfo.orig_filename) + len(zinfo.extra)
+			+ _LOCAL_EXTRA_ALLOWANCE + zinfo.compress_size - 1)
+		# Members always precede the central directory, so don't over-read into (or past the end of) the archive.
+		return start, min(end, self.start_dir - 1)
+
+	def _open_steps(self, zinfo, data=None):
+		"""Reading steps (see _Result) for a member.  The local file header, file name, extra field and compressed data
+		are requested with a single range request, unless data (starting at the local file header) is provided.  
+		If the data does not contain the whole member (e.g., the local extra field is longer than expected), the rest 
+		is requested.
+		@return: A file-like object for the member."""
+		offset = zinfo.header_offset
+		if data is None:
+			start, end = self._member_range(zinfo)
+			data = _range_data((yield "bytes=%d-%d" % (start, end)), start, end)
+		if len(data) < sizeFileHeader:
+			start, end = offset + len(data), offset + sizeFileHeader - 1
+			data += _range_data((yield "bytes=%d-%d" % (start, end)), start, end)
+		fheader = struct.unpack(structFileHeader, data[:sizeFileHeader])
+
+		name_end = sizeFileHeader + fheader[_FH_FILENAME_LENGTH]
+		data_start = name_end + fheader[_FH_EXTRA_FIELD_LENGTH]
+		# The central directory's compressed size is used, since the local header's is zero when a data descriptor is used.
+		data_end = data_start + zinfo.compress_size
+		if len(data) < data_end:
+			start, end = offset + len(data), offset + data_end - 1
+			data += _range_data((yield "bytes=%d-%d" % (start, end)), start, end)
+
+		self._check_local_header(zinfo, fheader, data[sizeFileHeader:name_end])
+
+		fp = cStringIO.StringIO(data)
+		fp.seek(data_start)
+		yield _Result(ZipExtFile(fp, 'r', zinfo))
+
 	def open(self, name, pwd=None):
-		"""Return file-like object for 'name'."""
+		"""Return file-like object for 'name'.  The local file header, file name, extra field and compressed data are
+		fetched with a single range request."""
 		if not self.url:
 			raise RuntimeError, \
 				  "Attempt to read ZIP archive that was already closed"
-		zinfo = self.getinfo(name)
-		offset = zinfo.header_offset
-		f = _http_get_partial_data(self.url, offset, offset+sizeFileHeader-1)
-		fheader = f.read()
-		f.close()
-
-		fheader = struct.unpack(structFileHeader, fheader)
-		offset += sizeFileHeader
-		f = _http_get_partial_data(self.url, offset, offset+fheader[_FH_FILENAME_LENGTH]-1)
-		fname = f.read()
-		f.close()
+		return self._run(self._open_steps(self.getinfo(name)))
 
+	def _check_local_header(self, zinfo, fheader, fname):
+		"""Raise an exception if a local file header does not match the central directory or the member can't be read."""
+		if fheader[_FH_SIGNATURE] != stringFileHeader:
+			raise BadZipfile, "Bad magic number for file header"
 		if fname != zinfo.orig_filename:
 			raise BadZipfile, \
 					  'File name in directory "%s" and header "%s" differ.' % (
 						  zinfo.orig_filename, fname)
-
-		is_encrypted = zinfo.flag_bits & 0x1
-		if is_encrypted:
+		if zinfo.flag_bits & 0x1:
 			raise RuntimeError, "File %s is encrypted, " \
-				  "not supported." % name
+				  "not supported." % zinfo.filename
 
-		offset += fheader[_FH_FILENAME_LENGTH]+fheader[_FH_EXTRA_FIELD_LENGTH]
-		f = _http_get_partial_data(self.url, offset, offset+fheader[_FH_COMPRESSED_SIZE]-1)
-		data = f.read()
-		return ZipExtFile(cStringIO.StringIO(data), 'r', zinfo)
-		#return ZipExtFile(cStringIO.StringIO(data), zinfo)
+	def _iter_compressed(self, zinfo, chunk_size=_CHUNK_SIZE, parallel=1):
+		"""Yield the compressed data of a member in chunks of at most chunk_size bytes.  The local header and the data 
+		are read from a single range response, or from parallel range requests if parallel > 1."""
+		start, end = self._member_range(zinfo)
+		if parallel > 1:
+			f = _ParallelRangeReader(self.url, start, end, parallel, self.session)
+		else:
+			f = _http_get_partial_data(self.url, start, end, self.session)
+		try:
+			header = f.read(sizeFileHeader)
+			fheader = struct.unpack(structFileHeader, header)
+			fname = f.read(fheader[_FH_FILENAME_LENGTH])
+			self._check_local_header(zinfo, fheader, fname)
+			offset = start + sizeFileHeader + fheader[_FH_FILENAME_LENGTH] + fheader[_FH_EXTRA_FIELD_LENGTH]
+			skip = fheader[_FH_EXTRA_FIELD_LENGTH]
+			while skip > 0:
+				data = f.read(min(skip, chunk_size))
+				if not data:
+					break
+				skip -= len(data)
+			remaining = zinfo.compress_size
+			empty_responses = 0
+			while remaining > 0:
+				data = None
+				if skip <= 0:
+					data = f.read(min(remaining, chunk_size))
+				if not data:
+					# The local extra field was longer than expected, so the over-read range ended early.  
+					# Request the rest.
+					data_start = offset + zinfo.compress_size - remaining
+					if skip <= 0:
+						empty_responses += 1
+						if empty_responses > _MAX_EMPTY_RESPONSES:
+							raise IOError("Received no data for range %d-%d of %s after %d requests." % (data_start, 
+										  data_start + remaining - 1, self.url, _MAX_EMPTY_RESPONSES))
+					f.close()
+					f = _http_get_partial_data(self.url, data_start, data_start + remaining - 1, self.session)
+					skip = 0
+					continue
+				empty_responses = 0
+				remaining -= len(data)
+				yield data
+			# Read the rest of the (small) over-read so that the connection can be reused.
+			f.read()
+		finally:
+			f.close()
+
+	def _iter_resumable(self, zinfo, dest_path, chunk_size=_CHUNK_SIZE):
+		"""Download the compressed data of a member to dest_path + ".part", then yield it in chunks of at most 
+		chunk_size bytes.  Progress is recorded in dest_path + ".checkpoint" (the URL, the archive's validator and the 
+		number of bytes downloaded), so if the download is interrupted, only the missing range is requested next time.
+		@raise ArchiveChangedError: Raised if the archive has changed since the partial download was saved.  The partial
+		download is discarded.
+		"""
+		part_path, checkpoint_path = dest_path + ".part", dest_path + ".checkpoint"
+		f = self.session.request(self.url, method="HEAD")
+		f.read()
+		f.close()
+		etag = f.headers.get('ETag')
+		validator = self._get_validator(f.headers)
+
+		checkpoint = None
+		if exists(checkpoint_path) and exists(part_path):
+			try:
+				with open(checkpoint_path) as cf:
+					checkpoint = json.load(cf)
+			except ValueError:
+				checkpoint = None
+		if checkpoint is not None and (checkpoint["url"] != self.url or checkpoint["member"] != zinfo.filename 
+				or checkpoint["crc"] != zinfo.CRC or checkpoint["compress_size"] != zinfo.compress_size):
+			# The checkpoint is for a different download.  Start over.
+			checkpoint = None
+		if checkpoint is not None and (validator is None or checkpoint["validator"] != validator):
+			# (Without a validator there is no way to tell whether the archive has changed, so don't resume.)
+			raise ArchiveChangedError("%s has changed since the partial download of %s was saved." 
+									  % (self.url, zinfo.filename))
+		if checkpoint is None:
+			# Read the local file header to find where the compressed data start.
+			name_end = sizeFileHeader + len(zinfo.orig_filename)
+			header, first, filesize = _read_range(self.url, "bytes=%d-%d" % (zinfo.header_offset, 
+													zinfo.header_offset + name_end - 1), self.session)
+			fheader = struct.unpack(structFileHeader, header[:sizeFileHeader])
+			self._check_local_header(zinfo, fheader, header[sizeFileHeader:name_end])
+			checkpoint = {
+				"url": self.url,
+				"validator": validator,
+				"member": zinfo.filename,
+				"crc": zinfo.CRC,
+				"compress_size": zinfo.compress_size,
+				"data_start": zinfo.header_offset + sizeFileHeader + fheader[_FH_FILENAME_LENGTH] 
+					+ fheader[_FH_EXTRA_FIELD_LENGTH],
+				"offset": 0
+			}
+			open(part_path, 'wb').close()
+			_write_checkpoint(checkpoint_path, checkpoint)
+
+		part = open(part_path, 'r+b')
+		try:
+			offset = checkpoint["offset"]
+			part.truncate(offset)
+			part.seek(offset)
+			if offset < zinfo.compress_size:
+				data_start = checkpoint["data_start"]
+				headers = {'Range': "bytes=%d-%d" % (data_start + offset, data_start + zinfo.compress_size - 1)}
+				if etag:
+					# If the archive has changed, the server will send the whole archive (200) instead of the range.
+					headers['If-Range'] = etag
+				f = self.session.request(self.url, headers)
+				try:
+					if f.getcode() != 206:
+						raise ArchiveChangedError("%s has changed since the partial download of %s was saved." 
+												  % (self.url, zinfo.filename))
+					unsaved = 0
+					while True:
+						data = f.read(chunk_size)
+						if not data:
+							break
+						part.write(data)
+						offset += len(data)
+						unsaved += len(data)
+						if unsaved >= _CHECKPOINT_INTERVAL:
+							part.flush()
+							checkpoint["offset"] = offset
+							_write_checkpoint(checkpoint_path, checkpoint)
+							unsaved = 0
+				finally:
+					f.close()
+					part.flush()
+					checkpoint["offset"] = offset
+					_write_checkpoint(checkpoint_path, checkpoint)
+				if offset < zinfo.compress_size:
+					raise IOError("Download of %s was interrupted after %d of %d bytes." 
+								  % (zinfo.filename, offset, zinfo.compress_size))
+			part.seek(0)
+			while True:
+				data = part.read(chunk_size)
+				if not data:
+					break
+				yield data
+		finally:
+			part.close()
+
+	def extract_to(self, name, dest_path, chunk_size=_CHUNK_SIZE, parallel=1, resume=False):
+		"""Extract a member to the file dest_path.  The member is downloaded, decompressed, checked against its CRC and 
+		written chunk by chunk, so memory use is bounded by chunk_size rather than the size of the member.  If the 
+		data are corrupt, the partially written file is removed.  If the HTTPZipFile has a cache that contains the 
+		member, it is copied from the cache instead of being downloaded.
+		@param parallel: The number of range requests the member is split into.  They are made at the same time, which 
+		can make better use of a high-bandwidth, high-latency link for a large member.  See _ParallelRangeReader.
+		@type parallel: int
+		@param resume: If True, the compressed data are saved as they are downloaded, so that if the download is
+		interrupted it can be resumed by calling extract_to again.  (See _iter_resumable.)  parallel is ignored.
+		@type resume: bool
+		@return: dest_path
+		@raise BadZipfile: Raised if the CRC or size of the extracted data does not match the central directory.
+		@raise ArchiveChangedError: Raised if resume is True and the archive has changed since a partial download was
+		saved.
+		"""
+		if not self.url:
+			raise RuntimeError, \
+				  "Attempt to read ZIP archive that was already closed"
+		zinfo = self.getinfo(name)
+		if self.cache is not None:
+			cached_path = self.cache.get_member(zinfo)
+			if cached_path is not None:
+				try:
+					shutil.copyfile(cached_path, dest_path)
+					return dest_path
+				except (IOError, OSError):
+					# The entry was evicted by another process.  Download it.
+					pass
+		if zinfo.compress_type == ZIP_DEFLATED:
+			decompressor = zlib.decompressobj(-15)
+		elif zinfo.compress_type == ZIP_STORED:
+			decompressor = None
+		else:
+			raise NotImplementedError("compression type %d (%s)" % (zinfo.compress_type, name))
+
+		crc, size = 0, 0
+		completed = False
+		out = open(dest_path, 'wb')
+		try:
+			if resume:
+				chunks = self._iter_resumable(zinfo, dest_path, chunk_size)
+			else:
+				chunks = self._iter_compressed(zinfo, chunk_size, parallel)
+			for data in chunks:
+				if decompressor is not None:
+					# Limit the output of each call so that highly compressed data doesn't expand past chunk_size.
+					data = decompressor.decompress(data, chunk_size)
+					while data:
+						crc = zlib.crc32(data, crc)
+						size += len(data)
+						out.write(data)
+						data = decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+				else:
+					crc = zlib.crc32(data, crc)
+					size += len(data)
+					out.write(data)
+			if decompressor is not None:
+				data = decompressor.flush()
+				crc = zlib.crc32(data, crc)
+				size += len(data)
+				out.write(data)
+			if size != zinfo.file_size:
+				raise BadZipfile("Size of extracted file %s (%d) does not match the archive (%d)." % (name, size, zinfo.file_size))
+			if crc & 0xffffffff != zinfo.CRC:
+				raise BadZipfile("Bad CRC-32 for file %r" % name)
+			completed = True
+		except (BadZipfile, ArchiveChangedError):
+			if resume:
+				# The saved data are corrupt or out of date.  Don't resume from them.
+				_remove_partial(dest_path)
+			raise
+		finally:
+			out.close()
+			if not completed:
+				remove(dest_path)
+		if resume:
+			_remove_partial(dest_path)
+		if self.cache is not None:
+			self.cache.put_member(zinfo, dest_path)
+		return dest_path
+
+	def extract_many(self, members, workers=4, retries=2, backoff=1.0, parallel=1, resume=False):
+		"""Extract several members with extract_to, using a pool of worker threads that share this archive's central 
+		directory and session.  A member that fails with a network or data error is retried after a delay that doubles 
+		with each attempt.
+		@param members: A list of (name, dest_path) tuples.
+		@param workers: The number of members downloaded at the same time.
+		@type workers: int
+		@param retries: The number of times a member is retried.
+		@type retries: int
+		@param backoff: The delay, in seconds, before the first retry.
+		@type backoff: float
+		@param parallel: The number of range requests each member is split into (see extract_to).
+		@type parallel: int
+		@param resume: If True, interrupted downloads are resumed rather than restarted (see extract_to).
+		@type resume: bool
+		@return: A list of the destination paths, in the same order as members.
+		@raise Exception: The first error that remained after retrying is re-raised once all workers have finished.
+		"""
+		results = [None] * len(members)
+		errors = []
+		queue = Queue.Queue()
+		for i, member in enumerate(members):
+			queue.put((i, member))
+
+		def work():
+			while True:
+				try:
+					i, (name, dest_path) = queue.get_nowait()
+				except Queue.Empty:
+					return
+				for attempt in range(retries + 1):
+					try:
+						results[i] = self.extract_to(name, dest_path, parallel=parallel, resume=resume)
+						break
+					except ArchiveChangedError, e:
+						errors.append((i, e))
+						break
+					except (IOError, httplib.HTTPException, BadZipfile), e:
+						if attempt == retries:
+							errors.append((i, e))
+						else:
+							time.sleep(backoff * (2 ** attempt))
+					except Exception, e:
+						errors.append((i, e))
+						break
+
+		threads = [threading.Thread(target=work) for i in range(max(1, min(workers, len(members))))]
+		for thread in threads:
+			thread.daemon = True
+			thread.start()
+		for thread in threads:
+			thread.join()
+		if errors:
+			raise min(errors)[1]
+		return results
+
+	def openmany(self, names):
+		"""Return a list of file-like objects for the members in 'names', in the same order.  All of the members are
+		requested with a single multipart/byteranges request.  Members that the server does not return (e.g., because 
+		it does not support multiple ranges) are requested individually."""
+		if not self.url:
+			raise RuntimeError, \
+				  "Attempt to read ZIP archive that was already closed"
+		zinfos = [self.getinfo(name) for name in names]
+		ranges = [self._member_range(zinfo) for zinfo in zinfos]
+		if len(ranges) > 1:
+			parts = _http_get_ranges(self.url, ranges, self.session)
+		else:
+			parts = []
+		files = []
+		for zinfo, (start, end) in zip(zinfos, ranges):
+			# Use the part that contains the most of this member's range.  (Ranges may overlap, since they are over-read.)
+			data = None
+			for part_start, part_data in parts:
+				if part_start <= start < part_start + len(part_data):
+					candidate = part_data[start - part_start:end - part_start + 1]
+					if data is None or len(candidate) > len(data):
+						data = candidate
+			if data is None:
+				files.append(self.open(zinfo.filename))
+			else:
+				files.append(self._run(self._open_steps(zinfo, data)))
+		return files
+
+
+class _AsyncRangeRequest(asyncore.dispatcher):
+	"""An HTTP range request made on an asyncore event loop.  When the response has been received, callback is called
+	with (data, offset, file size) and None, or with None and an exception.  Redirects are followed.  Each request uses
+	its own (HTTP/1.0) connection.  A request that sends or receives nothing for timeout seconds fails with 
+	socket.timeout; the timeouts are checked by run_loop."""
+	def __init__(self, url, range_header, callback, map=None, redirects=HTTPSession.max_redirects, timeout=60):
+		asyncore.dispatcher.__init__(self, map=map)
+		parts = urlparse.urlsplit(url)
+		if parts.scheme.lower() != "http":
+			raise ValueError("Only http URLs can be read asynchronously: %s" % url)
+		self.url = url
+		self.range_header = range_header
+		self.callback = callback
+		self.redirects = redirects
+		self.timeout = timeout
+		self._map = map
+		self._chunks = []
+		self._last_activity = time.time()
+		path = parts.path or "/"
+		if parts.query:
+			path += "?" + parts.query
+		self._out = ("GET %s HTTP/1.0\r\nHost: %s\r\nRange: %s\r\nConnection: close\r\n\r\n" 
+					 % (path, parts.netloc, range_header))
+		self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.connect((parts.hostname, parts.port or 80))
+
+	def handle_connect(self):
+		self._last_activity = time.time()
+
+	def writable(self):
+		return len(self._out) > 0
+
+	def handle_write(self):
+		sent = self.send(self._out)
+		self._out = self._out[sent:]
+		self._last_activity = time.time()
+
+	def handle_read(self):
+		self._chunks.append(self.recv(_CHUNK_SIZE))
+		self._last_activity = time.time()
+
+	def check_timeout(self, now):
+		"""Fail the request if it has been idle for longer than its timeout."""
+		if self.timeout is not None and now - self._last_activity > self.timeout:
+			self.close()
+			self._chunks = []
+			self.callback(None, socket.timeout("No data received from %s for %s seconds." % (self.url, self.timeout)))
+
+	def handle_close(self):
+		self.close()
+		response = "".join(self._chunks)
+		self._chunks = []
+		try:
+			header_end = response.index("\r\n\r\n")
+			status_line, header_text = (response[:header_end] + "\r\n").split("\r\n", 1)
+			status = int(status_line.split()[1])
+			headers = mimetools.Message(cStringIO.StringIO(header_text))
+			body = response[header_end + 4:]
+			if status in (301, 302, 303, 307) and headers.get('Location') and self.redirects > 0:
+				_AsyncRangeRequest(urlparse.urljoin(self.url, headers.get('Location')), self.range_header, 
+								   self.callback, self._map, self.redirects - 1, self.timeout)
+				return
+			if status >= 400:
+				raise urllib2.HTTPError(self.url, status, status_line.split(None, 2)[-1], headers, cStringIO.StringIO(body))
+			result = _range_result(body, headers.get('Content-Range'))
+		except Exception, e:
+			self.callback(None, e)
+			return
+		self.callback(result, None)
+
+	def handle_error(self):
+		error = sys.exc_info()[1]
+		self.close()
+		self.callback(None, error)
+
+
+class AsyncHTTPZipFile(HTTPZipFile):
+	"""Reads a remote ZIP archive on an asyncore event loop, so that members of several archives can be downloaded at
+	the same time by one thread.  Uses the same reading steps (see _Result) as HTTPZipFile; only the way the requests
+	are made differs.  Only http URLs are supported, and proxies are not used.
+
+	Nothing is requested until the event loop runs (run_loop(map)).  The central directory is read first, then 
+	callback(archive, error) is called; error is None if it was read successfully.  Members can then be read with 
+	open_async.  See also fetch_members.
+	"""
+	def __init__(self, url, callback, map=None, session=None, timeout=None):
+		"""
+		@param url: The URL of the ZIP archive.
+		@param callback: Called with (this archive, None) when the central directory has been read, or (this archive, 
+		exception) if it could not be read.
+		@param map: The asyncore socket map the requests are added to.  If omitted, asyncore's global map is used.
+		@param session: The HTTPSession whose speculative tail sizes are used and updated.  No connections are made
+		with the session.
+		@param timeout: The number of seconds a request may go without sending or receiving data before it fails with
+		socket.timeout.  Defaults to the session's timeout.  Only enforced when the event loop is run with run_loop.
+		@type timeout: float
+		"""
+		self.url = url
+		self.session = session or default_session
+		self.timeout = timeout if timeout is not None else self.session.timeout
+		self.cache = None
+		self.single_request = True
+		self.map = map
+		self.NameToInfo = {}	# Find file info given name
+		self.filelist = []	  # List of ZipInfo instances for archive
+		self.pwd = None
+		self.comment = ''
+		self.debug = 0
+		def contents_read(result, error):
+			if error is None:
+				try:
+					self._parse_central_directory(*result)
+				except Exception, e:
+					error = e
+			callback(self, error)
+		self._run_async(self._contents_steps(), contents_read)
+
+	def _run_async(self, steps, callback, response=None):
+		"""Run reading steps on the event loop, then call callback(result, None), or callback(None, exception)."""
+		try:
+			request = steps.send(response)
+		except Exception, e:
+			callback(None, e)
+			return
+		if isinstance(request, _Result):
+			steps.close()
+			callback(request.value, None)
+			return
+		def responded(response, error):
+			if error is not None:
+				steps.close()
+				callback(None, error)
+			else:
+				self._run_async(steps, callback, response)
+		try:
+			_AsyncRangeRequest(self.url, request, responded, self.map, timeout=self.timeout)
+		except Exception, e:
+			callback(None, e)
+
+	def open_async(self, name, callback):
+		"""Read a member.  When it has been downloaded, callback(file-like object, None) is called, or 
+		callback(None, exception) if it could not be read."""
+		try:
+			zinfo = self.getinfo(name)
+		except KeyError, e:
+			callback(None, e)
+			return
+		self._run_async(self._open_steps(zinfo), callback)
+
+
+def run_loop(map=None, poll_interval=1.0):
+	"""Run an asyncore event loop until all of its channels are closed, failing requests that have been idle for longer
+	than their timeout (see AsyncHTTPZipFile).  asyncore.loop alone would wait forever for a server that stops sending.
+	@param map: The asyncore socket map.  If omitted, asyncore's global map is used.
+	@param poll_interval: The select timeout, in seconds: how often the timeouts are checked.
+	@type poll_interval: float
+	"""
+	if map is None:
+		map = asyncore.socket_map
+	while map:
+		asyncore.loop(poll_interval, map=map, count=1)
+		now = time.time()
+		for channel in map.values():
+			if isinstance(channel, _AsyncRangeRequest):
+				channel.check_timeout(now)
+
+
+def fetch_members(archives, map=None, timeout=60):
+	"""Download members from several archives concurrently, using one asyncore event loop.
+	@param archives: A dict.  Keys are archive URLs and values are lists of member names.
+	@param map: The asyncore socket map to use.  A new map is used if omitted.
+	@param timeout: The number of seconds a request may go without sending or receiving data before it fails with
+	socket.timeout.
+	@type timeout: float
+	@return: A dict of dicts: {url: {name: data}}.
+	@raise Exception: The first error that occurred, once all other requests have finished.
+	"""
+	if map is None:
+		map = {}
+	results = dict((url, {}) for url in archives)
+	errors = []
+
+	def member_callback(url, name):
+		def callback(f, error):
+			if error is not None:
+				errors.append(error)
+			else:
+				results[url][name] = f.read()
+		return callback
+
+	def archive_callback(archive, error):
+		if error is not None:
+			errors.append(error)
+			return
+		for name in archives[archive.url]:
+			archive.open_async(name, member_callback(archive.url, name))
+
+	for url in archives:
+		AsyncHTTPZipFile(url, archive_callback, map, timeout=timeout)
+	run_loop(map, min(timeout, 1.0))
+	if errors:
+		raise errors[0]
+	return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+'''
+Generates DOF files for the tests: deterministic, fixed-width records with varied values, including the cases the
+parsers have to handle (negative heights, invalid dates, blank FAA study numbers and coordinates in every hemisphere).
+'''
+
+import random
+
+header = """  CURRENCY DATE = 03/04/12
+
+OAS#     V CO  ST CITY             LATITUDE     LONGITUDE     OBSTACLE      AGL   AMSL LT H V M FAA            ACTION
+-------------------------------------------------------------------------------------------------------------------------
+"""
+
+_orsCodes = ("53", "41", "16", "66")
+_cities = ("SEATTLE", "PORT ANGELES", "SPOKANE", "TACOMA", "PAGO PAGO", "HAGATNA")
+_obstacleTypes = ("TOWER", "BLDG", "WINDMILL", "STACK", "T-L TWR", "CRANE", "POLE", "TANK")
+
+def record(rng, number):
+	"""Returns a random DOF record (without a line terminator) for obstacle number."""
+	date = rng.choice(("%04d%03d" % (rng.randint(1980, 2012), rng.randint(1, 365)), "2001071", "2001070", "       "))
+	study = rng.choice(("%04dANM%05dOE" % (rng.randint(2000, 2012), rng.randint(0, 99)), " " * 14))
+	amsl = rng.randint(-200, 14000)
+	return ("%s-%06d %s US %-2s %-16s %02d %02d %05.2f%s %03d %02d %05.2f%s %-12s %d %05d %s %s %s %s %s %s %s %s" % (
+		rng.choice(_orsCodes), number, rng.choice("OU"), rng.choice(("WA", "OR", "ID", "AS")), rng.choice(_cities),
+		rng.randint(0, 89), rng.randint(0, 59), rng.randint(0, 5999) / 100.0, rng.choice("NS"),
+		rng.randint(0, 179), rng.randint(0, 59), rng.randint(0, 5999) / 100.0, rng.choice("EW"),
+		rng.choice(_obstacleTypes), rng.randint(1, 9), rng.randint(0, 2000),
+		"%05d" % amsl if amsl >= 0 else "-%04d" % -amsl, rng.choice("CDFHLMNRSUW"), rng.choice("123456789"),
+		rng.choice("ABCDEFGHI"), rng.choice("FMNPSUW"), study, rng.choice("ACD"), date))
+
+def records(count, seed=0):
+	"""Returns count random DOF records (without line terminators)."""
+	rng = random.Random(seed)
+	return [record(rng, i + 1) for i in xrange(count)]
+
+def dofData(lines, terminator="\n", finalTerminator=True):
+	"""Returns the contents of a DOF file with the given records."""
+	data = header.replace("\n", terminator) + terminator.join(lines)
+	return data + terminator if finalTerminator and lines else data
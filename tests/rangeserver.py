@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+'''
+A local HTTP server for the tests and benchmarks of remotezip.
+
+Serves the files in a directory, like SimpleHTTPServer, and also supports single and multiple byte range requests
+(multipart/byteranges), ETags and If-None-Match.  Range support, the transfer rate and a cut-off offset can be set to 
+test how clients handle servers that ignore the Range header, slow links, or responses that end early.
+'''
+
+import sys, os, time, socket, threading, BaseHTTPServer, SimpleHTTPServer, SocketServer
+
+class RangeRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	_chunkSize = 16384
+
+	def log_message(self, format, *args):
+		pass
+
+	def translate_path(self, path):
+		"""Maps a URL path onto the server's root directory instead of the current directory."""
+		path = SimpleHTTPServer.SimpleHTTPRequestHandler.translate_path(self, path)
+		return os.path.join(self.server.root, os.path.relpath(path, os.getcwd()))
+
+	def do_HEAD(self):
+		self._send(False)
+
+	def do_GET(self):
+		self._send(True)
+
+	def _send(self, sendBody):
+		server = self.server
+		server.requests.append((self.command, self.path, self.headers.get("Range")))
+		path = self.translate_path(self.path)
+		if not os.path.isfile(path):
+			self._respond(404, {}, "Not found", sendBody)
+			return
+		with open(path, "rb") as f:
+			data = f.read()
+		size = len(data)
+		etag = '"%x-%x"' % (size, int(os.path.getmtime(path)))
+		headers = {"ETag": etag, "Last-Modified": self.date_time_string(os.path.getmtime(path)),
+				"Accept-Ranges": "bytes" if server.ranges else "none"}
+		if self.headers.get("If-None-Match") == etag:
+			self._respond(304, headers, "", sendBody)
+			return
+		ranges = self._ranges(size) if server.ranges else []
+		if ranges and server.cutOff is not None:
+			# Send the part of the first range before the cut-off, which may be nothing.
+			first, last = ranges[0]
+			headers["Content-Range"] = "bytes %d-%d/%d" % (first, last, size)
+			self._respond(206, headers, data[first:min(last + 1, server.cutOff)], sendBody)
+		elif not ranges:
+			self._respond(200, headers, data, sendBody)
+		elif len(ranges) == 1:
+			first, last = ranges[0]
+			headers["Content-Range"] = "bytes %d-%d/%d" % (first, last, size)
+			self._respond(206, headers, data[first:last + 1], sendBody)
+		else:
+			boundary = "RANGEBOUNDARY"
+			parts = ["--%s\r\nContent-Type: application/octet-stream\r\nContent-Range: bytes %d-%d/%d\r\n\r\n%s\r\n"
+					% (boundary, first, last, size, data[first:last + 1]) for first, last in ranges]
+			headers["Content-Type"] = "multipart/byteranges; boundary=%s" % boundary
+			self._respond(206, headers, "".join(parts) + "--%s--\r\n" % boundary, sendBody)
+
+	def _ranges(self, size):
+		"""Returns the (first, last) byte ranges of the Range header, or an empty list if there is none."""
+		header = self.headers.get("Range")
+		if not header or not header.startswith("bytes="):
+			return []
+		ranges = []
+		for spec in header[len("bytes="):].split(","):
+			first, last = spec.strip().split("-")
+			if first == "":
+				first, last = max(0, size - int(last)), size - 1
+			else:
+				first, last = int(first), min(int(last), size - 1) if last else size - 1
+			ranges.append((first, last))
+		return ranges
+
+	def _respond(self, status, headers, body, sendBody):
+		self.send_response(status)
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		if not sendBody:
+			return
+		rate = self.server.rate
+		for start in xrange(0, len(body), self._chunkSize):
+			chunk = body[start:start + self._chunkSize]
+			self.wfile.write(chunk)
+			if rate:
+				time.sleep(len(chunk) / float(rate))
+
+class RangeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	"""Serves a directory on a free port of the loopback interface, in a background thread."""
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, root, ranges=True, rate=None):
+		"""
+		@param root: The directory to serve.
+		@param ranges: If False, Range headers are ignored and the whole file is always sent.
+		@param rate: If provided, responses are throttled to this many bytes per second (per connection).
+		"""
+		BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), RangeRequestHandler)
+		self.root = os.path.abspath(root)
+		self.ranges = ranges
+		self.rate = rate
+		# If set, range responses stop at this offset, so a range that starts there gets a 206 response without data.
+		self.cutOff = None
+		self.requests = [] # (method, path, Range header) of each request.
+		self.url = "http://127.0.0.1:%d/" % self.server_address[1]
+		self._thread = threading.Thread(target=self.serve_forever)
+		self._thread.daemon = True
+
+	def handle_error(self, request, client_address):
+		"""Ignores clients that close their connections without reading the whole response."""
+		if not isinstance(sys.exc_info()[1], socket.error):
+			BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+	def __enter__(self):
+		self._thread.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.shutdown()
+		self.server_close()
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the DOF parsing functions in dofcore.
+
+Run from the repository root: python -m unittest discover tests
+'''
+
+import unittest, os, shutil, tempfile, zipfile, cStringIO, datetime, dofcore, remotezip, dofsample
+from rangeserver import RangeServer
+
+_header = """  CURRENCY DATE = 03/04/12
+
+OAS#     V CO  ST CITY             LATITUDE     LONGITUDE     OBSTACLE      AGL   AMSL LT H V M FAA            ACTION
+-------------------------------------------------------------------------------------------------------------------------
+"""
+_line = "53-%06d O US WA PORT ANGELES     48 15 29.72N 121 47 05.63W WINDMILL     4 01525 00018 S 7 C U 2010ANM00777OE A %s\n"
+
+# The records' dates: NGVD 29, NAVD 88, invalid, the first NAVD 88 date and the day before it.
+_dates = ("1995198", "2010001", "       ", "2001071", "2001070")
+_expected29 = [True, False, True, False, True]
+
+class DatumTest(unittest.TestCase):
+	def setUp(self):
+		self.data = _header + "".join(_line % (i + 1, date) for i, date in enumerate(_dates))
+
+	def testObstacleRecord(self):
+		with dofcore.iterDofFile(cStringIO.StringIO(self.data)) as reader:
+			self.assertEqual([dofcore.obstacleRecord(obstacle)[0] for obstacle in reader], _expected29)
+
+	def testDatumPartitions(self):
+		"""The vectorized partitions agree with obstacleRecord, including for a record with an invalid date."""
+		if dofcore.numpy is None:
+			self.skipTest("numpy is not installed.")
+		columns = dofcore.readDofColumns(cStringIO.StringIO(self.data))["columns"]
+		indices88, indices29 = dofcore.datumPartitions(columns)
+		self.assertEqual(indices88.tolist(), [i for i, is29 in enumerate(_expected29) if not is29])
+		self.assertEqual(indices29.tolist(), [i for i, is29 in enumerate(_expected29) if is29])
+
+# Columns of parseDofColumns that are Obstacle attributes of the same name.
+_attributeColumns = ("orsCode", "obstacleNumber", "verificationStatus", "countryId", "stateId", "cityName",
+					"obstacleType", "quantity", "aglHT", "AmslHT", "lighting", "horizontalAccuracy", "verticalAccuracy",
+					"markIndicator", "faaStudyNo", "action", "line")
+
+class ColumnsTest(unittest.TestCase):
+	"""The columns parsed by parseDofColumns match the attributes of the Obstacles read from the same data."""
+	def setUp(self):
+		if dofcore.numpy is None:
+			self.skipTest("numpy is not installed.")
+		self.lines = dofsample.records(500)
+
+	def _checkColumns(self, data):
+		columns = dofcore.parseDofColumns(data)["columns"]
+		obstacles = _obstacles(data)
+		self.assertEqual(len(obstacles), len(self.lines))
+		for name in columns:
+			self.assertEqual(len(columns[name]), len(obstacles), name)
+		for i, obstacle in enumerate(obstacles):
+			for name in _attributeColumns:
+				self.assertEqual(columns[name][i], getattr(obstacle, name), (i, name))
+			self.assertEqual(columns["latitude"][i], obstacle.latitudeDD, i)
+			self.assertEqual(columns["longitude"][i], obstacle.longitudeDD, i)
+			for prefix, dms in (("lat", obstacle.latitude), ("lon", obstacle.longitude)):
+				self.assertEqual((columns[prefix + "Degrees"][i], columns[prefix + "Minutes"][i],
+								columns[prefix + "Seconds"][i], columns[prefix + "Hemisphere"][i]),
+								(dms.degrees, dms.minutes, dms.seconds, dms.hemisphere), (i, prefix))
+			self.assertEqual(columns["date"][i], obstacle.date.toordinal() if obstacle.date else 0, i)
+		return columns
+
+	def testLf(self):
+		self._checkColumns(dofsample.dofData(self.lines))
+
+	def testCrlf(self):
+		columns = self._checkColumns(dofsample.dofData(self.lines, "\r\n"))
+		self.assertTrue(columns["line"][0].endswith("\r\n"))
+
+	def testNoFinalLineTerminator(self):
+		columns = self._checkColumns(dofsample.dofData(self.lines, finalTerminator=False))
+		self.assertEqual(columns["line"][-1], self.lines[-1])
+
+class TruncatedRecordTest(unittest.TestCase):
+	"""A final record that was cut short is read the same way by every reader."""
+	def setUp(self):
+		if dofcore.numpy is None:
+			self.skipTest("numpy is not installed.")
+		data = _header + "".join(_line % (i + 1, _dates[i % len(_dates)]) for i in xrange(2000))
+		# Cut the last record off in the middle of its AGL height.
+		self.data = data[:data.rindex("\n", 0, -1) + 1 + 80]
+		fd, self.path = tempfile.mkstemp(".Dat")
+		with os.fdopen(fd, "wb") as f:
+			f.write(self.data)
+		self.columns = dofcore.parseDofColumns(self.data)["columns"]
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def _expected(self, index):
+		return dofcore.obstacleRecord(dofcore.Obstacle.fromColumns(self.columns, index), True)
+
+	def testColumns(self):
+		self.assertEqual(len(self.columns["date"]), 2000)
+		# "015" followed by padding.
+		self.assertEqual(self.columns["aglHT"][-1], 1500)
+		self.assertEqual(self.columns["AmslHT"][-1], 0)
+		self.assertEqual(self.columns["date"][-1], 0)
+
+	def testMappedDofFile(self):
+		with dofcore.MappedDofFile(self.path) as dof:
+			self.assertEqual(len(dof), 2000)
+			self.assertEqual(dofcore.obstacleRecord(dof[-1], True), self._expected(1999))
+			self.assertEqual((dof[-1].aglHT, dof[-1].AmslHT, dof[-1].date), (1500, 0, None))
+
+	def testDofReader(self):
+		with dofcore.iterDofFile(self.path) as reader:
+			obstacles = list(reader)
+		self.assertEqual(len(obstacles), 2000)
+		self.assertEqual(dofcore.obstacleRecord(obstacles[-1], True), self._expected(1999))
+
+	def testParseDofShards(self):
+		records = []
+		for currencyDate, shardRecords in dofcore.parseDofShards([self.path], 2, 40000):
+			records.extend(shardRecords)
+		self.assertEqual(records, [self._expected(i) for i in xrange(2000)])
+
+def _obstacles(data):
+	with dofcore.iterDofFile(cStringIO.StringIO(data)) as reader:
+		return list(reader)
+
+def _geodatabaseRow(obstacle, snap=1e-9):
+	"""Returns the values of an obstacle as readObstacleSignatures reads them back from a geodatabase: text is unicode
+	and unpadded, dates are datetimes and coordinates are snapped to the geodatabase's grid.
+	"""
+	values = []
+	for value in dofcore._obstacleValues(obstacle):
+		if isinstance(value, basestring):
+			value = unicode(value.strip())
+		elif isinstance(value, datetime.date):
+			value = datetime.datetime(value.year, value.month, value.day)
+		values.append(value)
+	return values, round(obstacle.longitudeDD / snap) * snap, round(obstacle.latitudeDD / snap) * snap
+
+class DeltaTest(unittest.TestCase):
+	def setUp(self):
+		self.obstacles = _obstacles(_header + "".join(_line % (i + 1, date) for i, date in enumerate(_dates)))
+
+	def _existing(self, obstacles):
+		"""Returns the existing obstacles as readObstacleSignatures would, with object IDs starting at 1."""
+		existing = {}
+		for objectId, obstacle in enumerate(obstacles, 1):
+			values, x, y = _geodatabaseRow(obstacle)
+			existing[dofcore._obstacleKey(*values[:2])] = (objectId, dofcore._obstacleSignature(values, x, y))
+		return existing
+
+	def testKey(self):
+		self.assertEqual(self.obstacles[0].obstacleNumber, "000001 ")
+		self.assertEqual(dofcore._obstacleKey("53", "000001 "), ("53", "000001"))
+		self.assertEqual(dofcore._obstacleKey(u"53", u"000001"), ("53", "000001"))
+		self.assertEqual(dofcore._obstacleKey(None, None), ("", ""))
+
+	def testSignatureAfterRoundTrip(self):
+		"""The signature of a record read back from a geodatabase is that of the DOF record, for any coordinate error
+		smaller than half of the DOF's precision (0.01 arc-seconds)."""
+		data = _header + "".join("53-%06d O US WA SEATTLE          47 %02d %05.2fN 122 %02d %05.2fW TOWER        1 "
+								"00100 00200 R 2 D A 2010ANM00777OE A 2010001\n"
+								% (i, i % 60, i * 0.37 % 60, i * 7 % 60, i * 0.53 % 60) for i in xrange(2000))
+		for obstacle in _obstacles(data):
+			signature = dofcore._obstacleSignature(dofcore._obstacleValues(obstacle), obstacle.longitudeDD, 
+												obstacle.latitudeDD)
+			values, x, y = _geodatabaseRow(obstacle)
+			self.assertEqual(dofcore._obstacleSignature(values, x, y), signature)
+			for error in (-1e-6, 1e-6):
+				self.assertEqual(dofcore._obstacleSignature(values, x + error, y - error), signature)
+
+	def testUnchanged(self):
+		existing = self._existing(self.obstacles)
+		self.assertEqual(dofcore.computeDofDelta(existing, self.obstacles), ([], [], []))
+		self.assertEqual(existing, {})
+
+	def testDelta(self):
+		old = self.obstacles[:4]
+		new = _obstacles(_header + (_line % (2, "2010002")) + (_line % (3, _dates[2])) + (_line % (4, _dates[3])) + 
+						(_line % (9, "2012001")))
+		added, changed, removed = dofcore.computeDofDelta(self._existing(old), new)
+		self.assertEqual([obstacle.obstacleNumber for obstacle in added], ["000009 "])
+		self.assertEqual([(objectId, obstacle.obstacleNumber) for objectId, obstacle in changed], [(2, "000002 ")])
+		self.assertEqual(removed, [1])
+
+class CodedValuesTest(unittest.TestCase):
+	"""encodeValues and decodeValues round-trip the values of every record."""
+	def setUp(self):
+		lines = dofsample.records(2000)
+		# Values that are not in their domains: an unknown obstacle type, a blank mark indicator and a lowercase action.
+		lines[1] = lines[1][:62] + "WIDGET      " + lines[1][74:]
+		lines[2] = lines[2][:95] + " " + lines[2][96:]
+		lines[3] = lines[3][:112] + "a" + lines[3][113:]
+		self.obstacles = _obstacles(dofsample.dofData(lines))
+
+	def testRoundTrip(self):
+		for obstacle in self.obstacles:
+			values = dofcore._obstacleValues(obstacle)
+			encoded = dofcore.encodeValues(values)
+			self.assertEqual(dofcore.decodeValues(encoded), values)
+			for i, domain in dofcore._codedFields:
+				self.assertEqual(isinstance(encoded[i], int), values[i] in domain.values, (values, i))
+			# Values that are not encoded are returned unchanged.
+			self.assertEqual(dofcore.decodeValues(values), values)
+
+	def testOutOfDomainValues(self):
+		for index, field, value in ((1, "ObstacleType", "WIDGET"), (2, "MarkIndicator", " "), (3, "Action", "a")):
+			i = dofcore._obstacleFields.index(field)
+			encoded = dofcore.encodeValues(dofcore._obstacleValues(self.obstacles[index]))
+			self.assertEqual(encoded[i], value)
+			self.assertEqual(dofcore.decodeValues(encoded)[i], value)
+
+	def testDomains(self):
+		for name, domain in dofcore._codedDomains.items():
+			self.assertEqual(sorted(domain.values), sorted(dofcore._domains[name]["domains"]))
+			for value in domain.values:
+				self.assertEqual(domain.decode(domain.encode(value)), value, (name, value))
+			# Codes depend only on the domain, so every process assigns the same ones.
+			self.assertEqual([dofcore.CodedDomain(name).encode(value) for value in domain.values],
+							range(len(domain.values)))
+
+	def testObstacleRecord(self):
+		for obstacle in self.obstacles:
+			is29, values, x, y = dofcore.obstacleRecord(obstacle, True)
+			self.assertEqual((is29, dofcore.decodeValues(values), x, y), dofcore.obstacleRecord(obstacle))
+
+def _changeLine(number, action, height=100):
+	"""Returns a daily change record for obstacle 53-number."""
+	return ("53-%06d O US WA SEATTLE          47 36 12.00N 122 20 00.00W TOWER        1 %05d 00300 R 2 D A "
+			"2012ANM00001OE %s 2012060\n" % (number, height, action))
+
+# Daily change files: name -> records.  Obstacle 1 is added and then changed, 2 is added and then deleted, 3 (which 
+# exists) is changed and then deleted, 4 (which exists) is changed, and 5 (which exists) is deleted.
+_changeFiles = {
+	"DDOF_120302.zip": [_changeLine(3, "C", 150)],
+	"DDOF_120305.zip": [_changeLine(1, "A"), _changeLine(2, "A"), _changeLine(4, "C", 200)],
+	"DDOF_120306.zip": [_changeLine(1, "C", 120), _changeLine(2, "D"), _changeLine(3, "D"), _changeLine(5, "D")],
+	"DDOF_120307.zip": [_changeLine(9, "A")]
+}
+# The links are not in date order, and one is repeated.
+_index = "<html><body>%s</body></html>" % "".join('<a href="%s">%s</a><br>' % (name, name) for name in 
+		("DDOF_120306.zip", "DDOF_120302.zip", "DDOF_120307.zip", "DDOF_120305.zip", "DDOF_120306.zip"))
+
+class DailyChangesTest(unittest.TestCase):
+	"""Finds, reads and folds daily change files served by a local server."""
+	@classmethod
+	def setUpClass(cls):
+		cls.root = tempfile.mkdtemp()
+		with open(os.path.join(cls.root, "TOD_DOF.html"), "wb") as f:
+			f.write(_index)
+		for name, lines in _changeFiles.items():
+			with zipfile.ZipFile(os.path.join(cls.root, name), "w", zipfile.ZIP_DEFLATED) as archive:
+				archive.writestr("DDOF.Dat", _header + "".join(lines))
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.root)
+
+	def _find(self, server, after):
+		return dofcore.findDailyChangeFiles(server.url, server.url + "TOD_DOF.html", after, remotezip.HTTPSession())
+
+	def testFindAfter(self):
+		with RangeServer(self.root) as server:
+			changeFiles = self._find(server, datetime.date(2012, 3, 4))
+		self.assertEqual([(changeFile["name"], changeFile["date"]) for changeFile in changeFiles], 
+						[("DDOF_120305.zip", datetime.date(2012, 3, 5)), ("DDOF_120306.zip", datetime.date(2012, 3, 6)),
+						("DDOF_120307.zip", datetime.date(2012, 3, 7))])
+		self.assertTrue(changeFiles[0]["url"].startswith(server.url))
+
+	def testFindAll(self):
+		with RangeServer(self.root) as server:
+			changeFiles = self._find(server, None)
+		self.assertEqual([changeFile["name"] for changeFile in changeFiles], 
+						["DDOF_120302.zip", "DDOF_120305.zip", "DDOF_120306.zip", "DDOF_120307.zip"])
+
+	def testReadAndFold(self):
+		with RangeServer(self.root) as server:
+			changeFiles = self._find(server, datetime.date(2012, 3, 1))
+			obstacles = dofcore.readDailyChanges(changeFiles, set(["53"]), remotezip.HTTPSession())
+		self.assertEqual([(obstacle.obstacleNumber.strip(), obstacle.action) for obstacle in obstacles], 
+						[("000003", "C"), ("000001", "A"), ("000002", "A"), ("000004", "C"), ("000001", "C"), 
+						("000002", "D"), ("000003", "D"), ("000005", "D"), ("000009", "A")])
+		# Object IDs of the obstacles already in the geodatabase.  (The signatures are not used.)
+		existing = {("53", "000003"): (30, 0), ("53", "000004"): (40, 0), ("53", "000005"): [(50, 0), (51, 0)]}
+		added, changed, removed = dofcore.computeDailyDelta(existing, obstacles)
+		# Add then change: one add, with the changed record.  Add then delete: nothing.
+		self.assertEqual([(obstacle.obstacleNumber.strip(), obstacle.aglHT) for obstacle in added], 
+						[("000001", 120), ("000009", 100)])
+		self.assertEqual([(objectId, obstacle.aglHT) for objectId, obstacle in changed], [(40, 200)])
+		# Change then delete: a delete.  Every duplicate of a deleted obstacle is removed.
+		self.assertEqual(sorted(removed), [30, 50, 51])
+
+	def testReadOtherOrsCodes(self):
+		with RangeServer(self.root) as server:
+			changeFiles = self._find(server, None)
+			self.assertEqual(dofcore.readDailyChanges(changeFiles, set(["41"]), remotezip.HTTPSession()), [])
+
+if __name__ == "__main__":
+	unittest.main()
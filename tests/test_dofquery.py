@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of dofquery, against linear scans of the Obstacles read from the same data.
+
+Run from the repository root: python -m unittest discover tests
+'''
+
+import unittest, random, datetime, cStringIO, dofcore, dofquery, dofsample
+
+def _matches(obstacle, conditions):
+	"""Tests an obstacle against ObstacleTable conditions one attribute at a time."""
+	for name, value in conditions.items():
+		attribute = getattr(obstacle, name)
+		if name in dofquery._rangeColumns:
+			minimum, maximum = value
+			if attribute is None or (minimum is not None and attribute < minimum) or (
+					maximum is not None and attribute > maximum):
+				return False
+		elif isinstance(value, (list, tuple, set, frozenset)):
+			if attribute not in value:
+				return False
+		elif attribute != value:
+			return False
+	return True
+
+class ObstacleTableTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		if dofcore.numpy is None:
+			raise unittest.SkipTest("numpy is not installed.")
+		data = dofsample.dofData(dofsample.records(3000))
+		cls.table = dofquery.ObstacleTable(dofcore.parseDofColumns(data)["columns"])
+		with dofcore.iterDofFile(cStringIO.StringIO(data)) as reader:
+			cls.obstacles = list(reader)
+
+	def _checkQuery(self, **conditions):
+		expected = [i for i, obstacle in enumerate(self.obstacles) if _matches(obstacle, conditions)]
+		self.assertEqual(self.table.find(**conditions).tolist(), expected, conditions)
+		self.assertEqual(self.table.count(**conditions), len(expected), conditions)
+		self.assertEqual([obstacle.line for obstacle in self.table.findObstacles(**conditions)],
+						[self.obstacles[i].line for i in expected], conditions)
+		return expected
+
+	def testDomains(self):
+		self.assertEqual(len(self._checkQuery()), len(self.obstacles))
+		self.assertTrue(self._checkQuery(obstacleType="TOWER"))
+		self.assertTrue(self._checkQuery(orsCode=["53", "66"], lighting="N"))
+		self.assertTrue(self._checkQuery(verificationStatus="U", markIndicator=("F", "M"), action="A",
+										horizontalAccuracy="1"))
+		self.assertEqual(self._checkQuery(obstacleType="NO SUCH TYPE"), [])
+		self.assertEqual(self._checkQuery(lighting=[]), [])
+
+	def testRanges(self):
+		rng = random.Random(0)
+		for i in xrange(50):
+			agl = sorted(rng.randint(0, 2000) for j in xrange(2))
+			amsl = sorted(rng.randint(-200, 14000) for j in xrange(2))
+			dates = sorted(datetime.date(rng.randint(1980, 2012), 1, 1) + datetime.timedelta(rng.randint(0, 364))
+						for j in xrange(2))
+			self._checkQuery(aglHT=tuple(agl))
+			self._checkQuery(AmslHT=(amsl[0], None))
+			self._checkQuery(AmslHT=(None, amsl[1]))
+			self._checkQuery(date=tuple(dates), obstacleType="TOWER")
+			self._checkQuery(date=(None, dates[1]), aglHT=(agl[0], None))
+		# Records without a valid date do not meet a date condition, even one with no bounds.
+		self.assertEqual(len(self._checkQuery(date=(None, None))),
+						len([obstacle for obstacle in self.obstacles if obstacle.date is not None]))
+		self.assertTrue(self._checkQuery(AmslHT=(None, -1)))
+
+	def testGetByNumber(self):
+		for obstacle in self.obstacles[::97]:
+			number = "%s-%s" % (obstacle.orsCode, obstacle.obstacleNumber.strip())
+			self.assertEqual(self.table.getByNumber(number).line, obstacle.line)
+		self.assertEqual(self.table.getByNumber("53-999999"), None)
+
+	def testGetByStudy(self):
+		studies = set(obstacle.faaStudyNo for obstacle in self.obstacles)
+		for study in sorted(studies)[::5]:
+			self.assertEqual([obstacle.line for obstacle in self.table.getByStudy(study)],
+							[obstacle.line for obstacle in self.obstacles if study and obstacle.faaStudyNo == study])
+		self.assertEqual(self.table.getByStudy(""), [])
+
+	def testUnindexedField(self):
+		self.assertRaises(ValueError, self.table.find, cityName="SEATTLE")
+
+if __name__ == "__main__":
+	unittest.main()
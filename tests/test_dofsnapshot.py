@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of dofsnapshot.
+
+Run from the repository root: python -m unittest discover tests
+'''
+
+import unittest, os, shutil, tempfile, dofcore, dofsnapshot
+
+_header = """  CURRENCY DATE = 03/04/12
+
+OAS#     V CO  ST CITY             LATITUDE     LONGITUDE     OBSTACLE      AGL   AMSL LT H V M FAA            ACTION
+-------------------------------------------------------------------------------------------------------------------------
+"""
+_lines = [
+	"53-000001 O US WA PORT ANGELES     48 15 29.72N 121 47 05.63W WINDMILL     4 01525 00018 S 7 C U 2010ANM00777OE A 1995198",
+	# A negative AMSL height.
+	"53-000002 U US WA TACOMA           46 25 01.74N 119 29 13.98W BLDG         5 00579 -0012 N 6 F W 2010ANM00777OE D 1997122",
+	# An invalid date.
+	"53-000003 O US WA SEATTLE          47 36 12.00N 122 20 00.00W TOWER        1 00100 00300 R 2 D A                C UNKNOWN",
+	"53-000004 O US WA SPOKANE          47 39 30.15N 117 25 33.60W STACK        1 00250 02190 L 1 A N 2001ANM00042OE A 2001071"
+]
+
+class SnapshotTest(unittest.TestCase):
+	def setUp(self):
+		if dofcore.numpy is None:
+			self.skipTest("numpy is not installed.")
+		self.root = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.root)
+
+	def _checkRoundTrip(self, data):
+		expected = dofcore.parseDofColumns(data)["columns"]
+		path = os.path.join(self.root, "53-WA.dofsnap")
+		dofsnapshot.writeSnapshot(path, expected)
+		with dofsnapshot.DofSnapshot(path) as snapshot:
+			columns = snapshot.toColumns()
+		self.assertEqual(sorted(columns), sorted(name for name in expected if name != "line"))
+		for name in expected:
+			self.assertEqual(columns[name].dtype, expected[name].dtype, name)
+			self.assertEqual(columns[name].tolist(), expected[name].tolist(), name)
+		self.assertEqual(columns["AmslHT"][1], -12)
+		self.assertEqual(columns["date"][2], 0)
+
+	def testLf(self):
+		self._checkRoundTrip(_header + "".join(line + "\n" for line in _lines))
+
+	def testCrlf(self):
+		self._checkRoundTrip(_header.replace("\n", "\r\n") + "".join(line + "\r\n" for line in _lines))
+
+	def testNoFinalLineTerminator(self):
+		self._checkRoundTrip(_header + "\n".join(_lines))
+
+	def testFormatLines(self):
+		"""Only the record with the invalid date has to be kept to rebuild the lines."""
+		columns = dofcore.parseDofColumns(_header + "".join(line + "\n" for line in _lines))["columns"]
+		self.assertEqual(dofsnapshot._formatLines(columns)[1], _lines[1] + "\n")
+		self.assertEqual(dofsnapshot._lineExceptions(columns)["indices"], [2])
+
+if __name__ == "__main__":
+	unittest.main()
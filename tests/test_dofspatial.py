@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of dofspatial, against brute-force searches of every obstacle.
+
+Run from the repository root: python -m unittest discover tests
+'''
+
+import unittest, os, tempfile, random, cStringIO, dofcore, dofspatial, dofsample
+
+# Query points: random ones, and ones next to the 180th meridian and the poles.
+_random = random.Random(0)
+_points = [(_random.uniform(-90, 90), _random.uniform(-180, 180)) for i in xrange(20)] + [
+	(0.0, 179.9), (-10.0, -179.95), (89.9, 0.0), (-89.95, 120.0), (60.0, 180.0)]
+
+class ObstacleIndexTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		with dofcore.iterDofFile(cStringIO.StringIO(dofsample.dofData(dofsample.records(3000)))) as reader:
+			cls.obstacles = list(reader)
+
+	def _bruteForce(self, latitude, longitude, unit="NM"):
+		"""Returns (distance, line) tuples for every obstacle, nearest first."""
+		return sorted((dofspatial.greatCircleDistance(latitude, longitude, obstacle.latitudeDD, obstacle.longitudeDD,
+													unit), obstacle.line.rstrip("\r\n")) for obstacle in self.obstacles)
+
+	def _results(self, results):
+		return [(distance, obstacle.line) for distance, obstacle in results]
+
+	def _checkIndex(self, index):
+		self.assertEqual(len(index), len(self.obstacles))
+		for latitude, longitude in _points:
+			expected = self._bruteForce(latitude, longitude)
+			for distance in (50, 600, 2500):
+				self.assertEqual(self._results(index.withinDistance(latitude, longitude, distance)),
+								[result for result in expected if result[0] <= distance], (latitude, longitude, distance))
+			for k in (1, 7, 40):
+				self.assertEqual(self._results(index.nearest(latitude, longitude, k)), expected[:k],
+								(latitude, longitude, k))
+
+	def testIndex(self):
+		self._checkIndex(dofspatial.ObstacleIndex(self.obstacles))
+
+	def testCellSizes(self):
+		for cellSize in (0.7, 7.0, 45.0):
+			self._checkIndex(dofspatial.ObstacleIndex(self.obstacles, cellSize))
+
+	def testUnits(self):
+		index = dofspatial.ObstacleIndex(self.obstacles)
+		expected = self._bruteForce(47.5, -122.3, "km")
+		self.assertEqual(self._results(index.withinDistance(47.5, -122.3, 1500, "km")),
+						[result for result in expected if result[0] <= 1500])
+		self.assertEqual(self._results(index.nearest(47.5, -122.3, 5, "km")), expected[:5])
+
+	def testNearestAll(self):
+		index = dofspatial.ObstacleIndex(self.obstacles)
+		self.assertEqual(self._results(index.nearest(10.0, 20.0, len(self.obstacles) + 10)),
+						self._bruteForce(10.0, 20.0))
+		self.assertEqual(dofspatial.ObstacleIndex().nearest(10.0, 20.0, 3), [])
+
+	def testWithinBox(self):
+		index = dofspatial.ObstacleIndex(self.obstacles)
+		# The last box crosses the 180th meridian.
+		for minLat, minLon, maxLat, maxLon in ((40, -130, 50, -110), (-90, -180, 90, 180), (-30, 150, 30, -150)):
+			expected = [obstacle.line.rstrip("\r\n") for obstacle in self.obstacles
+						if minLat <= obstacle.latitudeDD <= maxLat and (obstacle.longitudeDD >= minLon or
+						obstacle.longitudeDD <= maxLon if minLon > maxLon else minLon <= obstacle.longitudeDD <= maxLon)]
+			self.assertEqual([obstacle.line for obstacle in index.withinBox(minLat, minLon, maxLat, maxLon)], expected)
+
+	def testSaveAndLoad(self):
+		fd, path = tempfile.mkstemp(".dofidx")
+		os.close(fd)
+		try:
+			dofspatial.ObstacleIndex(self.obstacles).save(path)
+			self._checkIndex(dofspatial.ObstacleIndex.load(path))
+		finally:
+			os.remove(path)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the geodatabase functions in faadof that can run without ArcGIS.
+
+Run from the repository root: python -m unittest discover tests
+'''
+
+import unittest, datetime, faadof
+
+class _ArcpyWithTables(object):
+	"""Stands in for arcpy in a test where every table exists."""
+	def Exists(self, path):
+		return True
+
+class ApplyDailyChangesTest(unittest.TestCase):
+	def setUp(self):
+		self._saved = dict((name, getattr(faadof, name)) for name in 
+						("arcpy", "getCurrencyDate", "getLastDailyChange", "findDailyChangeFiles"))
+		self.after = []
+		faadof.arcpy = _ArcpyWithTables()
+		faadof.getCurrencyDate = lambda gdbPath: datetime.date(2012, 3, 4)
+		faadof.findDailyChangeFiles = lambda url, index_url, after, session, cache: self.after.append(after) or []
+	def tearDown(self):
+		for name, value in self._saved.items():
+			setattr(faadof, name, value)
+
+	def testFirstRun(self):
+		"""No daily change file has been applied yet, so the last daily change date is None."""
+		faadof.getLastDailyChange = lambda gdbPath: None
+		self.assertEqual(faadof.applyDailyChanges("test.gdb"), [])
+		self.assertEqual(self.after, [datetime.date(2012, 3, 4)])
+
+	def testLaterDailyChange(self):
+		faadof.getLastDailyChange = lambda gdbPath: datetime.date(2012, 3, 9)
+		faadof.applyDailyChanges("test.gdb")
+		self.assertEqual(self.after, [datetime.date(2012, 3, 9)])
+
+	def testNoDates(self):
+		self.assertEqual(faadof._dailyChangesAfter(None, None), None)
+		self.assertEqual(faadof._dailyChangesAfter(None, datetime.date(2012, 3, 9)), datetime.date(2012, 3, 9))
+
+class UpdateDofGdbTest(unittest.TestCase):
+	"""Runs updateDofGdb on an existing geodatabase with the geodatabase and download functions replaced."""
+	def setUp(self):
+		names = ("arcpy", "getCurrencyDate", "getImportedMembers", "downloadDofs", "_updateCurrencyDate", 
+				"_updateImportedMembers", "updateDofsInGdb")
+		self._saved = dict((name, getattr(faadof, name)) for name in names)
+		self.calls = []
+		faadof.arcpy = _ArcpyWithTables()
+		faadof.getCurrencyDate = lambda gdbPath: datetime.date(2012, 1, 8)
+		faadof.getImportedMembers = lambda gdbPath: {"53-WA.Dat": (0x1234, 5678)}
+		faadof._updateCurrencyDate = lambda tablePath, currencyDate: self.calls.append(("CurrencyDate", currencyDate))
+		faadof._updateImportedMembers = lambda tablePath, memberInfo: self.calls.append(("ImportedMembers", memberInfo))
+		faadof.updateDofsInGdb = lambda gdbPath, dofPaths, memberInfo: self.calls.append(("update", dofPaths)) or \
+			{"added": 0, "changed": 0, "removed": 0}
+	def tearDown(self):
+		for name, value in self._saved.items():
+			setattr(faadof, name, value)
+
+	def _download(self, paths):
+		"""Replaces downloadDofs with a function that finds the release of 2012-03-04 and returns paths."""
+		def downloadDofs(datafiles, lastCurrencyDate, importedMembers, memberInfo, release):
+			self.assertEqual(lastCurrencyDate, datetime.date(2012, 1, 8))
+			memberInfo["53-WA.Dat"] = (0x1234, 5678)
+			release.update({"url": "http://example.com/DOFS/DOF_120304.zip", "date": datetime.date(2012, 3, 4)})
+			return paths
+		faadof.downloadDofs = downloadDofs
+
+	def testNoChangedMembers(self):
+		"""A newer release whose data files have not changed is recorded, so it is not downloaded again."""
+		self._download([])
+		faadof.updateDofGdb("test.gdb")
+		self.assertEqual(self.calls, [("CurrencyDate", datetime.date(2012, 3, 4)), 
+									("ImportedMembers", {"53-WA.Dat": (0x1234, 5678)})])
+
+	def testNoNewRelease(self):
+		self._download(None)
+		faadof.updateDofGdb("test.gdb")
+		self.assertEqual(self.calls, [])
+
+	def testChangedMembers(self):
+		self._download(["../Scratch/53-WA.Dat"])
+		faadof.updateDofGdb("test.gdb")
+		self.assertEqual(self.calls, [("update", ["../Scratch/53-WA.Dat"])])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of remotezip against a local range-capable HTTP server (see rangeserver.py).
+
+Run from the repository root: python -m unittest discover tests
+'''
+
+import os, shutil, socket, tempfile, threading, time, unittest, urllib2, zipfile, remotezip
+from rangeserver import RangeServer
+
+def _sampleData(seed, lines):
+	"""Returns text that looks like DOF records, so that it compresses like a DOF."""
+	return "".join("%02d-%06d O US WA SEATTLE          47 %02d %05.2fN 122 %02d %05.2fW TOWER\r\n"
+				% (seed, i, i % 60, i % 6000 / 100.0, (i * 7) % 60, (i * 13) % 6000 / 100.0) for i in xrange(lines))
+
+class FetchMembersTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.root = tempfile.mkdtemp()
+		with zipfile.ZipFile(os.path.join(cls.root, "DOF_120304.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+			archive.writestr("53-WA.Dat", _sampleData(53, 20000))
+			archive.writestr("41-OR.Dat", _sampleData(41, 500))
+			archive.writestr(zipfile.ZipInfo("README.txt"), "Stored, not deflated.\r\n")
+		with zipfile.ZipFile(os.path.join(cls.root, "DDOF_120305.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+			archive.writestr("DDOF.DAT", _sampleData(16, 50))
+		cls.members = {
+			"DOF_120304.zip": ["53-WA.Dat", "41-OR.Dat", "README.txt"],
+			"DDOF_120305.zip": ["DDOF.DAT"]
+		}
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.root)
+
+	def _fetch(self, server):
+		"""Fetches all of the members with fetch_members and returns them keyed by archive file name."""
+		results = remotezip.fetch_members(dict((server.url + name, members) for name, members in self.members.items()))
+		return dict((url[len(server.url):], data) for url, data in results.items())
+
+	def _expected(self):
+		"""Reads all of the members with zipfile."""
+		expected = {}
+		for name, members in self.members.items():
+			with zipfile.ZipFile(os.path.join(self.root, name)) as archive:
+				expected[name] = dict((member, archive.read(member)) for member in members)
+		return expected
+
+	def testMatchesZipFile(self):
+		with RangeServer(self.root) as server:
+			self.assertEqual(self._fetch(server), self._expected())
+			# Only parts of the archives were requested.
+			self.assertTrue(all(rangeHeader for method, path, rangeHeader in server.requests))
+
+	def testServerIgnoresRange(self):
+		"""A server that ignores the Range header sends the whole archive, which contains every requested range."""
+		with RangeServer(self.root, ranges=False) as server:
+			self.assertEqual(self._fetch(server), self._expected())
+
+	def testMissingArchive(self):
+		with RangeServer(self.root) as server:
+			with self.assertRaises(urllib2.HTTPError) as context:
+				remotezip.fetch_members({server.url + "DOF_000000.zip": ["53-WA.Dat"]})
+			self.assertEqual(context.exception.code, 404)
+
+	def testMissingMember(self):
+		with RangeServer(self.root) as server:
+			with self.assertRaises(KeyError):
+				remotezip.fetch_members({server.url + "DOF_120304.zip": ["99-XX.Dat"]})
+
+class HTTPZipFileTest(FetchMembersTest):
+	"""Reads the same archives with the blocking HTTPZipFile."""
+	def _fetch(self, server):
+		results = {}
+		for name, members in self.members.items():
+			archive = remotezip.HTTPZipFile(server.url + name, session=remotezip.HTTPSession())
+			results[name] = dict((member, archive.open(member).read()) for member in members)
+		return results
+
+	def testMissingArchive(self):
+		with RangeServer(self.root) as server:
+			with self.assertRaises(urllib2.HTTPError):
+				remotezip.HTTPZipFile(server.url + "DOF_000000.zip", session=remotezip.HTTPSession())
+
+	def testMissingMember(self):
+		with RangeServer(self.root) as server:
+			archive = remotezip.HTTPZipFile(server.url + "DOF_120304.zip", session=remotezip.HTTPSession())
+			with self.assertRaises(KeyError):
+				archive.open("99-XX.Dat")
+
+	def _checkExtractTo(self, ranges, parallel):
+		expected = self._expected()["DOF_120304.zip"]
+		with RangeServer(self.root, ranges=ranges) as server:
+			archive = remotezip.HTTPZipFile(server.url + "DOF_120304.zip", session=remotezip.HTTPSession())
+			for member in self.members["DOF_120304.zip"]:
+				path = archive.extract_to(member, os.path.join(self.root, member), parallel=parallel)
+				with open(path, "rb") as f:
+					self.assertEqual(f.read(), expected[member])
+				os.remove(path)
+
+	def testExtractTo(self):
+		self._checkExtractTo(True, 1)
+
+	def testExtractToInParallel(self):
+		self._checkExtractTo(True, 3)
+
+	def testExtractToIgnoredRange(self):
+		self._checkExtractTo(False, 1)
+
+class _TrackedResponse(object):
+	"""Wraps a response to record whether it has been closed."""
+	def __init__(self, f):
+		self._f = f
+		self.closed = False
+	def read(self, amt=None):
+		return self._f.read(amt)
+	def close(self):
+		self.closed = True
+		self._f.close()
+
+class FetchMembersTimeoutTest(unittest.TestCase):
+	def testSilentServer(self):
+		"""A server that accepts connections but never responds."""
+		listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		try:
+			listener.bind(("127.0.0.1", 0))
+			listener.listen(5)
+			url = "http://127.0.0.1:%d/DOF_120304.zip" % listener.getsockname()[1]
+			start = time.time()
+			with self.assertRaises(socket.timeout):
+				remotezip.fetch_members({url: ["53-WA.Dat"]}, timeout=0.5)
+			self.assertLess(time.time() - start, 5)
+		finally:
+			listener.close()
+
+	def testServerStops(self):
+		"""A server that stops sending in the middle of a response."""
+		root = tempfile.mkdtemp()
+		try:
+			with zipfile.ZipFile(os.path.join(root, "DOF_120304.zip"), "w", zipfile.ZIP_STORED) as archive:
+				archive.writestr("53-WA.Dat", os.urandom(1 << 17))
+			# The first 16 KB of each response are sent at once, then nothing for minutes.
+			with RangeServer(root, rate=100) as server:
+				start = time.time()
+				with self.assertRaises(socket.timeout):
+					remotezip.fetch_members({server.url + "DOF_120304.zip": ["53-WA.Dat"]}, timeout=0.5)
+				self.assertLess(time.time() - start, 5)
+		finally:
+			shutil.rmtree(root)
+
+class EmptyRangeTest(unittest.TestCase):
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		with zipfile.ZipFile(os.path.join(self.root, "DOF_120304.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+			archive.writestr("53-WA.Dat", _sampleData(53, 2000))
+
+	def tearDown(self):
+		shutil.rmtree(self.root)
+
+	def testEmptyResponses(self):
+		"""A server that keeps answering range requests without data makes extract_to fail instead of retrying forever."""
+		path = os.path.join(self.root, "53-WA.Dat")
+		with RangeServer(self.root) as server:
+			archive = remotezip.HTTPZipFile(server.url + "DOF_120304.zip", session=remotezip.HTTPSession())
+			# The local header arrives, but the compressed data stop after 100 bytes.
+			server.cutOff = archive.getinfo("53-WA.Dat").header_offset + 30 + len("53-WA.Dat") + 100
+			del server.requests[:]
+			with self.assertRaises(IOError):
+				archive.extract_to("53-WA.Dat", path)
+			self.assertEqual(len(server.requests), remotezip._MAX_EMPTY_RESPONSES + 1)
+		self.assertFalse(os.path.exists(path))
+
+class ParallelRangeReaderTest(unittest.TestCase):
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		with open(os.path.join(self.root, "data.bin"), "wb") as f:
+			f.write(os.urandom(1 << 20))
+		self._saved = remotezip._http_get_partial_data
+
+	def tearDown(self):
+		remotezip._http_get_partial_data = self._saved
+		shutil.rmtree(self.root)
+
+	def testFirstRequestFails(self):
+		"""If the request for the first segment fails, the downloads of the other segments are stopped."""
+		responses = []
+		def getPartialData(url, start_range, end_range=None, session=None):
+			if start_range == 0:
+				time.sleep(0.2) # Let the other downloads start.
+				raise remotezip.ArchiveChangedError("The archive has changed.")
+			response = _TrackedResponse(self._saved(url, start_range, end_range, session))
+			responses.append(response)
+			return response
+		remotezip._http_get_partial_data = getPartialData
+		# At 64 KB/s per connection, each of the other segments would take 4 seconds.
+		with RangeServer(self.root, rate=1 << 16) as server:
+			start = time.time()
+			with self.assertRaises(remotezip.ArchiveChangedError):
+				remotezip._ParallelRangeReader(server.url + "data.bin", 0, (1 << 20) - 1, 4, remotezip.HTTPSession())
+			self.assertLess(time.time() - start, 2)
+			self.assertEqual(len(responses), 3)
+			self.assertTrue(all(response.closed for response in responses))
+			self.assertEqual([thread for thread in threading.enumerate() if thread.name.startswith("_ParallelRangeReader")], 
+							[])
+
+	def testRead(self):
+		with open(os.path.join(self.root, "data.bin"), "rb") as f:
+			expected = f.read()
+		with RangeServer(self.root) as server:
+			reader = remotezip._ParallelRangeReader(server.url + "data.bin", 100, len(expected) - 101, 3, 
+												remotezip.HTTPSession())
+			self.assertEqual(reader.read(), expected[100:-100])
+			reader.close()
+
+class GetPageTest(unittest.TestCase):
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		with open(os.path.join(self.root, "index.html"), "wb") as f:
+			f.write("<html><body><a href=\"DOF_120304.zip\">DOF_120304.zip</a></body></html>")
+
+	def tearDown(self):
+		shutil.rmtree(self.root)
+
+	def testNotModified(self):
+		"""An unchanged page is read from the cache, and the connection is kept for the next request."""
+		cache = remotezip.ZipCache(os.path.join(self.root, "cache"))
+		session = remotezip.HTTPSession()
+		with RangeServer(self.root) as server:
+			url = server.url + "index.html"
+			body = remotezip.get_page(url, session, cache)
+			self.assertEqual(remotezip.get_page(url, session, cache), body)
+			self.assertEqual(remotezip.get_page(url, session, cache), body)
+			self.assertEqual(session.connections_opened, 1)
+			self.assertEqual(session.connections_reused, 2)
+		session.close()
+
+if __name__ == "__main__":
+	unittest.main()